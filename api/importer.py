@@ -1,10 +1,17 @@
+import time
 import uuid
 from fastapi import APIRouter, Body, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-from app_state import executor, task_status
-from logic import _import_to_plex_worker, extract_playlist_id, fetch_netease_playlist, fetch_qq_playlist
+from app_state import job_backend, job_runner, task_status
+from logic import (STATUS_FIELDS, _import_to_plex_worker, extract_playlist_id, fetch_netease_playlist,
+                   fetch_qq_playlist, load_checkpoint, load_plex_config, connect_plex, match_songs,
+                   select_music_sections, strategy_planner, task_status_delta)
+from profiling import TaskProfiler
+import match_engine
+import plex_cache
 
 router = APIRouter()
 
@@ -14,21 +21,205 @@ class ImportRequest(BaseModel):
     plex_token: str
     plex_playlist_name: str
     import_mode: str # "create_new" or "update_existing"
+    profile: bool = False # 是否对该任务进行剖析（采样栈 + span 追踪）
+    sections: Optional[List[str]] = None # 只在这些音乐库分区（key 或名称）中匹配，默认全部
 
-@router.post("/import", tags=["Importer"])
-async def start_import(request: ImportRequest):
+class ResumeRequest(BaseModel):
+    plex_url: str
+    plex_token: str
+    profile: bool = False
+
+class Song(BaseModel):
+    title: str
+    artist: str
+
+class PreviewRequest(BaseModel):
+    plex_url: str
+    plex_token: str
+    songs: List[Song]
+    use_library_index: bool = False # 在本地音乐库快照上多进程匹配（适合大批量）
+    source_platform_name: Optional[str] = None # 来源平台，用于按来源统计匹配策略的命中率
+    sections: Optional[List[str]] = None # 只在这些音乐库分区（key 或名称）中匹配，默认全部
+
+class StreamPreviewRequest(BaseModel):
+    plex_url: str
+    plex_token: str
+    songs: List[Song]
+    sections: Optional[List[str]] = None # 只在这些音乐库分区（key 或名称）中匹配，默认全部
+
+class MatchResult(BaseModel):
+    title: str
+    artist: str
+    rating_key: Optional[int] = None
+    score: float
+    strategy: Optional[str] = None # "exact" | "artist_fuzzy" | "global_fuzzy"
+    matched_title: Optional[str] = None
+    matched_artist: Optional[str] = None
+
+class PreviewResponse(BaseModel):
+    preview_id: str
+    total: int
+    matched: int
+    results: List[MatchResult]
+
+class CommitPreviewRequest(BaseModel):
+    plex_url: str
+    plex_token: str
+    plex_playlist_name: str
+    import_mode: str # "create_new" or "update_existing"
+    source_platform_name: str = "未知来源"
+    original_playlist_title: str = "未知歌单"
+    profile: bool = False
+    sections: Optional[List[str]] = None # 新建播放列表时的参照音轨取自这些分区，默认全部
+
+# 剖析结果的下载格式: format -> (导出方法, 媒体类型, 文件扩展名)
+PROFILE_FORMATS = {
+    "folded": ("folded_samples", "text/plain; charset=utf-8", "folded"),
+    "spans": ("folded_spans", "text/plain; charset=utf-8", "spans.folded"),
+    "trace": ("chrome_trace", "application/json", "trace.json"),
+}
+
+IMPORT_JOB = "import"
+
+def plex_token_for(payload):
     """
-    Starts a new playlist import task.
+    任务使用的 Plex Token。队列只在排队期间保存 Token，认领后即删去（见 job_queue.SECRET_PAYLOAD_KEYS），
+    上一个执行者失联后重新认领的任务没有 Token：连接的是配置中的服务器时使用配置的 Token，否则抛出 ValueError。
     """
-    # 验证导入模式
-    if request.import_mode not in ["create_new", "update_existing"]:
+    if payload.get("plex_token"):
+        return payload["plex_token"]
+    config = load_plex_config()
+    if config.get("plex_token") and config.get("plex_url") == payload.get("plex_url"):
+        return config["plex_token"]
+    raise ValueError("上一个执行者已失联，队列中不保存 Plex Token，任务无法自动继续，请重新提交。")
+
+def _resume_kwargs(checkpoint):
+    """由断点重建续传所需的 _import_to_plex_worker 参数，续传任务的 payload 不再复制歌曲列表。"""
+    return {
+        "plex_playlist_name_input": checkpoint["playlist_name"],
+        "songs_to_import": checkpoint["songs"],
+        "import_mode": "update_existing",
+        "source_platform_name": checkpoint["source_platform_name"],
+        "original_playlist_title_hint": checkpoint["original_playlist_title_hint"],
+        "resume_from": checkpoint,
+    }
+
+def _run_import_job(job):
+    """
+    执行队列中的导入任务，按需包裹剖析器，剖析结果写入任务后端。
+    payload 为 _import_to_plex_worker 的参数（JSON 形式）加上 profile 开关；
+    续传任务（resume 为真）只带连接参数，其余参数由断点重建。
+    """
+    worker_kwargs = dict(job.payload)
+    profile = worker_kwargs.pop("profile", False)
+    resume = worker_kwargs.pop("resume", False)
+    # 续传任务，或上一个执行者已失联、随进程关闭而中断的任务：从最新的断点继续，写入已创建的播放列表，
+    # 不重复查询 Plex。播放列表一创建就会写入断点，没有断点说明还没有创建任何播放列表
+    checkpoint = load_checkpoint(job.task_id) if resume or job.attempts > 1 else None
+    try:
+        if resume and checkpoint is None:
+            raise ValueError("找不到该任务的断点，无法续传。")
+        worker_kwargs["plex_token"] = plex_token_for(job.payload)
+    except ValueError as e:
+        job.task_status[job.task_id] = {"status": "error", "message": str(e), "resumable": checkpoint is not None}
+        return
+    if resume:
+        worker_kwargs.update(_resume_kwargs(checkpoint))
+    elif checkpoint is not None:
+        worker_kwargs["resume_from"] = checkpoint
+    worker_kwargs["songs_to_import"] = [tuple(song) for song in worker_kwargs["songs_to_import"]]
+    worker_kwargs.update(task_id=job.task_id, task_status_dict=job.task_status, cancel_event=job.cancel_event)
+    if not profile:
+        _import_to_plex_worker(**worker_kwargs)
+        return
+    profiler = TaskProfiler()
+    try:
+        with profiler:
+            _import_to_plex_worker(**worker_kwargs)
+    finally:
+        exports = {fmt: getattr(profiler, method_name)() for fmt, (method_name, _, _) in PROFILE_FORMATS.items()}
+        job_backend.save_profile(job.task_id, profiler.summary(), exports)
+
+job_runner.register(IMPORT_JOB, _run_import_job)
+
+def enqueue_import(state, task_id=None, **payload):
+    """把导入任务放入共享队列，由任意 worker 认领执行；返回 task_id。"""
+    task_id = job_backend.enqueue(IMPORT_JOB, payload, task_id=task_id, state=state)
+    # 本进程有空闲线程时立即认领，不必等下一个轮询周期
+    job_runner.wake()
+    return task_id
+
+PREVIEW_JOB = "preview"
+
+def _run_preview_job(job):
+    """
+    执行队列中的流式试匹配任务：在音乐库快照上匹配，每首歌一有结果就追加到状态的 results 中，
+    轮询 /import/status/{task_id}?since=... 可以增量取到。结束后预览存入任务后端，
+    result 中为 preview_id 与匹配数，可直接用于 /import/preview/{preview_id}/commit。
+    """
+    payload = job.payload
+    songs = [tuple(song) for song in payload["songs"]]
+    # results 只追加，和导入任务一样原地更新字段并推进版本号，供 task_status_delta 计算增量
+    streamed = []
+    state = {
+        "status": None, "message": None, "progress": 0, "total": len(songs),
+        "playlist_name": None, "resumable": False,
+        "unmatched_songs": [], "results": streamed, "result": None,
+        "version": 0,
+        "field_versions": dict.fromkeys(STATUS_FIELDS, 0),
+    }
+    job.task_status[job.task_id] = state
+
+    def update(**fields):
+        version = state["version"] + 1
+        for field, value in fields.items():
+            if state[field] != value:
+                state[field] = value
+                state["field_versions"][field] = version
+        state["version"] = version
+
+    def on_result(pos, result):
+        streamed.append({"position": pos, **result})
+        if result["rating_key"] is None:
+            state["unmatched_songs"].append((result["title"], result["artist"]))
+        update(progress=len(streamed))
+
+    update(status="processing", message="正在导出音乐库并匹配...")
+    try:
+        plex = connect_plex(payload["plex_url"], plex_token_for(payload))
+        results = match_engine.stream_match(plex, songs, sections=payload.get("sections"), on_result=on_result)
+    except ValueError as e:
+        update(status="error", message=str(e))
+        return
+
+    preview_id = str(uuid.uuid4())
+    job_backend.save_preview(preview_id, {
+        "plex_url": payload["plex_url"],
+        "songs": songs,
+        "results": results,
+        "created_at": time.time(),
+    })
+    matched = sum(1 for r in results if r["rating_key"] is not None)
+    # 先写 result 再推进版本，轮询者看到 completed 时一定能拿到 preview_id
+    state["result"] = {"preview_id": preview_id, "total": len(results), "matched": matched}
+    update(status="completed", message=f"试匹配完成：{len(results)} 首歌曲中匹配到 {matched} 首。")
+
+job_runner.register(PREVIEW_JOB, _run_preview_job)
+
+def _validate_import_mode(import_mode):
+    if import_mode not in ["create_new", "update_existing"]:
         raise HTTPException(
             status_code=400,
-            detail=f"无效的导入模式: {request.import_mode}. 只支持 'create_new' 或 'update_existing'"
+            detail=f"无效的导入模式: {import_mode}. 只支持 'create_new' 或 'update_existing'"
         )
 
-    task_id = str(uuid.uuid4())
-    task_status[task_id] = {"status": "pending", "progress": 0, "total": 0, "message": "任务已排队"}
+@router.post("/import", tags=["Importer"])
+async def start_import(request: ImportRequest):
+    """
+    Starts a new playlist import task.
+    """
+    # 验证导入模式
+    _validate_import_mode(request.import_mode)
 
     playlist_id = extract_playlist_id(request.playlist_url)
     if not playlist_id:
@@ -49,9 +240,10 @@ async def start_import(request: ImportRequest):
     if not songs_to_import:
         raise HTTPException(status_code=404, detail="无法从URL获取任何歌曲。")
 
-    # Submit the worker to the thread pool
-    executor.submit(
-        _import_to_plex_worker,
+    # 放入共享队列，由任意 worker 认领执行
+    task_id = enqueue_import(
+        {"status": "pending", "progress": 0, "total": len(songs_to_import), "message": "任务已排队"},
+        profile=request.profile,
         plex_url=request.plex_url,
         plex_token=request.plex_token,
         plex_playlist_name_input=request.plex_playlist_name,
@@ -59,36 +251,237 @@ async def start_import(request: ImportRequest):
         import_mode=request.import_mode,
         source_platform_name=source_platform,
         original_playlist_title_hint=playlist_title,
-        task_id=task_id,
-        task_status_dict=task_status
+        sections=request.sections
     )
 
     return {"task_id": task_id}
 
 
+@router.post("/import/preview", response_model=PreviewResponse, tags=["Importer"])
+def preview_import(request: PreviewRequest):
+    """
+    试匹配（dry-run）：返回每首歌的匹配结果（ratingKey、分数、策略），不创建或修改任何播放列表。
+    返回的 preview_id 可用于 /import/preview/{preview_id}/commit 直接提交，不会再次匹配。
+
+    use_library_index 时分页并发导出所选分区的音乐库快照，导出过程中即完成精确匹配，
+    其余歌曲在快照上多进程模糊匹配。
+    """
+    if not request.songs:
+        raise HTTPException(status_code=400, detail="歌曲列表为空。")
+    try:
+        plex = connect_plex(request.plex_url, request.plex_token)
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    songs = [(s.title, s.artist) for s in request.songs]
+    try:
+        if request.use_library_index:
+            results = match_engine.stream_match(plex, songs, sections=request.sections)
+        else:
+            section_ids = {s.key for s in select_music_sections(plex, request.sections)} if request.sections else None
+            results = match_songs(plex, songs, source=request.source_platform_name, section_ids=section_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    preview_id = str(uuid.uuid4())
+    # 预览存放在任务后端，提交请求可以落在任意 worker 上
+    job_backend.save_preview(preview_id, {
+        "plex_url": request.plex_url,
+        "songs": songs,
+        "results": results,
+        "created_at": time.time(),
+    })
+    return {
+        "preview_id": preview_id,
+        "total": len(results),
+        "matched": sum(1 for r in results if r["rating_key"] is not None),
+        "results": results,
+    }
+
+
+@router.post("/import/preview/stream", tags=["Importer"])
+async def start_stream_preview(request: StreamPreviewRequest):
+    """
+    流式试匹配：与 use_library_index 的 /import/preview 相同，但作为后台任务执行，立即返回 task_id。
+    轮询 /import/status/{task_id}，每次把上一次的 cursor 作为 since 传入，即可取到新增的匹配结果
+    （results，每项带 position 为其在 songs 中的位置）；任务完成后 result 中为 preview_id。
+    """
+    if not request.songs:
+        raise HTTPException(status_code=400, detail="歌曲列表为空。")
+    songs = [(s.title, s.artist) for s in request.songs]
+    task_id = job_backend.enqueue(PREVIEW_JOB, {
+        "plex_url": request.plex_url,
+        "plex_token": request.plex_token,
+        "songs": songs,
+        "sections": request.sections,
+    }, state={"status": "pending", "message": "任务已创建，等待开始...", "progress": 0, "total": len(songs)})
+    job_runner.wake()
+    return {"task_id": task_id, "status_url": f"/api/v1/import/status/{task_id}"}
+
+
+@router.post("/import/preview/{preview_id}/commit", tags=["Importer"])
+async def commit_preview(preview_id: str, request: CommitPreviewRequest):
+    """
+    按预览结果提交导入任务：直接把预览中匹配到的 ratingKey 写入播放列表。
+    """
+    _validate_import_mode(request.import_mode)
+    preview = job_backend.load_preview(preview_id)
+    if preview is None:
+        raise HTTPException(status_code=404, detail="找不到预览结果，可能已过期，请重新预览。")
+    if preview["plex_url"] != request.plex_url:
+        raise HTTPException(status_code=409, detail="预览结果来自另一个Plex服务器，不能提交到当前服务器。")
+
+    task_id = enqueue_import(
+        {"status": "pending", "progress": 0, "total": len(preview["songs"]), "message": "任务已排队"},
+        profile=request.profile,
+        plex_url=request.plex_url,
+        plex_token=request.plex_token,
+        plex_playlist_name_input=request.plex_playlist_name,
+        songs_to_import=preview["songs"],
+        import_mode=request.import_mode,
+        source_platform_name=request.source_platform_name,
+        original_playlist_title_hint=request.original_playlist_title,
+        prematched_keys=[r["rating_key"] for r in preview["results"]],
+        sections=request.sections
+    )
+
+    return {"task_id": task_id}
+
+
+@router.post("/import/{task_id}/cancel", tags=["Importer"])
+async def cancel_import(task_id: str):
+    """
+    请求取消导入任务。任务会在当前歌曲处理完后停止并写入断点，之后可通过 resume 接口继续。
+    """
+    job_status = job_backend.request_cancel(task_id)
+    if job_status is None:
+        raise HTTPException(status_code=404, detail="找不到任务ID")
+    if job_status == "done":
+        raise HTTPException(status_code=409, detail="任务已结束，无法取消")
+    # 执行该任务的 worker 在下次续租时得知取消请求；若就在本进程，立即检查
+    job_runner.wake()
+    return {"task_id": task_id, "message": "已请求取消，任务将在当前歌曲处理完后停止。"}
+
+
+@router.post("/import/{task_id}/resume", tags=["Importer"])
+async def resume_import(task_id: str, request: ResumeRequest):
+    """
+    从断点继续一个已取消或失败的导入任务，已匹配的歌曲不会再次查询 Plex。
+    """
+    if job_backend.job_status(task_id) in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="任务仍在运行")
+    checkpoint = load_checkpoint(task_id)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="找不到该任务的断点")
+
+    try:
+        # 歌曲列表、已匹配的 ratingKey 等都在断点中，执行时再读取，队列中只保存连接参数
+        enqueue_import(
+            {
+                "status": "pending",
+                "progress": checkpoint["cursor"],
+                "total": len(checkpoint["songs"]),
+                "message": "续传任务已排队",
+            },
+            task_id=task_id,
+            profile=request.profile,
+            plex_url=request.plex_url,
+            plex_token=request.plex_token,
+            resume=True,
+        )
+    except ValueError as e:
+        # 另一个请求已抢先续传
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {"task_id": task_id}
+
+
 @router.get("/import/status/{task_id}", tags=["Importer"])
-async def get_import_status(task_id: str):
+async def get_import_status(task_id: str, since: Optional[str] = None):
     """
     Retrieves the status of an import task.
+
+    since: 上一次响应中的 cursor。提供时只返回之后变化过的字段和新增的未匹配歌曲，
+        轮询开销与未匹配歌曲总数无关；游标失效时返回完整状态（full 为 true）。
     
     Returns:
         {
-            "status": "pending|processing|completed|failed|error",
+            "cursor": str (下次轮询时作为 since 传入),
+            "full": bool (是否为完整状态；否则只包含变化过的字段),
+            "status": "pending|processing|completed|cancelled|failed|error",
             "message": str,
             "progress": int,
             "total": int,
-            "unmatched_songs": list[tuple] (optional)
+            "playlist_name": str,
+            "resumable": bool (已写入断点，可调用 resume 继续),
+            "unmatched_songs": list[tuple] (unmatched_offset 之后新增的未匹配歌曲),
+            "unmatched_offset": int,
+            "unmatched_total": int,
+            "results": list[dict] (仅流式试匹配任务：results_offset 之后新增的匹配结果),
+            "results_offset": int,
+            "results_total": int,
+            "profile": dict (仅在开启剖析且任务结束后出现),
+            "result": dict (重新匹配任务结束后为匹配报告，见 /unmatched/rematch；
+                流式试匹配任务完成后为 preview_id、total、matched)
         }
     """
-    status = task_status.get(task_id)
+    # 由本进程执行中的任务直接读内存中的状态，其余从任务后端读取（可能落后一个轮询周期）
+    status = task_status.get(task_id) or job_backend.load_state(task_id)
     if not status:
         raise HTTPException(status_code=404, detail="找不到任务ID")
-    
-    # 确保返回完整的结构
-    return {
-        "status": status.get("status", "unknown"),
-        "message": status.get("message", ""),
-        "progress": status.get("progress", 0),
-        "total": status.get("total", 0),
-        "unmatched_songs": status.get("unmatched_songs", [])
-    }
\ No newline at end of file
+
+    try:
+        response = task_status_delta(status, since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if response["full"]:
+        # 确保返回完整的结构
+        response = {
+            **response,
+            "status": response.get("status") or "unknown",
+            "message": response.get("message") or "",
+            "progress": response.get("progress") or 0,
+            "total": response.get("total") or 0,
+            "resumable": bool(response.get("resumable")),
+        }
+    if status.get("result") is not None:
+        response["result"] = status["result"]
+    profile_summary = job_backend.profile_summary(task_id) if status.get("status") not in ("pending", "processing") else None
+    if profile_summary is not None:
+        response["profile"] = {
+            **profile_summary,
+            "downloads": {fmt: f"/api/v1/import/status/{task_id}/profile?format={fmt}" for fmt in PROFILE_FORMATS},
+        }
+    return response
+
+
+@router.get("/import/status/{task_id}/profile", tags=["Importer"])
+async def download_import_profile(task_id: str, format: str = "folded"):
+    """
+    下载任务的剖析数据。
+
+    format:
+        folded - 采样调用栈，folded 格式（flamegraph.pl / speedscope）
+        spans  - 每首歌 / 每次 Plex 请求的 span 自耗时（微秒），folded 格式
+        trace  - Chrome Trace Event JSON（chrome://tracing / Perfetto）
+    """
+    if job_backend.job_status(task_id) is None:
+        raise HTTPException(status_code=404, detail="找不到任务ID")
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的剖析格式: {format}. 可选: {', '.join(PROFILE_FORMATS)}")
+    content = job_backend.profile_export(task_id, format)
+    if content is None:
+        raise HTTPException(status_code=404, detail="该任务未开启剖析或尚未结束")
+
+    _, media_type, extension = PROFILE_FORMATS[format]
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{task_id}.{extension}"'},
+    )
+
+
+@router.get("/import/strategy-stats", tags=["Importer"])
+async def get_strategy_stats():
+    """各 Plex 服务器、各来源平台上匹配策略的尝试次数、命中率、平均耗时及当前的期望成本，以及搜索缓存的命中情况。"""
+    return {"stats": strategy_planner.snapshot(), "search_cache": plex_cache.search_cache.stats()}
@@ -1,23 +1,83 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
+import base64
+import hashlib
 import sys
 import os
+import time
 
 # 将项目根目录添加到 sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import http_cache
 import logic
+from app_state import job_backend
 
 router = APIRouter(
     prefix="/playlist",
     tags=["Playlist"],
 )
 
+# 分页提取的快照: 首次请求时提取整个歌单并存为快照，后续页从快照读取，不再请求音乐平台。
+# 快照存放在任务后端，`uvicorn --workers N` 下后续页落到任意 worker 都能读到
+SNAPSHOT_TTL = 600  # 秒
+MAX_PAGE_SIZE = 5000
+
+def _snapshot_id(playlist_title, songs_list):
+    """按内容计算快照ID：同一歌单内容重复提取得到相同的游标，分页响应的 ETag 也随之稳定。"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(playlist_title.encode("utf-8"))
+    for song in songs_list:
+        digest.update(f"\x1e{song['title']}\x1f{song['artist']}".encode("utf-8"))
+    return digest.hexdigest()
+
+def _store_snapshot(playlist_title, songs_list):
+    snapshot_id = _snapshot_id(playlist_title, songs_list)
+    job_backend.save_extract_snapshot(snapshot_id, {
+        "playlist_title": playlist_title,
+        "songs": songs_list,
+        "created_at": time.time(),
+    })
+    return snapshot_id
+
+def _load_snapshot(snapshot_id):
+    snapshot = job_backend.load_extract_snapshot(snapshot_id)
+    if snapshot is None or time.time() - snapshot["created_at"] > SNAPSHOT_TTL:
+        return None
+    return snapshot
+
+def _encode_cursor(snapshot_id, offset):
+    return base64.urlsafe_b64encode(f"{snapshot_id}:{offset}".encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        snapshot_id, offset = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return snapshot_id, int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标。")
+
+def _page(snapshot_id, playlist_title, songs_list, offset, limit):
+    if limit is None:
+        page = songs_list[offset:]
+        next_offset = len(songs_list)
+    else:
+        next_offset = min(offset + limit, len(songs_list))
+        page = songs_list[offset:next_offset]
+    return {
+        "playlist_title": playlist_title,
+        "songs": page,
+        "total": len(songs_list),
+        "next_cursor": _encode_cursor(snapshot_id, next_offset) if next_offset < len(songs_list) else None,
+    }
+
 # Pydantic 模型
 class ExtractRequest(BaseModel):
     source: str = Field(..., description="The source of the playlist, 'netease' or 'qq'")
     url_or_id: str = Field(..., description="The URL or ID of the playlist")
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit to return the whole playlist")
+    cursor: Optional[str] = Field(None, description="next_cursor from a previous response")
 
 class Song(BaseModel):
     title: str
@@ -26,12 +86,26 @@ class Song(BaseModel):
 class ExtractResponse(BaseModel):
     playlist_title: str
     songs: List[Song]
+    total: int
+    next_cursor: Optional[str] = None
 
 @router.post("/extract", response_model=ExtractResponse)
-def extract_playlist(request: ExtractRequest):
+def extract_playlist(request: ExtractRequest, http_request: Request):
     """
     根据提供的歌单来源和 URL/ID，提取歌单的歌曲列表。
+
+    传入 limit 时按页返回，响应中的 next_cursor 用于请求下一页（为空表示已到末尾）。
+    带 cursor 的请求直接读取首次提取时的快照。
+    响应带有按内容计算的 ETag，请求头 If-None-Match 命中时返回 304，客户端复用已缓存的结果。
     """
+    if request.cursor:
+        snapshot_id, offset = _decode_cursor(request.cursor)
+        snapshot = _load_snapshot(snapshot_id)
+        if snapshot is None:
+            raise HTTPException(status_code=410, detail="分页游标已过期，请重新提取歌单。")
+        return http_cache.json_response(
+            http_request, _page(snapshot_id, snapshot["playlist_title"], snapshot["songs"], offset, request.limit))
+
     playlist_id = logic.extract_playlist_id(request.url_or_id)
     if not playlist_id:
         raise HTTPException(status_code=400, detail="无法识别的歌单ID或链接。")
@@ -49,7 +123,13 @@ def extract_playlist(request: ExtractRequest):
         if not songs_list:
              raise HTTPException(status_code=404, detail="无法获取歌单内容，请确认ID是否正确，或歌单是否为公开。")
 
-        return {"playlist_title": playlist_title, "songs": songs_list}
+        if request.limit is None:
+            return http_cache.json_response(http_request, {
+                "playlist_title": playlist_title, "songs": songs_list, "total": len(songs_list), "next_cursor": None,
+            })
+
+        snapshot_id = _store_snapshot(playlist_title, songs_list)
+        return http_cache.json_response(http_request, _page(snapshot_id, playlist_title, songs_list, 0, request.limit))
 
     except ValueError as e:
         # 根据错误信息区分404和500
@@ -1,8 +1,6 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, status
+from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
-import uuid
-import threading
 import sys
 import os
 
@@ -10,14 +8,13 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import logic
+from app_state import job_backend, task_status
+from api.importer import enqueue_import
 
 router = APIRouter(
     tags=["Plex"],
 )
 
-# 任务存储 (内存)
-tasks: Dict[str, Dict[str, Any]] = {}
-
 # Pydantic 模型
 class Song(BaseModel):
     title: str
@@ -53,39 +50,45 @@ class TaskStatusResponse(BaseModel):
     result: Optional[TaskStatusResult] = None
     error: Optional[str] = None
 
-# 任务回调函数
-def update_task_progress(task_id: str, progress_message: str):
-    tasks[task_id]["status"] = "processing"
-    tasks[task_id]["progress"] = progress_message
+# 导入任务的状态 -> 本接口的状态；其余（error、cancelled）都记为 failed
+_TASK_STATUSES = {"pending": "pending", "processing": "processing", "completed": "completed"}
 
-def complete_task(task_id: str, success: bool, message: str, unmatched: List, final_playlist_name: str):
-    if success:
-        tasks[task_id]["status"] = "completed"
-        tasks[task_id]["result"] = {
+def _task_response(task_id: str, state: Dict[str, Any]):
+    """把共享队列中导入任务的状态转换为本接口的响应结构。"""
+    task_status_value = _TASK_STATUSES.get(state.get("status") or "pending", "failed")
+    message = state.get("message") or ""
+    response = {"task_id": task_id, "status": task_status_value, "progress": message}
+    if task_status_value == "completed":
+        response["result"] = {
             "success": True,
             "message": message,
-            "final_playlist_name": final_playlist_name,
-            "unmatched_songs": [{"title": t, "artist": a} for t, a in unmatched]
+            "final_playlist_name": state.get("playlist_name") or "",
+            "unmatched_songs": [{"title": t, "artist": a} for t, a in state.get("unmatched_songs") or []],
         }
-    else:
-        tasks[task_id]["status"] = "failed"
-        tasks[task_id]["error"] = message
+    elif task_status_value == "failed":
+        response["error"] = message
+    return response
 
-def plex_import_runner(task_id: str, request: PlexImportRequest):
+@router.post("/plex/import", response_model=TaskCreationResponse, status_code=status.HTTP_202_ACCEPTED)
+def start_plex_import(request: PlexImportRequest):
     """
-    实际执行 Plex 导入的包装函数。
+    启动一个后台任务，将指定的歌曲列表导入到 Plex。
+    任务经由共享队列执行，任何 worker 都可以通过 /tasks/{task_id} 查询其状态。
     """
+    if not request.songs:
+        raise HTTPException(status_code=400, detail="请求数据验证失败（例如，歌曲列表为空）。")
+    if request.import_options.mode not in ("create_new", "update_existing"):
+        raise HTTPException(status_code=400, detail=f"无效的导入模式: {request.import_options.mode}")
+
     config = logic.load_plex_config()
     plex_url = config.get("plex_url")
     plex_token = config.get("plex_token")
-
     if not plex_url or not plex_token:
-        complete_task(task_id, False, "Plex 配置不完整，请先在配置页面设置。", [], "")
-        return
+        raise HTTPException(status_code=400, detail="Plex 配置不完整，请先在配置页面设置。")
 
     songs_to_import = [(s.title, s.artist) for s in request.songs]
-
-    logic._import_to_plex_worker(
+    task_id = enqueue_import(
+        {"status": "pending", "progress": 0, "total": len(songs_to_import), "message": "任务已创建，等待开始..."},
         plex_url=plex_url,
         plex_token=plex_token,
         plex_playlist_name_input=request.import_options.playlist_name or request.source_info.original_playlist_title,
@@ -93,24 +96,8 @@ def plex_import_runner(task_id: str, request: PlexImportRequest):
         import_mode=request.import_options.mode,
         source_platform_name=request.source_info.platform_name,
         original_playlist_title_hint=request.source_info.original_playlist_title,
-        progress_callback=lambda msg: update_task_progress(task_id, msg),
-        completion_callback=lambda success, msg, unmatched, final_name: complete_task(task_id, success, msg, unmatched, final_name)
     )
 
-@router.post("/plex/import", response_model=TaskCreationResponse, status_code=status.HTTP_202_ACCEPTED)
-def start_plex_import(request: PlexImportRequest, background_tasks: BackgroundTasks):
-    """
-    启动一个后台任务，将指定的歌曲列表导入到 Plex。
-    """
-    if not request.songs:
-        raise HTTPException(status_code=400, detail="请求数据验证失败（例如，歌曲列表为空）。")
-
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {"status": "pending", "progress": "任务已创建，等待开始..."}
-    
-    # 使用 FastAPI 的 BackgroundTasks 来运行后台线程
-    background_tasks.add_task(plex_import_runner, task_id, request)
-
     return {"task_id": task_id, "message": "Plex 导入任务已开始。"}
 
 @router.get("/tasks/{task_id}", response_model=TaskStatusResponse)
@@ -118,10 +105,8 @@ def get_task_status(task_id: str):
     """
     根据任务ID查询 Plex 导入任务的当前状态、进度和最终结果。
     """
-    task = tasks.get(task_id)
-    if not task:
+    # 由本进程执行中的任务直接读内存中的状态，其余从任务后端读取
+    state = task_status.get(task_id) or job_backend.load_state(task_id)
+    if not state:
         raise HTTPException(status_code=404, detail="任务ID不存在。")
-
-    response_data = task.copy()
-    response_data["task_id"] = task_id
-    return response_data
\ No newline at end of file
+    return _task_response(task_id, state)
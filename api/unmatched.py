@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+
+from app_state import job_backend, job_runner
+from api.importer import plex_token_for
+from logic import connect_plex
+import plex_cache
+import rematch
+import unmatched_store
+
+router = APIRouter(prefix="/unmatched", tags=["Unmatched"])
+
+REMATCH_JOB = "rematch"
+
+class UnmatchedQuery(BaseModel):
+    plex_url: str
+    plex_token: str
+    playlist_key: Optional[int] = None # 只列出该播放列表的记录；不提供时只返回按播放列表的汇总
+    include_matched: bool = False
+
+class RematchRequest(BaseModel):
+    plex_url: str
+    plex_token: str
+    full: bool = False # 忽略扫描水位，与整个音乐库重新匹配
+
+def _run_rematch_job(job):
+    """执行队列中的重新匹配任务，状态字段与导入任务相同，结束后 result 中为匹配报告。"""
+    state = {"status": "processing", "message": "正在连接Plex...", "progress": 0, "total": 0,
+             "playlist_name": None, "resumable": False, "result": None}
+    job.task_status[job.task_id] = state
+    try:
+        plex = connect_plex(job.payload["plex_url"], plex_token_for(job.payload))
+        report = rematch.rematch_unmatched(plex, full=job.payload.get("full", False),
+                                           on_progress=lambda message: state.update(message=message),
+                                           cancel_event=job.cancel_event)
+    except ValueError as e:
+        state.update(status="error", message=str(e))
+        return
+    if job.cancel_event.is_set():
+        status, message = "cancelled", "重新匹配已取消，未完成的播放列表将在下次重试。"
+    else:
+        status = "completed"
+        message = (f"重新匹配完成：扫描 {report['scanned']} 首音轨，{report['pending']} 首待匹配歌曲中"
+                   f"命中 {report['matched']} 首，更新了 {len(report['playlists'])} 个播放列表。")
+    state.update(status=status, message=message, progress=report["matched"], total=report["pending"],
+                 result=report)
+
+job_runner.register(REMATCH_JOB, _run_rematch_job)
+
+@router.post("/query", tags=["Unmatched"])
+def list_unmatched(request: UnmatchedQuery):
+    """
+    列出该 Plex 服务器上记录的未匹配歌曲：按播放列表汇总待匹配 / 已重新匹配的数量，
+    提供 playlist_key 时同时返回该播放列表的记录。
+
+    只读查询，但需要 Plex Token 来识别服务器；Token 放在请求体中，不出现在 URL、
+    访问日志和浏览器历史里，因此用 POST。
+    """
+    try:
+        plex = connect_plex(request.plex_url, request.plex_token)
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    store = unmatched_store.default_store()
+    server = plex_cache.server_key(plex)
+    response = {"playlists": store.summary(server), "scan_watermark": store.scan_watermark(server)}
+    if request.playlist_key is not None:
+        response["entries"] = store.entries(server, request.playlist_key, include_matched=request.include_matched)
+    return response
+
+@router.post("/rematch", tags=["Unmatched"])
+async def start_rematch(request: RematchRequest):
+    """
+    音乐库新增音轨后，只用新增的音轨重新匹配之前未匹配的歌曲，命中的追加到对应的播放列表。
+    任务经由共享队列执行，进度通过 /import/status/{task_id} 查询，结束后 result 中为匹配报告。
+    """
+    task_id = job_backend.enqueue(
+        REMATCH_JOB,
+        {"plex_url": request.plex_url, "plex_token": request.plex_token, "full": request.full},
+        state={"status": "pending", "progress": 0, "total": 0, "message": "重新匹配任务已排队"},
+    )
+    job_runner.wake()
+    return {"task_id": task_id, "status_url": f"/api/v1/import/status/{task_id}"}
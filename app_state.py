@@ -1,5 +1,11 @@
-from concurrent.futures import ThreadPoolExecutor
-import uuid
+import os
 
-task_status = {}
-executor = ThreadPoolExecutor(max_workers=4)
\ No newline at end of file
+import job_queue
+
+# 任务队列、任务状态、匹配预览与剖析结果的后端；多个 worker 进程（或共享该后端的多个实例）
+# 可以在任何一个进程上入队、查询和取消任务。PLEXLIST_JOB_BACKEND 选择后端，见 job_queue
+job_backend = job_queue.create_backend(os.environ.get("PLEXLIST_JOB_BACKEND"))
+# 本进程的任务执行器，从共享队列认领任务；随应用启动与关闭（见 main.py）
+job_runner = job_queue.JobRunner(job_backend, max_workers=int(os.environ.get("PLEXLIST_JOB_THREADS", "4")))
+# 本进程正在执行的任务状态: task_id -> 状态字典，任务结束后只保留在后端
+task_status = job_runner.task_status
@@ -0,0 +1,245 @@
+# cli.py
+"""
+无界面的批量导入命令，适合容器、cron 和迁移脚本。
+
+    python cli.py playlists.txt --concurrency 4 --output results.json --unmatched unmatched.json
+
+playlists.txt 每行一个网易云/QQ音乐歌单链接；可在链接后加一个制表符和目标 Plex 播放列表名
+（仅 update_existing 模式使用）。空行和以 # 开头的行会被忽略。
+
+导入完成后仍未匹配的歌曲会记录到 unmatched.db。音乐库新增音轨后（如 cron 定时），
+只用新增的音轨重新匹配这些歌曲并追加到对应的播放列表：
+
+    python cli.py --rematch
+
+Plex 地址和 Token 默认读取 plex_config.json，也可通过参数或环境变量 PLEX_URL / PLEX_TOKEN 指定。
+结果以 JSON 写到 --output（默认 stdout），日志写到 stderr 和 logs/app.log。
+全部歌单导入成功时退出码为 0，任一歌单失败为 1，参数或配置错误为 2。
+按 Ctrl+C 会取消所有任务，已匹配的进度写入断点。
+
+本模块只依赖 logic（--rematch 时再导入 rematch），不导入 tkinter。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import logging_config
+import logic
+
+logger = logging.getLogger("cli")
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+DEFAULT_CONCURRENCY = 2
+
+
+def read_playlist_file(path):
+    """读取歌单列表文件，返回 [(url, 播放列表名或 None)]。"""
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            url, _, name = line.partition("\t")
+            entries.append((url.strip(), name.strip() or None))
+    return entries
+
+
+def fetch_source_playlist(url):
+    """按链接识别平台并获取歌单，返回 (歌曲列表, 歌单名, 平台名)；失败时抛出 ValueError。"""
+    playlist_id = logic.extract_playlist_id(url)
+    if not playlist_id:
+        raise ValueError("无效的播放列表URL或ID")
+    if "music.163.com" in url:
+        songs, title = logic.fetch_netease_playlist(playlist_id)
+        return songs, title, "网易云音乐"
+    if "y.qq.com" in url:
+        songs, title = logic.fetch_qq_playlist(playlist_id)
+        return songs, title, "QQ音乐"
+    raise ValueError("不支持的播放列表URL")
+
+
+def import_one(url, playlist_name, args, cancel_event):
+    """提取并导入一个歌单，返回结果字典。不抛出异常。"""
+    started = time.perf_counter()
+    result = {
+        "url": url,
+        "status": "error",
+        "message": "",
+        "source": None,
+        "source_title": None,
+        "playlist_name": None,
+        "total": 0,
+        "matched": 0,
+        "unmatched_songs": [],
+        "elapsed": 0.0,
+    }
+    try:
+        if cancel_event.is_set():
+            result.update(status="cancelled", message="任务在开始前被取消。")
+            return result
+        songs, source_title, source = fetch_source_playlist(url)
+        result.update(source=source, source_title=source_title, total=len(songs))
+        if not songs:
+            raise ValueError("无法从URL获取任何歌曲。")
+
+        task_id = f"cli-{uuid.uuid4()}"
+        task_status = {}
+        logic._import_to_plex_worker(
+            plex_url=args.plex_url,
+            plex_token=args.plex_token,
+            plex_playlist_name_input=playlist_name or args.playlist_name,
+            songs_to_import=songs,
+            import_mode=args.mode,
+            source_platform_name=source,
+            original_playlist_title_hint=source_title,
+            task_id=task_id,
+            task_status_dict=task_status,
+            cancel_event=cancel_event,
+            sections=args.section,
+        )
+        status = task_status.get(task_id, {})
+        unmatched = status.get("unmatched_songs") or []
+        result.update(
+            status=status.get("status", "error"),
+            message=status.get("message", ""),
+            playlist_name=status.get("playlist_name"),
+            unmatched_songs=[{"title": title, "artist": artist} for title, artist in unmatched],
+            resumable=status.get("resumable", False),
+            task_id=task_id,
+        )
+        if result["status"] == "completed":
+            result["matched"] = len(songs) - len(unmatched)
+    except Exception as e:
+        logger.error(f"导入歌单失败: {url}", exc_info=not isinstance(e, ValueError))
+        result["message"] = str(e)
+    finally:
+        result["elapsed"] = round(time.perf_counter() - started, 2)
+    logger.info(f"[{result['status']}] {url}: {result['message']}")
+    return result
+
+
+def run_batch(entries, args):
+    """以 args.concurrency 的并发度导入所有歌单，按输入顺序返回结果列表。"""
+    cancel_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(import_one, url, name, args, cancel_event) for url, name in entries]
+        try:
+            # 带超时地等待，使主线程能及时响应 Ctrl+C
+            while wait(futures, timeout=0.5).not_done:
+                pass
+        except KeyboardInterrupt:
+            logger.warning("收到中断信号，正在取消所有导入任务...")
+            cancel_event.set()
+            wait(futures)
+    return [future.result() for future in futures]
+
+
+def run_rematch(args):
+    """重新匹配已记录的未匹配歌曲，返回退出码。"""
+    import rematch
+
+    try:
+        plex = logic.connect_plex(args.plex_url, args.plex_token)
+        report = rematch.rematch_unmatched(plex, full=args.full)
+    except ValueError as e:
+        logger.error(f"重新匹配失败: {e}")
+        return EXIT_FAILED
+    _write_json(report, args.output)
+    logger.info(f"重新匹配结束: 扫描 {report['scanned']} 首音轨，命中 {report['matched']}/{report['pending']} 首，"
+                f"更新 {len(report['playlists'])} 个播放列表")
+    return EXIT_FAILED if report["failed_playlists"] else EXIT_OK
+
+
+def _write_json(data, path):
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    if path in (None, "-"):
+        sys.stdout.write(text + "\n")
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build_parser():
+    config = logic.load_plex_config()
+    parser = argparse.ArgumentParser(description="批量将网易云/QQ音乐歌单导入 Plex。")
+    parser.add_argument("playlist_file", nargs="?", help="歌单链接文件，每行一个链接（可选: 链接<Tab>播放列表名）")
+    parser.add_argument("--plex-url", default=os.environ.get("PLEX_URL") or config.get("plex_url"),
+                        help="Plex 服务器地址（默认读取 PLEX_URL 或 plex_config.json）")
+    parser.add_argument("--plex-token", default=os.environ.get("PLEX_TOKEN") or config.get("plex_token"),
+                        help="Plex Token（默认读取 PLEX_TOKEN 或 plex_config.json）")
+    parser.add_argument("--mode", choices=("create_new", "update_existing"), default="create_new",
+                        help="导入模式（默认 create_new）")
+    parser.add_argument("--playlist-name", default=config.get("plex_playlist_name", "导入的歌单"),
+                        help="update_existing 模式下未在文件中指定名称时使用的播放列表名")
+    parser.add_argument("--section", action="append",
+                        help="只在该音乐库分区（key 或名称）中匹配，可重复指定（默认全部音乐分区）")
+    parser.add_argument("-j", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"同时导入的歌单数（默认 {DEFAULT_CONCURRENCY}）")
+    parser.add_argument("-o", "--output", default="-", help="结果 JSON 的输出路径（默认 stdout）")
+    parser.add_argument("--unmatched", help="未匹配歌曲报告（JSON）的输出路径")
+    parser.add_argument("--rematch", action="store_true",
+                        help="不导入歌单，只用音乐库中新增的音轨重新匹配之前未匹配的歌曲")
+    parser.add_argument("--full", action="store_true", help="与 --rematch 一起使用：与整个音乐库重新匹配")
+    parser.add_argument("--log-level", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="stderr 上显示的日志级别（默认 INFO）")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging_config.setup_logging(console_stream=sys.stderr, console_level=getattr(logging, args.log_level))
+
+    if not args.plex_url or not args.plex_token:
+        parser.error("缺少 Plex 地址或 Token，请通过参数、环境变量或 plex_config.json 提供。")
+    if args.rematch:
+        return run_rematch(args)
+    if args.concurrency < 1:
+        parser.error("--concurrency 必须大于 0")
+    if not args.playlist_file:
+        parser.error("缺少歌单链接文件。")
+    try:
+        entries = read_playlist_file(args.playlist_file)
+    except OSError as e:
+        parser.error(f"无法读取歌单文件: {e}")
+    if not entries:
+        parser.error("歌单文件中没有任何链接。")
+
+    started = time.perf_counter()
+    results = run_batch(entries, args)
+    failed = [r for r in results if r["status"] != "completed"]
+    summary = {
+        "total_playlists": len(results),
+        "completed": len(results) - len(failed),
+        "failed": len(failed),
+        "songs": sum(r["total"] for r in results),
+        "matched": sum(r["matched"] for r in results),
+        "elapsed": round(time.perf_counter() - started, 2),
+    }
+    _write_json({"summary": summary, "results": results}, args.output)
+    if args.unmatched:
+        _write_json([
+            {"url": r["url"], "playlist_name": r["playlist_name"], **song}
+            for r in results for song in r["unmatched_songs"]
+        ], args.unmatched)
+
+    logger.info(f"批量导入结束: 成功 {summary['completed']} 个，失败 {summary['failed']} 个，"
+                f"匹配 {summary['matched']}/{summary['songs']} 首")
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
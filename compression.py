@@ -0,0 +1,130 @@
+# compression.py
+"""
+响应压缩中间件（ASGI）。
+
+按 Accept-Encoding 协商 brotli（需安装可选依赖 brotli）或 gzip，只压缩文本类、
+且不小于 COMPRESSION_MIN_SIZE 的响应。JSON 歌单、状态响应和静态文件都经过这里；
+数 MB 的歌曲列表压缩后通常只剩十分之一左右。
+
+是否压缩在收到响应头时就决定：只有状态码、Content-Type、Content-Encoding 与 Content-Length
+都符合条件的响应才会被缓冲后整体压缩；其余响应（二进制、已压缩、过小、未声明长度的流式响应）
+原样逐块转发，不会被整个缓冲在内存中。
+
+压缩后的表示与原表示字节不同，已有的强 ETag 会改为弱 ETag（W/"..."），
+If-None-Match 的比较按弱比较进行，仍然可以命中 304。
+"""
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import lazy_import
+
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def _accepted_encodings(accept_encoding):
+    """解析 Accept-Encoding，返回 q > 0 的编码集合。"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    accepted = _accepted_encodings(accept_encoding or "")
+    if "br" in accepted and lazy_import.optional("brotli") is not None:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return lazy_import.optional("brotli").compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressing = False
+        chunks = []
+
+        async def wrapped_send(message):
+            nonlocal start_message, compressing
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                compressing = self._should_compress(message["status"], headers)
+                if compressing:
+                    start_message = message
+                    return
+                _add_vary(headers)
+                await send({**message, "headers": headers.raw})
+                return
+            if not compressing or message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await self._send_compressed(send, start_message, b"".join(chunks), encoding)
+
+        await self.app(scope, receive, wrapped_send)
+
+    def _should_compress(self, status, headers):
+        """按响应头判断是否压缩；未声明 Content-Length 的流式响应不缓冲，直接转发。"""
+        if status in (204, 304) or "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        try:
+            return int(headers.get("content-length", "")) >= self.minimum_size
+        except ValueError:
+            return False
+
+    async def _send_compressed(self, send, start_message, body, encoding):
+        headers = MutableHeaders(raw=list(start_message["headers"]))
+        body = compress(body, encoding)
+        headers["content-encoding"] = encoding
+        headers["content-length"] = str(len(body))
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = f"W/{etag}"
+        _add_vary(headers)
+        await send({**start_message, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _add_vary(headers):
+    if "content-type" in headers:
+        # 无论是否压缩，缓存都应按 Accept-Encoding 区分
+        vary = headers.get("vary")
+        if not vary:
+            headers["vary"] = "Accept-Encoding"
+        elif "accept-encoding" not in vary.lower():
+            headers["vary"] = f"{vary}, Accept-Encoding"
@@ -1,6 +1,5 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import requests
 import re
 import json
 import threading
@@ -12,19 +11,8 @@ import logging_config
 from logging_config import log_queue
 from queue import Empty
 
-# 在 main 函数或脚本开始处
-logging_config.setup_logging()
-logging_config.setup_exception_handling() # 设置全局异常钩子
 logger = logging.getLogger(__name__)
 
-try:
-    from plexapi.server import PlexServer
-    from plexapi.exceptions import NotFound, Unauthorized
-except ImportError:
-    PlexServer = None
-    NotFound = None
-    Unauthorized = None
-
 
 # ------------- GUI Event Handlers (Modified and New) -------------
 # ... (current_extracted_playlist_title 定义在 root 创建后) ...
@@ -47,6 +35,7 @@ def on_extract():
     update_status_bar(f"正在从 {source} 提取歌单ID: {playlist_id}...")
 
     def extraction_task():
+        import requests
         songs = []
         playlist_title_from_fetch = "未知歌单"
         try:
@@ -61,9 +50,9 @@ def on_extract():
                     messagebox.showinfo("提示", "歌单为空或未能获取到歌曲。")
                     update_status_bar("提取完成：歌单为空或未能获取到歌曲。")
                 else:
-                    for name, artist in songs:
-                        song_listbox.insert(tk.END, f"{name} - {artist}")
-                        current_playlist.append((name, artist))
+                    # 一次 insert 调用批量写入整个列表，避免逐行触发重绘
+                    song_listbox.insert(tk.END, *(f"{name} - {artist}" for name, artist in songs))
+                    current_playlist.extend(songs)
                     msg = f"成功提取歌单 '{playlist_title_from_fetch}' ({len(songs)} 首歌曲)！"
                     messagebox.showinfo("完成", msg)
                     update_status_bar(f"提取完成：{msg}")
@@ -109,7 +98,7 @@ def on_clear():
     update_status_bar("歌单已清空。")
 
 def on_import_to_plex():
-    if PlexServer is None:
+    if logic.PlexServer is None:
         logger.error("PlexAPI库未安装。")
         messagebox.showerror("错误", "PlexAPI库未安装。\n请在命令行执行: pip install plexapi")
         return
@@ -142,9 +131,6 @@ def on_import_to_plex():
     })
     import_plex_button.config(state=tk.DISABLED)
     
-    def progress_callback(message):
-        root.after(0, lambda: update_status_bar(message))
-
     # 修改 completion_callback 以接收 unmatched_songs
     def completion_callback(success, message, unmatched_songs, final_playlist_name="未知歌单"):
         root.after(0, lambda: import_plex_button.config(state=tk.NORMAL))
@@ -200,13 +186,60 @@ def on_import_to_plex():
     source_platform = source_var.get()
     original_title_hint = current_extracted_playlist_title.get()
 
+    # 同一歌单存在未完成的断点时，询问是否从断点继续
+    resume_from = logic.load_checkpoint(GUI_TASK_ID)
+    if resume_from and [tuple(song) for song in resume_from["songs"]] != songs_to_import_copy:
+        resume_from = None
+    if resume_from and not messagebox.askyesno(
+            "继续导入",
+            f"检测到上次未完成的导入（'{resume_from['playlist_name']}'，已处理 {resume_from['cursor']}/{len(songs_to_import_copy)} 首）。\n是否从断点继续？"):
+        logic.delete_checkpoint(GUI_TASK_ID)
+        resume_from = None
+
+    global import_cancel_event
+    import_cancel_event = threading.Event()
+    gui_task_status.pop(GUI_TASK_ID, None)
+    cancel_import_button.config(state=tk.NORMAL)
+
     thread = threading.Thread(target=logic._import_to_plex_worker,
-                              args=(plex_url, plex_token, plex_playlist_name_str,
-                                    songs_to_import_copy, import_mode_val,
-                                    source_platform, original_title_hint,
-                                    progress_callback, completion_callback),
+                              kwargs=dict(plex_url=plex_url, plex_token=plex_token,
+                                          plex_playlist_name_input=plex_playlist_name_str,
+                                          songs_to_import=songs_to_import_copy, import_mode=import_mode_val,
+                                          source_platform_name=source_platform,
+                                          original_playlist_title_hint=original_title_hint,
+                                          task_id=GUI_TASK_ID, task_status_dict=gui_task_status,
+                                          cancel_event=import_cancel_event, resume_from=resume_from),
                               daemon=True)
     thread.start()
+    root.after(IMPORT_POLL_INTERVAL_MS, watch_import_task, completion_callback)
+
+def watch_import_task(completion_callback):
+    """轮询 GUI 导入任务的状态字典，结束时交给 completion_callback"""
+    status = gui_task_status.get(GUI_TASK_ID, {})
+    state = status.get("status")
+    if state not in ("completed", "error", "cancelled"):
+        if status.get("message"):
+            status_var.set(status["message"])
+        root.after(IMPORT_POLL_INTERVAL_MS, watch_import_task, completion_callback)
+        return
+
+    cancel_import_button.config(state=tk.DISABLED)
+    if state == "cancelled":
+        import_plex_button.config(state=tk.NORMAL)
+        message = status["message"]
+        if status.get("resumable"):
+            message += "\n再次点击“导入到Plex”可从断点继续。"
+        update_status_bar(status["message"])
+        messagebox.showinfo("导入已取消", message)
+        return
+    completion_callback(state == "completed", status.get("message", ""),
+                        status.get("unmatched_songs", []), status.get("playlist_name") or "未知歌单")
+
+def on_cancel_import():
+    if import_cancel_event is not None and not import_cancel_event.is_set():
+        import_cancel_event.set()
+        cancel_import_button.config(state=tk.DISABLED)
+        update_status_bar("正在取消导入，当前歌曲处理完后停止...")
 
 def update_status_bar(text):
     status_var.set(text)
@@ -215,9 +248,22 @@ def update_status_bar(text):
 
 # ------------- GUI 界面布局 -------------
 
+# GUI 同一时间只运行一个导入任务，固定任务ID以便下次启动时找到断点
+GUI_TASK_ID = "gui"
+IMPORT_POLL_INTERVAL_MS = 200
+gui_task_status = {}
+import_cancel_event = None
+
+# 日志面板最多保留的行数，超出后裁剪最旧的行（可在 plex_config.json 中用 log_viewer_max_lines 覆盖）
+LOG_VIEWER_MAX_LINES = 2000
+# 每次轮询最多从队列取出的日志条数，剩余的留到下一次轮询
+LOG_POLL_BATCH_SIZE = 500
+LOG_POLL_INTERVAL_MS = 100
+
 class LogViewer(ttk.Frame):
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, *args, max_lines=LOG_VIEWER_MAX_LINES, **kwargs):
         super().__init__(parent, *args, **kwargs)
+        self.max_lines = max_lines
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
 
@@ -235,115 +281,154 @@ class LogViewer(ttk.Frame):
         self.log_text.tag_config('ERROR', foreground='red', font=('Helvetica', '9', 'bold'))
         self.log_text.tag_config('CRITICAL', foreground='red', background='yellow', font=('Helvetica', '9', 'bold'))
 
+    @staticmethod
+    def format_record(record):
+        # record.asctime 由 GUI 队列 Handler 的 formatter 填充
+        return f"{record.asctime} - {record.name} - {record.levelname} - {record.getMessage()}\n"
+
     def add_log_message(self, record):
-        # 从 record 中提取级别和消息
-        level = record.levelname
-        msg = record.getMessage()
-        # 格式化最终消息
-        formatted_msg = f"{record.asctime} - {record.name} - {level} - {msg}\n"
+        self.add_log_messages([record])
+
+    def add_log_messages(self, records):
+        """一次性插入一批日志：同级别的相邻记录合并为一段，整批只调用一次 insert"""
+        if not records:
+            return
+
+        insert_args = []
+        chunk = []
+        chunk_level = records[0].levelname
+        for record in records:
+            if record.levelname != chunk_level:
+                insert_args.extend(("".join(chunk), chunk_level))
+                chunk = []
+                chunk_level = record.levelname
+            chunk.append(self.format_record(record))
+        insert_args.extend(("".join(chunk), chunk_level))
+
+        # 只有在用户停留在底部时才自动滚动
+        at_bottom = self.log_text.yview()[1] >= 0.999
 
         self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, formatted_msg, record.levelname)
+        self.log_text.insert(tk.END, *insert_args)
+        self._trim()
         self.log_text.config(state=tk.DISABLED)
-        self.log_text.yview(tk.END)
+        if at_bottom:
+            self.log_text.yview(tk.END)
+
+    def _trim(self):
+        # 'end-1c' 落在最后一个换行之后时，那一行是空行，不计入行数
+        line, column = (int(part) for part in self.log_text.index('end-1c').split('.'))
+        line_count = line - 1 if column == 0 else line
+        excess = line_count - self.max_lines
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
 
 def poll_log_queue(log_viewer_widget):
-    while True:
+    records = []
+    while len(records) < LOG_POLL_BATCH_SIZE:
         try:
-            record = log_queue.get(block=False)
-            log_viewer_widget.add_log_message(record)
+            records.append(log_queue.get(block=False))
         except Empty:
             break
+    log_viewer_widget.add_log_messages(records)
     # 每 100ms 检查一次
-    root.after(100, poll_log_queue, log_viewer_widget)
-
-
-root = tk.Tk()
-root.title("网易云 / QQ音乐 歌单提取及Plex导入工具")
-
-current_extracted_playlist_title = tk.StringVar(value="未知歌单")
-status_var = tk.StringVar()
-
-plex_cfg = logic.load_plex_config()
-current_playlist = []
-
-main_paned_window = ttk.PanedWindow(root, orient=tk.VERTICAL)
-main_paned_window.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-# ... (extraction_frame_container, song_list_main_frame, plex_frame_container 不变) ...
-extraction_frame_container = ttk.Frame(main_paned_window, padding=5)
-main_paned_window.add(extraction_frame_container, weight=0)
-extraction_frame_container.grid_columnconfigure(1, weight=1)
-ttk.Label(extraction_frame_container, text="歌单来源：").grid(row=0, column=0, padx=(0,5), pady=5, sticky="w")
-source_var = tk.StringVar(value="网易云音乐")
-source_dropdown = ttk.Combobox(extraction_frame_container, textvariable=source_var, values=["网易云音乐", "QQ音乐"], state="readonly", width=15)
-source_dropdown.grid(row=0, column=1, pady=5, sticky="w")
-ttk.Label(extraction_frame_container, text="歌单ID/链接：").grid(row=1, column=0, padx=(0,5), pady=5, sticky="w")
-playlist_entry = ttk.Entry(extraction_frame_container)
-playlist_entry.grid(row=1, column=1, pady=5, sticky="ew")
-extract_button = ttk.Button(extraction_frame_container, text="提取歌单", command=on_extract)
-extract_button.grid(row=2, column=0, columnspan=2, pady=10, sticky="ew")
-
-song_list_main_frame = ttk.Frame(main_paned_window, padding=5)
-main_paned_window.add(song_list_main_frame, weight=1)
-song_list_main_frame.grid_rowconfigure(0, weight=1)
-song_list_main_frame.grid_columnconfigure(0, weight=1)
-list_frame = ttk.Frame(song_list_main_frame)
-list_frame.grid(row=0, column=0, sticky="nsew", pady=(0,5))
-list_frame.grid_rowconfigure(0, weight=1)
-list_frame.grid_columnconfigure(0, weight=1)
-song_listbox = tk.Listbox(list_frame, selectmode=tk.EXTENDED, width=70, height=15)
-song_listbox.grid(row=0, column=0, sticky="nsew")
-scrollbar_y = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=song_listbox.yview)
-scrollbar_y.grid(row=0, column=1, sticky="ns")
-song_listbox.configure(yscrollcommand=scrollbar_y.set)
-scrollbar_x = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=song_listbox.xview)
-scrollbar_x.grid(row=1, column=0, sticky="ew")
-song_listbox.configure(xscrollcommand=scrollbar_x.set)
-list_btn_frame = ttk.Frame(song_list_main_frame)
-list_btn_frame.grid(row=1, column=0, sticky="ew")
-list_btn_frame.grid_columnconfigure(0, weight=1)
-list_btn_frame.grid_columnconfigure(1, weight=1)
-ttk.Button(list_btn_frame, text="删除选中", command=on_delete_selected).pack(side=tk.LEFT, padx=5, expand=True)
-ttk.Button(list_btn_frame, text="清空歌单", command=on_clear).pack(side=tk.LEFT, padx=5, expand=True)
-
-plex_frame_container = ttk.LabelFrame(main_paned_window, text="Plex导入设置", padding=10)
-main_paned_window.add(plex_frame_container, weight=0)
-plex_frame_container.grid_columnconfigure(1, weight=1)
-plex_import_mode_var = tk.StringVar(value=plex_cfg.get("plex_import_mode", "create_new"))
-mode_frame = ttk.Frame(plex_frame_container)
-mode_frame.grid(row=0, column=0, columnspan=2, pady=2, sticky="w")
-ttk.Label(mode_frame, text="导入模式:").pack(side=tk.LEFT, padx=(0,5))
-ttk.Radiobutton(mode_frame, text="创建新歌单", variable=plex_import_mode_var, value="create_new").pack(side=tk.LEFT)
-ttk.Radiobutton(mode_frame, text="更新/覆盖现有", variable=plex_import_mode_var, value="update_existing").pack(side=tk.LEFT, padx=(10,0))
-ttk.Label(plex_frame_container, text="Plex 服务器URL:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
-plex_url_entry = ttk.Entry(plex_frame_container, width=40)
-plex_url_entry.grid(row=1, column=1, padx=5, pady=2, sticky="ew")
-plex_url_entry.insert(0, plex_cfg.get("plex_url", "http://localhost:32400"))
-ttk.Label(plex_frame_container, text="Plex Token:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
-plex_token_entry = ttk.Entry(plex_frame_container, width=40, show="*")
-plex_token_entry.grid(row=2, column=1, padx=5, pady=2, sticky="ew")
-plex_token_entry.insert(0, plex_cfg.get("plex_token", ""))
-ttk.Label(plex_frame_container, text="Plex 播放列表名:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
-plex_playlist_name_entry = ttk.Entry(plex_frame_container, width=40)
-plex_playlist_name_entry.grid(row=3, column=1, padx=5, pady=2, sticky="ew")
-plex_playlist_name_entry.insert(0, plex_cfg.get("plex_playlist_name", "导入的歌单"))
-ttk.Label(plex_frame_container, text="(“更新/覆盖”模式下使用此名称；“创建新的”模式下会自动生成名称)").grid(row=4, column=1, padx=5, pady=(0,5), sticky="w", columnspan=1)
-import_plex_button = ttk.Button(plex_frame_container, text="导入到Plex", command=on_import_to_plex)
-import_plex_button.grid(row=5, column=0, columnspan=2, pady=10, sticky="ew")
-
-# 添加日志查看器
-log_frame = ttk.LabelFrame(main_paned_window, text="日志", padding=5)
-main_paned_window.add(log_frame, weight=0) # weight=0 表示初始高度较小
-log_viewer = LogViewer(log_frame)
-log_viewer.pack(fill=tk.BOTH, expand=True)
-
-status_bar = ttk.Label(root, textvariable=status_var, relief=tk.SUNKEN, anchor=tk.W, padding=2)
-status_bar.pack(side=tk.BOTTOM, fill=tk.X)
-update_status_bar("就绪。")
-
-# 启动日志队列轮询
-poll_log_queue(log_viewer)
-
-root.minsize(550, 750) # 增加最小高度以容纳日志面板
-root.mainloop()
\ No newline at end of file
+    root.after(LOG_POLL_INTERVAL_MS, poll_log_queue, log_viewer_widget)
+
+
+# 导入本模块不会创建窗口或配置日志，只有直接运行时才启动界面
+if __name__ == "__main__":
+    logging_config.setup_logging()
+    logging_config.attach_gui_handler() # 仅 GUI 需要把日志送到界面
+    logging_config.setup_exception_handling() # 设置全局异常钩子
+
+    root = tk.Tk()
+    root.title("网易云 / QQ音乐 歌单提取及Plex导入工具")
+
+    current_extracted_playlist_title = tk.StringVar(value="未知歌单")
+    status_var = tk.StringVar()
+
+    plex_cfg = logic.load_plex_config()
+    current_playlist = []
+
+    main_paned_window = ttk.PanedWindow(root, orient=tk.VERTICAL)
+    main_paned_window.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    # ... (extraction_frame_container, song_list_main_frame, plex_frame_container 不变) ...
+    extraction_frame_container = ttk.Frame(main_paned_window, padding=5)
+    main_paned_window.add(extraction_frame_container, weight=0)
+    extraction_frame_container.grid_columnconfigure(1, weight=1)
+    ttk.Label(extraction_frame_container, text="歌单来源：").grid(row=0, column=0, padx=(0,5), pady=5, sticky="w")
+    source_var = tk.StringVar(value="网易云音乐")
+    source_dropdown = ttk.Combobox(extraction_frame_container, textvariable=source_var, values=["网易云音乐", "QQ音乐"], state="readonly", width=15)
+    source_dropdown.grid(row=0, column=1, pady=5, sticky="w")
+    ttk.Label(extraction_frame_container, text="歌单ID/链接：").grid(row=1, column=0, padx=(0,5), pady=5, sticky="w")
+    playlist_entry = ttk.Entry(extraction_frame_container)
+    playlist_entry.grid(row=1, column=1, pady=5, sticky="ew")
+    extract_button = ttk.Button(extraction_frame_container, text="提取歌单", command=on_extract)
+    extract_button.grid(row=2, column=0, columnspan=2, pady=10, sticky="ew")
+
+    song_list_main_frame = ttk.Frame(main_paned_window, padding=5)
+    main_paned_window.add(song_list_main_frame, weight=1)
+    song_list_main_frame.grid_rowconfigure(0, weight=1)
+    song_list_main_frame.grid_columnconfigure(0, weight=1)
+    list_frame = ttk.Frame(song_list_main_frame)
+    list_frame.grid(row=0, column=0, sticky="nsew", pady=(0,5))
+    list_frame.grid_rowconfigure(0, weight=1)
+    list_frame.grid_columnconfigure(0, weight=1)
+    song_listbox = tk.Listbox(list_frame, selectmode=tk.EXTENDED, width=70, height=15)
+    song_listbox.grid(row=0, column=0, sticky="nsew")
+    scrollbar_y = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=song_listbox.yview)
+    scrollbar_y.grid(row=0, column=1, sticky="ns")
+    song_listbox.configure(yscrollcommand=scrollbar_y.set)
+    scrollbar_x = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=song_listbox.xview)
+    scrollbar_x.grid(row=1, column=0, sticky="ew")
+    song_listbox.configure(xscrollcommand=scrollbar_x.set)
+    list_btn_frame = ttk.Frame(song_list_main_frame)
+    list_btn_frame.grid(row=1, column=0, sticky="ew")
+    list_btn_frame.grid_columnconfigure(0, weight=1)
+    list_btn_frame.grid_columnconfigure(1, weight=1)
+    ttk.Button(list_btn_frame, text="删除选中", command=on_delete_selected).pack(side=tk.LEFT, padx=5, expand=True)
+    ttk.Button(list_btn_frame, text="清空歌单", command=on_clear).pack(side=tk.LEFT, padx=5, expand=True)
+
+    plex_frame_container = ttk.LabelFrame(main_paned_window, text="Plex导入设置", padding=10)
+    main_paned_window.add(plex_frame_container, weight=0)
+    plex_frame_container.grid_columnconfigure(1, weight=1)
+    plex_import_mode_var = tk.StringVar(value=plex_cfg.get("plex_import_mode", "create_new"))
+    mode_frame = ttk.Frame(plex_frame_container)
+    mode_frame.grid(row=0, column=0, columnspan=2, pady=2, sticky="w")
+    ttk.Label(mode_frame, text="导入模式:").pack(side=tk.LEFT, padx=(0,5))
+    ttk.Radiobutton(mode_frame, text="创建新歌单", variable=plex_import_mode_var, value="create_new").pack(side=tk.LEFT)
+    ttk.Radiobutton(mode_frame, text="更新/覆盖现有", variable=plex_import_mode_var, value="update_existing").pack(side=tk.LEFT, padx=(10,0))
+    ttk.Label(plex_frame_container, text="Plex 服务器URL:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+    plex_url_entry = ttk.Entry(plex_frame_container, width=40)
+    plex_url_entry.grid(row=1, column=1, padx=5, pady=2, sticky="ew")
+    plex_url_entry.insert(0, plex_cfg.get("plex_url", "http://localhost:32400"))
+    ttk.Label(plex_frame_container, text="Plex Token:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+    plex_token_entry = ttk.Entry(plex_frame_container, width=40, show="*")
+    plex_token_entry.grid(row=2, column=1, padx=5, pady=2, sticky="ew")
+    plex_token_entry.insert(0, plex_cfg.get("plex_token", ""))
+    ttk.Label(plex_frame_container, text="Plex 播放列表名:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+    plex_playlist_name_entry = ttk.Entry(plex_frame_container, width=40)
+    plex_playlist_name_entry.grid(row=3, column=1, padx=5, pady=2, sticky="ew")
+    plex_playlist_name_entry.insert(0, plex_cfg.get("plex_playlist_name", "导入的歌单"))
+    ttk.Label(plex_frame_container, text="(“更新/覆盖”模式下使用此名称；“创建新的”模式下会自动生成名称)").grid(row=4, column=1, padx=5, pady=(0,5), sticky="w", columnspan=1)
+    import_plex_button = ttk.Button(plex_frame_container, text="导入到Plex", command=on_import_to_plex)
+    import_plex_button.grid(row=5, column=0, pady=10, sticky="ew")
+    cancel_import_button = ttk.Button(plex_frame_container, text="取消导入", command=on_cancel_import, state=tk.DISABLED)
+    cancel_import_button.grid(row=5, column=1, padx=(5,0), pady=10, sticky="ew")
+
+    # 添加日志查看器
+    log_frame = ttk.LabelFrame(main_paned_window, text="日志", padding=5)
+    main_paned_window.add(log_frame, weight=0) # weight=0 表示初始高度较小
+    log_viewer = LogViewer(log_frame, max_lines=plex_cfg.get("log_viewer_max_lines", LOG_VIEWER_MAX_LINES))
+    log_viewer.pack(fill=tk.BOTH, expand=True)
+
+    status_bar = ttk.Label(root, textvariable=status_var, relief=tk.SUNKEN, anchor=tk.W, padding=2)
+    status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+    update_status_bar("就绪。")
+
+    # 启动日志队列轮询
+    poll_log_queue(log_viewer)
+
+    root.minsize(550, 750) # 增加最小高度以容纳日志面板
+    root.mainloop()
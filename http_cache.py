@@ -0,0 +1,101 @@
+# http_cache.py
+"""
+HTTP 缓存相关的辅助：ETag / If-None-Match 与静态资源的缓存头。
+
+- index.html 中引用的 /static/ 资源会被改写为带内容哈希的地址（?v=<哈希>），
+  带 v 参数的静态资源返回一年的 immutable 缓存，内容变化时地址随之变化；
+- 不带 v 参数的静态资源与 index.html 返回 no-cache，由浏览器用 ETag 重新验证；
+- JSON 结果（如歌单提取）按内容计算 ETag，请求带匹配的 If-None-Match 时返回 304。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+
+STATIC_IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+_STATIC_REF_PATTERN = re.compile(r'(["\'])/static/([^"\'?#]+)\1')
+
+
+def compute_etag(content):
+    return f'"{hashlib.blake2b(content, digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """按弱比较判断 If-None-Match 是否命中（压缩中间件会把 ETag 改为弱 ETag）。"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == bare:
+            return True
+    return False
+
+
+def conditional_response(request: Request, content, media_type, cache_control=REVALIDATE_CACHE):
+    """带 ETag 的响应；If-None-Match 命中时返回不带正文的 304。"""
+    etag = compute_etag(content)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def json_response(request: Request, payload, cache_control="private, no-cache"):
+    """序列化为 JSON 并支持 If-None-Match。"""
+    content = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return conditional_response(request, content, "application/json", cache_control)
+
+
+class CachedStaticFiles(StaticFiles):
+    """在 StaticFiles（已支持 ETag/Last-Modified 与 304）的基础上设置 Cache-Control。"""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            versioned = b"v=" in scope.get("query_string", b"")
+            response.headers["Cache-Control"] = STATIC_IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE
+        return response
+
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+
+
+def versioned_index(index_path, static_dir):
+    """返回把 /static/ 引用改写为带内容哈希地址后的 index.html 字节；文件未变化时使用缓存。"""
+    with open(index_path, "r", encoding="utf-8") as f:
+        html = f.read()
+    refs = sorted({name for _, name in _STATIC_REF_PATTERN.findall(html)})
+    paths = [index_path] + [os.path.join(static_dir, name) for name in refs]
+    key = tuple((p, os.path.getmtime(p)) for p in paths if os.path.exists(p))
+    with _index_lock:
+        cached = _index_cache.get(index_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    def add_version(match):
+        quote, name = match.groups()
+        path = os.path.join(static_dir, name)
+        if not os.path.exists(path):
+            return match.group(0)
+        return f"{quote}/static/{name}?v={_file_digest(path)}{quote}"
+
+    content = _STATIC_REF_PATTERN.sub(add_version, html).encode("utf-8")
+    with _index_lock:
+        _index_cache[index_path] = (key, content)
+    return content
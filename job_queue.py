@@ -0,0 +1,852 @@
+# job_queue.py
+"""
+导入任务的共享队列与任务状态。
+
+进程内的字典和线程池无法在 `uvicorn --workers N` 或多个容器之间共享，状态轮询可能落到
+从未见过该任务的 worker 上。这里把任务与状态放进可插拔的后端：
+
+- 任何 worker 都可以入队（enqueue），每个进程的 JobRunner 从队列认领（claim）任务，在本地线程中执行；
+- 执行中的任务状态按版本号写回后端，未匹配歌曲与流式匹配结果（results）只追加新增部分；任何 worker 都能读到状态；
+- 认领带租约，执行者定期续租。进程崩溃后租约过期，任务由其他 worker 重新认领，执行函数可从断点继续；
+  正常关闭的进程则把运行中的任务写入断点后放回队列；
+- payload 中的凭据（SECRET_PAYLOAD_KEYS，如 plex_token）只在排队期间保存，认领时即从后端删去，
+  只留在执行者的内存中；正常关闭时随任务一起放回，进程崩溃后重新认领的任务则没有凭据；
+- 取消请求写入后端，执行者续租时读到后置位本地的 cancel_event；
+- 匹配预览、分页提取的歌单快照和剖析结果也存放在后端，预览与提交、同一歌单的各页可以落在不同的 worker 上。
+
+默认后端是 SQLite 文件（WAL 模式），同一主机上的所有 worker 共享。WAL 不支持网络文件系统，
+跨主机部署需要通过 register_backend() 注册共享的后端（如 PostgreSQL、Redis），
+再用环境变量 PLEXLIST_JOB_BACKEND 选择，例如 `sqlite:///jobs.db`、`memory://`。
+"""
+import contextlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND_URL = "sqlite:///jobs.db"
+LEASE_SECONDS = 60           # 认领租约，执行者每个轮询周期续租一次
+POLL_INTERVAL = 0.5          # 秒，认领新任务、写回状态、检查取消请求的间隔
+JOB_RETENTION = 7 * 24 * 3600  # 秒，已结束的任务及其状态保留多久
+PURGE_INTERVAL = 3600        # 秒，清理过期任务的间隔
+MAX_MATCH_PREVIEWS = 32      # 保留的匹配预览数，超出时淘汰最早的
+MAX_EXTRACT_SNAPSHOTS = 32   # 保留的分页提取快照数，超出时淘汰最早的
+SQLITE_BUSY_TIMEOUT = 10     # 秒，等待其他进程释放写锁的时间
+
+# 任务的生命周期: queued -> running -> done（完成、失败、取消都记为 done，具体结果见任务状态）
+JOB_QUEUED, JOB_RUNNING, JOB_DONE = "queued", "running", "done"
+
+# 认领后不再保存在后端的 payload 键
+SECRET_PAYLOAD_KEYS = ("plex_token",)
+
+
+def _scrubbed(payload):
+    """去掉凭据后的 payload 副本。"""
+    return {key: value for key, value in payload.items() if key not in SECRET_PAYLOAD_KEYS}
+
+
+class Job:
+    """
+    被认领的任务。
+
+    payload 为入队时的 JSON 参数；attempts 为第几次被认领，大于 1 表示上一个执行者已失联或随进程关闭而中断。
+    上一个执行者失联时 payload 中没有 SECRET_PAYLOAD_KEYS 中的凭据。
+    task_status 与 cancel_event 由 JobRunner 提供：执行函数把状态写入 task_status[task_id]
+    （原地更新，由 JobRunner 写回后端），并在 cancel_event 置位后尽快停止。
+    """
+    __slots__ = ("task_id", "kind", "payload", "attempts", "task_status", "cancel_event")
+
+    def __init__(self, task_id, kind, payload, attempts):
+        self.task_id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.task_status = None
+        self.cancel_event = None
+
+
+class JobBackend:
+    """任务后端接口。实现需要保证多个进程同时调用时 claim 不会把同一个任务交给两个 worker。"""
+
+    def enqueue(self, kind, payload, task_id=None, state=None):
+        """入队并写入初始状态，返回 task_id。同一 task_id 的任务仍在排队或运行时抛出 ValueError。"""
+        raise NotImplementedError
+
+    def claim(self, worker_id, lease=LEASE_SECONDS):
+        """认领最早排队的任务（或租约已过期的运行中任务），返回 Job；没有可执行的任务时返回 None。"""
+        raise NotImplementedError
+
+    def renew(self, task_id, worker_id, state=None, lease=LEASE_SECONDS):
+        """
+        续租，并在 state 不为 None 时写回任务状态。
+        返回任务是否应继续执行：已请求取消或租约已被其他 worker 接管时返回 False。
+        """
+        raise NotImplementedError
+
+    def finish(self, task_id, worker_id, state=None):
+        """写回最终状态并把任务标记为结束，同时丢弃入队参数（其中含有 Plex 令牌）。"""
+        raise NotImplementedError
+
+    def release(self, task_id, worker_id, state=None, payload=None):
+        """
+        进程关闭时把运行中的任务放回队列，由其他 worker（或重启后的进程）重新认领；
+        已请求取消的任务则直接结束。payload 为认领时取得的完整参数，放回队列时连同凭据一起写回。
+        """
+        raise NotImplementedError
+
+    def request_cancel(self, task_id):
+        """
+        请求取消任务，返回请求前的任务状态（queued / running / done），任务不存在时返回 None。
+        排队中的任务直接结束并标记为已取消；运行中的任务由执行者在下次续租时得知。
+        """
+        raise NotImplementedError
+
+    def job_status(self, task_id):
+        """任务的生命周期状态（queued / running / done），不存在时返回 None。"""
+        raise NotImplementedError
+
+    def load_state(self, task_id):
+        """读取任务状态字典，结构与执行函数写入的相同，可直接交给 logic.task_status_delta；不存在时返回 None。"""
+        raise NotImplementedError
+
+    def save_profile(self, task_id, summary, exports):
+        """保存任务的剖析结果: summary 为摘要字典，exports 为 {格式: 文本}。"""
+        raise NotImplementedError
+
+    def profile_summary(self, task_id):
+        raise NotImplementedError
+
+    def profile_export(self, task_id, fmt):
+        raise NotImplementedError
+
+    def save_preview(self, preview_id, preview):
+        """保存匹配预览，超过 MAX_MATCH_PREVIEWS 时淘汰最早的。"""
+        raise NotImplementedError
+
+    def load_preview(self, preview_id):
+        raise NotImplementedError
+
+    def save_extract_snapshot(self, snapshot_id, snapshot):
+        """保存分页提取的歌单快照（含 created_at），超过 MAX_EXTRACT_SNAPSHOTS 时淘汰最早的。"""
+        raise NotImplementedError
+
+    def load_extract_snapshot(self, snapshot_id):
+        raise NotImplementedError
+
+    def purge(self, before):
+        """删除 before（时间戳）之前结束的任务及其状态、剖析结果。"""
+        raise NotImplementedError
+
+
+def _with_fields(state, **fields):
+    """返回更新了若干状态字段的副本；带版本号的状态同时推进版本，使增量轮询能看到变化。"""
+    state = {**state, **fields}
+    if "version" in state:
+        version = state["version"] + 1
+        state["version"] = version
+        state["field_versions"] = {**state.get("field_versions", {}), **dict.fromkeys(fields, version)}
+    return state
+
+
+def _cancelled_before_start(state):
+    return _with_fields(state, status="cancelled", message="任务在开始前已取消。")
+
+
+def _requeued(state):
+    return _with_fields(state, status="pending", message="服务重启，任务已重新排队，将从断点继续。",
+                        resumable=False)
+
+
+# --- SQLite 后端 ---
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    task_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_until REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_state (
+    task_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    unmatched_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_unmatched (
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    song TEXT NOT NULL,
+    PRIMARY KEY (task_id, seq)
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (task_id, seq)
+);
+CREATE TABLE IF NOT EXISTS job_profiles (
+    task_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (task_id, format)
+);
+CREATE TABLE IF NOT EXISTS match_previews (
+    preview_id TEXT PRIMARY KEY,
+    preview TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extract_snapshots (
+    snapshot_id TEXT PRIMARY KEY,
+    snapshot TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# job_profiles 中存放摘要的伪格式名
+_PROFILE_SUMMARY = "_summary"
+# job_state.state 中记录流式匹配结果条数的键（读取时替换为 results 视图）
+_RESULTS_COUNT = "_results_count"
+
+
+class _StoredListView:
+    """
+    后端中只追加列表（未匹配歌曲、流式匹配结果）的只读视图：只实现 len() 与切片，
+    task_status_delta 只按游标取新增部分，不会把整个列表读出来。
+    """
+
+    def __init__(self, fetch_slice, count):
+        self._fetch_slice = fetch_slice
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("只支持切片访问")
+        start, stop, step = index.indices(self._count)
+        items = self._fetch_slice(start, stop) if stop > start else []
+        return items[::step] if step != 1 else items
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class SQLiteJobBackend(JobBackend):
+    """
+    SQLite 文件后端。每个线程使用自己的连接；写操作在 BEGIN IMMEDIATE 事务中进行，
+    多个进程对同一文件的认领互斥。
+    """
+
+    def __init__(self, path, max_previews=MAX_MATCH_PREVIEWS, max_snapshots=MAX_EXTRACT_SNAPSHOTS):
+        self.path = path
+        self.max_previews = max_previews
+        self.max_snapshots = max_snapshots
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 首次使用时才创建文件与表，导入模块本身没有副作用
+            with self._schema_lock:
+                if not self._schema_ready:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SQLITE_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- 任务状态 ---
+
+    @staticmethod
+    def _write_state(conn, task_id, state):
+        """写回状态字段，未匹配歌曲与流式匹配结果只追加上次写回之后新增的部分。"""
+        # 先读列表长度再复制字段，与 task_status_delta 的读取顺序一致
+        unmatched = state.get("unmatched_songs") or []
+        count = len(unmatched)
+        results = state.get("results")
+        results_count = len(results) if results is not None else None
+        fields = {k: v for k, v in state.items() if k not in ("unmatched_songs", "results")}
+        if results is not None:
+            fields[_RESULTS_COUNT] = results_count
+            row = conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM job_results WHERE task_id = ?",
+                               (task_id,)).fetchone()
+            stored_results = row[0]
+            if results_count < stored_results:
+                conn.execute("DELETE FROM job_results WHERE task_id = ?", (task_id,))
+                stored_results = 0
+            if results_count > stored_results:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO job_results (task_id, seq, item) VALUES (?, ?, ?)",
+                    ((task_id, seq, json.dumps(item, ensure_ascii=False))
+                     for seq, item in enumerate(results[stored_results:results_count], stored_results)),
+                )
+        row = conn.execute("SELECT unmatched_count FROM job_state WHERE task_id = ?", (task_id,)).fetchone()
+        stored = row[0] if row else 0
+        if count < stored:
+            # 列表被替换（如执行函数重新开始），整体重写
+            conn.execute("DELETE FROM job_unmatched WHERE task_id = ?", (task_id,))
+            stored = 0
+        if count > stored:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_unmatched (task_id, seq, song) VALUES (?, ?, ?)",
+                ((task_id, seq, json.dumps(list(unmatched[seq]), ensure_ascii=False)) for seq in range(stored, count)),
+            )
+        conn.execute(
+            "INSERT INTO job_state (task_id, state, unmatched_count) VALUES (?, ?, ?) "
+            "ON CONFLICT (task_id) DO UPDATE SET state = excluded.state, unmatched_count = excluded.unmatched_count",
+            (task_id, json.dumps(fields, ensure_ascii=False), count),
+        )
+
+    def _unmatched_slice(self, task_id, start, stop):
+        rows = self._conn().execute(
+            "SELECT song FROM job_unmatched WHERE task_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (task_id, start, stop),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _results_slice(self, task_id, start, stop):
+        rows = self._conn().execute(
+            "SELECT item FROM job_results WHERE task_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (task_id, start, stop),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def load_state(self, task_id):
+        row = self._conn().execute(
+            "SELECT state, unmatched_count FROM job_state WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        state = json.loads(row[0])
+        state["unmatched_songs"] = _StoredListView(
+            lambda start, stop: self._unmatched_slice(task_id, start, stop), row[1])
+        if _RESULTS_COUNT in state:
+            state["results"] = _StoredListView(
+                lambda start, stop: self._results_slice(task_id, start, stop), state.pop(_RESULTS_COUNT))
+        return state
+
+    # --- 队列 ---
+
+    def enqueue(self, kind, payload, task_id=None, state=None):
+        task_id = task_id or str(uuid.uuid4())
+        now = time.time()
+        with self._write() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (task_id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (task_id) DO UPDATE SET kind = excluded.kind, payload = excluded.payload, "
+                "status = excluded.status, attempts = 0, worker_id = NULL, lease_until = NULL, "
+                "cancel_requested = 0, created_at = excluded.created_at, updated_at = excluded.updated_at "
+                "WHERE jobs.status = ?",
+                (task_id, kind, json.dumps(payload, ensure_ascii=False), JOB_QUEUED, now, now, JOB_DONE),
+            )
+            if cursor.rowcount == 0:
+                raise ValueError(f"任务 {task_id} 仍在排队或运行")
+            for table in ("job_unmatched", "job_results", "job_state"):
+                conn.execute(f"DELETE FROM {table} WHERE task_id = ?", (task_id,))
+            self._write_state(conn, task_id, state or {})
+        return task_id
+
+    def claim(self, worker_id, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT task_id, kind, payload, attempts FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED,),
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    "SELECT task_id, kind, payload, attempts FROM jobs "
+                    "WHERE status = ? AND lease_until < ? ORDER BY created_at LIMIT 1",
+                    (JOB_RUNNING, now),
+                ).fetchone()
+            if row is None:
+                return None
+            task_id, kind, payload, attempts = row
+            payload = json.loads(payload)
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, lease_until = ?, attempts = ?, payload = ?, "
+                "updated_at = ? WHERE task_id = ?",
+                (JOB_RUNNING, worker_id, now + lease, attempts + 1,
+                 json.dumps(_scrubbed(payload), ensure_ascii=False), now, task_id),
+            )
+        return Job(task_id, kind, payload, attempts + 1)
+
+    def renew(self, task_id, worker_id, state=None, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (task_id, worker_id, JOB_RUNNING),
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("UPDATE jobs SET lease_until = ?, updated_at = ? WHERE task_id = ?",
+                         (now + lease, now, task_id))
+            if state is not None:
+                self._write_state(conn, task_id, state)
+        return not row[0]
+
+    def finish(self, task_id, worker_id, state=None):
+        now = time.time()
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, payload = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (JOB_DONE, now, task_id, worker_id, JOB_RUNNING),
+            )
+            if cursor.rowcount and state is not None:
+                self._write_state(conn, task_id, state)
+
+    def release(self, task_id, worker_id, state=None, payload=None):
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (task_id, worker_id, JOB_RUNNING),
+            ).fetchone()
+            if row is None:
+                return
+            if row[0]:
+                conn.execute("UPDATE jobs SET status = ?, payload = NULL, lease_until = NULL, updated_at = ? "
+                             "WHERE task_id = ?", (JOB_DONE, now, task_id))
+            else:
+                conn.execute("UPDATE jobs SET status = ?, worker_id = NULL, lease_until = NULL, updated_at = ? "
+                             "WHERE task_id = ?", (JOB_QUEUED, now, task_id))
+                if payload is not None:
+                    conn.execute("UPDATE jobs SET payload = ? WHERE task_id = ?",
+                                 (json.dumps(payload, ensure_ascii=False), task_id))
+                state = _requeued(state) if state is not None else None
+            if state is not None:
+                self._write_state(conn, task_id, state)
+
+    def request_cancel(self, task_id):
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            status = row[0]
+            if status == JOB_QUEUED:
+                conn.execute("UPDATE jobs SET status = ?, payload = NULL, updated_at = ? WHERE task_id = ?",
+                             (JOB_DONE, now, task_id))
+                state_row = conn.execute("SELECT state FROM job_state WHERE task_id = ?", (task_id,)).fetchone()
+                state = json.loads(state_row[0]) if state_row else {}
+                conn.execute("UPDATE job_state SET state = ? WHERE task_id = ?",
+                             (json.dumps(_cancelled_before_start(state), ensure_ascii=False), task_id))
+            elif status == JOB_RUNNING:
+                conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE task_id = ?", (now, task_id))
+        return status
+
+    def job_status(self, task_id):
+        row = self._conn().execute("SELECT status FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return row[0] if row else None
+
+    # --- 剖析结果与匹配预览 ---
+
+    def save_profile(self, task_id, summary, exports):
+        rows = [(task_id, _PROFILE_SUMMARY, json.dumps(summary, ensure_ascii=False))]
+        rows.extend((task_id, fmt, content) for fmt, content in exports.items())
+        with self._write() as conn:
+            conn.executemany("INSERT OR REPLACE INTO job_profiles (task_id, format, content) VALUES (?, ?, ?)", rows)
+
+    def _profile_row(self, task_id, fmt):
+        row = self._conn().execute(
+            "SELECT content FROM job_profiles WHERE task_id = ? AND format = ?", (task_id, fmt)
+        ).fetchone()
+        return row[0] if row else None
+
+    def profile_summary(self, task_id):
+        content = self._profile_row(task_id, _PROFILE_SUMMARY)
+        return json.loads(content) if content is not None else None
+
+    def profile_export(self, task_id, fmt):
+        return self._profile_row(task_id, fmt)
+
+    def save_preview(self, preview_id, preview):
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO match_previews (preview_id, preview, created_at) VALUES (?, ?, ?)",
+                (preview_id, json.dumps(preview, ensure_ascii=False), preview.get("created_at", time.time())),
+            )
+            conn.execute(
+                "DELETE FROM match_previews WHERE preview_id NOT IN "
+                "(SELECT preview_id FROM match_previews ORDER BY created_at DESC LIMIT ?)",
+                (self.max_previews,),
+            )
+
+    def load_preview(self, preview_id):
+        row = self._conn().execute(
+            "SELECT preview FROM match_previews WHERE preview_id = ?", (preview_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_extract_snapshot(self, snapshot_id, snapshot):
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extract_snapshots (snapshot_id, snapshot, created_at) VALUES (?, ?, ?)",
+                (snapshot_id, json.dumps(snapshot, ensure_ascii=False), snapshot.get("created_at", time.time())),
+            )
+            conn.execute(
+                "DELETE FROM extract_snapshots WHERE snapshot_id NOT IN "
+                "(SELECT snapshot_id FROM extract_snapshots ORDER BY created_at DESC LIMIT ?)",
+                (self.max_snapshots,),
+            )
+
+    def load_extract_snapshot(self, snapshot_id):
+        row = self._conn().execute(
+            "SELECT snapshot FROM extract_snapshots WHERE snapshot_id = ?", (snapshot_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge(self, before):
+        with self._write() as conn:
+            expired = "SELECT task_id FROM jobs WHERE status = ? AND updated_at < ?"
+            for table in ("job_unmatched", "job_results", "job_state", "job_profiles"):
+                conn.execute(f"DELETE FROM {table} WHERE task_id IN ({expired})", (JOB_DONE, before))
+            conn.execute("DELETE FROM jobs WHERE status = ? AND updated_at < ?", (JOB_DONE, before))
+
+
+# --- 内存后端 ---
+
+class MemoryJobBackend(JobBackend):
+    """进程内后端，只适合单进程运行（开发、调试）；语义与 SQLite 后端相同。"""
+
+    def __init__(self, max_previews=MAX_MATCH_PREVIEWS, max_snapshots=MAX_EXTRACT_SNAPSHOTS):
+        self.max_previews = max_previews
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._states = {}
+        self._profiles = {}
+        self._previews = {}
+        self._snapshots = {}
+
+    def enqueue(self, kind, payload, task_id=None, state=None):
+        task_id = task_id or str(uuid.uuid4())
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is not None and job["status"] != JOB_DONE:
+                raise ValueError(f"任务 {task_id} 仍在排队或运行")
+            self._jobs[task_id] = {
+                "kind": kind, "payload": json.loads(json.dumps(payload)), "status": JOB_QUEUED, "attempts": 0,
+                "worker_id": None, "lease_until": None, "cancel_requested": False,
+                "created_at": time.time(), "updated_at": time.time(),
+            }
+            self._states[task_id] = dict(state or {})
+        return task_id
+
+    def claim(self, worker_id, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            candidates = [(job["created_at"], task_id) for task_id, job in self._jobs.items()
+                          if job["status"] == JOB_QUEUED]
+            if not candidates:
+                candidates = [(job["created_at"], task_id) for task_id, job in self._jobs.items()
+                              if job["status"] == JOB_RUNNING and job["lease_until"] < now]
+            if not candidates:
+                return None
+            task_id = min(candidates)[1]
+            job = self._jobs[task_id]
+            payload = job["payload"]
+            job.update(status=JOB_RUNNING, worker_id=worker_id, lease_until=now + lease,
+                       attempts=job["attempts"] + 1, payload=_scrubbed(payload), updated_at=now)
+            return Job(task_id, job["kind"], payload, job["attempts"])
+
+    def _owned(self, task_id, worker_id):
+        job = self._jobs.get(task_id)
+        if job is None or job["worker_id"] != worker_id or job["status"] != JOB_RUNNING:
+            return None
+        return job
+
+    def renew(self, task_id, worker_id, state=None, lease=LEASE_SECONDS):
+        now = time.time()
+        with self._lock:
+            job = self._owned(task_id, worker_id)
+            if job is None:
+                return False
+            job.update(lease_until=now + lease, updated_at=now)
+            if state is not None:
+                # 执行者与读取者在同一进程，直接共享状态字典
+                self._states[task_id] = state
+            return not job["cancel_requested"]
+
+    def finish(self, task_id, worker_id, state=None):
+        with self._lock:
+            job = self._owned(task_id, worker_id)
+            if job is None:
+                return
+            job.update(status=JOB_DONE, payload=None, lease_until=None, updated_at=time.time())
+            if state is not None:
+                self._states[task_id] = state
+
+    def release(self, task_id, worker_id, state=None, payload=None):
+        with self._lock:
+            job = self._owned(task_id, worker_id)
+            if job is None:
+                return
+            if job["cancel_requested"]:
+                job.update(status=JOB_DONE, payload=None, lease_until=None, updated_at=time.time())
+            else:
+                job.update(status=JOB_QUEUED, worker_id=None, lease_until=None, updated_at=time.time())
+                if payload is not None:
+                    job["payload"] = json.loads(json.dumps(payload))
+                state = _requeued(state) if state is not None else None
+            if state is not None:
+                self._states[task_id] = state
+
+    def request_cancel(self, task_id):
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is None:
+                return None
+            status = job["status"]
+            if status == JOB_QUEUED:
+                job.update(status=JOB_DONE, payload=None, updated_at=time.time())
+                self._states[task_id] = _cancelled_before_start(self._states.get(task_id, {}))
+            elif status == JOB_RUNNING:
+                job["cancel_requested"] = True
+            return status
+
+    def job_status(self, task_id):
+        job = self._jobs.get(task_id)
+        return job["status"] if job else None
+
+    def load_state(self, task_id):
+        return self._states.get(task_id)
+
+    def save_profile(self, task_id, summary, exports):
+        with self._lock:
+            self._profiles[task_id] = (summary, dict(exports))
+
+    def profile_summary(self, task_id):
+        profile = self._profiles.get(task_id)
+        return profile[0] if profile else None
+
+    def profile_export(self, task_id, fmt):
+        profile = self._profiles.get(task_id)
+        return profile[1].get(fmt) if profile else None
+
+    def save_preview(self, preview_id, preview):
+        with self._lock:
+            while len(self._previews) >= self.max_previews:
+                del self._previews[next(iter(self._previews))]
+            self._previews[preview_id] = preview
+
+    def load_preview(self, preview_id):
+        return self._previews.get(preview_id)
+
+    def save_extract_snapshot(self, snapshot_id, snapshot):
+        with self._lock:
+            self._snapshots.pop(snapshot_id, None)
+            while len(self._snapshots) >= self.max_snapshots:
+                del self._snapshots[next(iter(self._snapshots))]
+            self._snapshots[snapshot_id] = snapshot
+
+    def load_extract_snapshot(self, snapshot_id):
+        return self._snapshots.get(snapshot_id)
+
+    def purge(self, before):
+        with self._lock:
+            for task_id in [t for t, job in self._jobs.items() if job["status"] == JOB_DONE and job["updated_at"] < before]:
+                del self._jobs[task_id]
+                self._states.pop(task_id, None)
+                self._profiles.pop(task_id, None)
+
+
+# --- 后端注册 ---
+
+_BACKENDS = {}
+
+
+def register_backend(scheme, factory):
+    """注册任务后端: factory(url) -> JobBackend，由 create_backend 按 URL 的 scheme 选择。"""
+    _BACKENDS[scheme] = factory
+
+
+def create_backend(url=None):
+    """按 URL 创建任务后端，如 `sqlite:///jobs.db`（相对路径）、`sqlite:////var/lib/plexlist/jobs.db`、`memory://`。"""
+    url = url or DEFAULT_BACKEND_URL
+    scheme, sep, _ = url.partition("://")
+    factory = _BACKENDS.get(scheme) if sep else None
+    if factory is None:
+        raise ValueError(f"不支持的任务后端: {url}. 可选: {', '.join(sorted(_BACKENDS))}")
+    return factory(url)
+
+
+def _sqlite_backend(url):
+    path = url.partition("://")[2]
+    if path.startswith("/"):
+        path = path[1:]
+    if not path:
+        raise ValueError(f"SQLite 任务后端缺少文件路径: {url}")
+    return SQLiteJobBackend(path)
+
+
+register_backend("sqlite", _sqlite_backend)
+register_backend("memory", lambda url: MemoryJobBackend())
+
+
+# --- 执行器 ---
+
+class JobRunner:
+    """
+    每个服务进程一个：后台线程从队列认领任务，交给本地线程池执行，
+    并在每个轮询周期为运行中的任务续租、写回变化过的状态、检查取消请求。
+    """
+
+    def __init__(self, backend, max_workers=4, poll_interval=POLL_INTERVAL, worker_id=None):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers = {}
+        # 本进程正在执行的任务状态: task_id -> 状态字典（执行函数原地更新），任务结束后只保留在后端
+        self.task_status = {}
+        self._active = {}  # task_id -> [Job, 最近一次写回的状态版本]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()  # 不再认领新任务
+        self._drained = threading.Event()   # 线程池已排空，续租线程可以退出
+        self._thread = None
+        self._executor = None
+
+    def register(self, kind, handler):
+        """注册任务类型的执行函数: handler(job)。"""
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._drained.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._thread = threading.Thread(target=self._loop, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        停止认领新任务；运行中的任务收到取消信号，写入断点后放回队列，由其他 worker 或重启后的进程继续。
+
+        执行函数只在两首歌之间检查取消信号，正在创建播放列表或批量添加时可能要过一段时间才停下；
+        续租线程在线程池排空之前继续为这些任务续租，避免租约过期后被其他 worker 重复执行。
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        with self._lock:
+            for job, _ in self._active.values():
+                job.cancel_event.set()
+        self._wake.set()
+        self._executor.shutdown(wait=True)
+        self._drained.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = self._executor = None
+
+    def wake(self):
+        """有新任务入队或取消请求时调用，立即进行下一轮认领和检查。"""
+        self._wake.set()
+
+    def _loop(self):
+        last_purge = 0.0
+        # 停止后仍继续续租，直到运行中的任务全部结束
+        while not self._drained.is_set():
+            self._wake.clear()
+            try:
+                self._renew_active()
+                while len(self._active) < self.max_workers and not self._stopping.is_set():
+                    job = self.backend.claim(self.worker_id)
+                    if job is None:
+                        break
+                    self._start(job)
+                if not self._stopping.is_set() and time.monotonic() - last_purge > PURGE_INTERVAL:
+                    self.backend.purge(time.time() - JOB_RETENTION)
+                    last_purge = time.monotonic()
+            except Exception:
+                logger.warning("任务队列轮询失败", exc_info=True)
+            self._wake.wait(self.poll_interval)
+
+    def _start(self, job):
+        job.task_status = self.task_status
+        job.cancel_event = threading.Event()
+        with self._lock:
+            if self._stopping.is_set():
+                # 认领与 stop() 同时发生：不再执行，直接放回队列
+                self.backend.release(job.task_id, self.worker_id, payload=job.payload)
+                return
+            self._active[job.task_id] = [job, None]
+            # 在锁内提交：stop() 取得锁之后才会关闭线程池
+            self._executor.submit(self._execute, job)
+        logger.info(f"认领任务 {job.task_id} ({job.kind}，第 {job.attempts} 次)")
+
+    def _renew_active(self):
+        with self._lock:
+            entries = list(self._active.values())
+        for entry in entries:
+            job, saved_version = entry
+            state = self.task_status.get(job.task_id)
+            # 先读版本再由后端复制字段：写回的字段不会旧于记录的版本
+            version = state.get("version") if state is not None else None
+            changed = state is not None and (version is None or version != saved_version)
+            if not self.backend.renew(job.task_id, self.worker_id, state if changed else None):
+                job.cancel_event.set()
+            elif changed:
+                entry[1] = version
+
+    def _execute(self, job):
+        try:
+            handler = self.handlers.get(job.kind)
+            if handler is None:
+                raise ValueError(f"未知的任务类型: {job.kind}")
+            handler(job)
+        except Exception as e:
+            logger.error(f"任务 {job.task_id} 执行失败", exc_info=True)
+            self.task_status[job.task_id] = {"status": "error", "message": f"任务执行失败: {e}"}
+        finally:
+            state = self.task_status.get(job.task_id)
+            try:
+                if self._stopping.is_set() and state is not None and state.get("status") == "cancelled" \
+                        and state.get("resumable"):
+                    # 因进程关闭而中断、已写入断点的任务放回队列，而不是当作用户取消
+                    self.backend.release(job.task_id, self.worker_id, state, payload=job.payload)
+                else:
+                    self.backend.finish(job.task_id, self.worker_id, state)
+            except Exception:
+                logger.error(f"任务 {job.task_id} 的最终状态写回失败", exc_info=True)
+            with self._lock:
+                self._active.pop(job.task_id, None)
+            self.task_status.pop(job.task_id, None)
+            self._wake.set()
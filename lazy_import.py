@@ -0,0 +1,28 @@
+# lazy_import.py
+"""
+可选依赖的延迟导入。
+
+plexapi、thefuzz 等库导入较慢，而 API 服务、命令行工具启动时往往用不到它们。
+模块中不再在顶层 try/except ImportError，而是在首次使用时调用 optional()；
+导入结果（包括未安装时的 None）会被缓存，之后的调用只是一次字典查找。
+"""
+import importlib
+import threading
+
+_modules = {}
+_lock = threading.Lock()
+
+
+def optional(module_name):
+    """导入并返回模块，未安装时返回 None。"""
+    try:
+        return _modules[module_name]
+    except KeyError:
+        pass
+    with _lock:
+        if module_name not in _modules:
+            try:
+                _modules[module_name] = importlib.import_module(module_name)
+            except ImportError:
+                _modules[module_name] = None
+        return _modules[module_name]
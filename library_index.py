@@ -0,0 +1,378 @@
+# library_index.py
+"""
+紧凑的音乐库索引，用于在本地对整个 Plex 音乐库做匹配。
+
+百万级音轨时，保存 plexapi 的 Track 对象或属性字典需要数 GB 内存。这里按列存储：
+- ratingKey 存于 array('q')，每首 8 字节；
+- 艺术家按 (标准化名, 原名) 去重并 intern，每首只存 4 字节的艺术家编号；
+- 歌名（标准化后与原名）分别拼接为一个大字符串，每首只存 4 字节的偏移量；
+- 按艺术家的行号列表同样使用 array('I')；
+- (歌名, 艺术家) 的精确键 -> 行号的字典，精确命中时 O(1) 返回，不必模糊打分。
+标准化形式在写快照时预先计算好，匹配阶段不再调用 normalize_string。
+
+多进程匹配时，LibraryIndex.save() 把索引编译为一个二进制文件（各列连续存放，艺术家与精确键
+按 UTF-8 字节排序后二分查找），MappedLibraryIndex 以只读 mmap 打开它：各进程共享操作系统
+页缓存中的同一份页面，进程数再多，索引也只占一份内存。
+"""
+import io
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+
+from normalization import exact_key, key_from_normalized
+
+SNAPSHOT_MAGIC = "PLEXLIST-LIBRARY-2"
+# 编译后二进制索引的魔数：随快照格式一起变化；字节序不同的机器不能共用（文件只在本机缓存目录中使用）
+COMPILED_MAGIC = f"{SNAPSHOT_MAGIC}-idx-{sys.byteorder}".encode("ascii").ljust(32, b"\0")
+# 全局模糊匹配时每首歌最多返回的候选数
+MAX_TITLE_CANDIDATES = 200
+
+
+class LibraryIndex:
+    """只读的列式音乐库索引。通过 LibraryIndex.load() 或 LibraryIndex.from_rows() 构建。"""
+
+    __slots__ = (
+        "rating_keys", "artist_ids", "artist_names", "artist_norms", "artist_rows",
+        "norm_title_blob", "norm_title_offsets", "title_blob", "title_offsets", "exact_rows",
+    )
+
+    def __init__(self, rows):
+        """rows: 可迭代的 (ratingKey, 标准化歌名, 标准化艺术家, 歌名, 艺术家)。"""
+        self.rating_keys = array("q")
+        self.artist_ids = array("I")
+        self.artist_names = []  # 艺术家编号 -> 原名
+        self.artist_norms = []  # 艺术家编号 -> 标准化名
+        artist_lookup = {}
+        artist_rows = {}
+        exact_rows = {}
+        norm_titles = io.StringIO()
+        titles = io.StringIO()
+        self.norm_title_offsets = array("I")
+        self.title_offsets = array("I")
+        norm_offset = offset = 0
+
+        for rating_key, norm_title, norm_artist, title, artist in rows:
+            row = len(self.rating_keys)
+            self.rating_keys.append(int(rating_key))
+
+            artist_key = (norm_artist, artist)
+            artist_id = artist_lookup.get(artist_key)
+            if artist_id is None:
+                artist_id = len(self.artist_names)
+                artist_lookup[artist_key] = artist_id
+                self.artist_names.append(sys.intern(artist))
+                self.artist_norms.append(sys.intern(norm_artist))
+            self.artist_ids.append(artist_id)
+            rows_for_artist = artist_rows.get(self.artist_norms[artist_id])
+            if rows_for_artist is None:
+                rows_for_artist = artist_rows[self.artist_norms[artist_id]] = array("I")
+            rows_for_artist.append(row)
+            title_key = key_from_normalized(norm_title)
+            if title_key:
+                # 同名同艺术家的重复音轨只保留第一条
+                exact_rows.setdefault(exact_key(title_key, key_from_normalized(norm_artist)), row)
+
+            # 每个歌名后跟一个换行符作为分隔，便于在整块字符串上做子串查找
+            self.norm_title_offsets.append(norm_offset)
+            norm_titles.write(norm_title)
+            norm_titles.write("\n")
+            norm_offset += len(norm_title) + 1
+            self.title_offsets.append(offset)
+            titles.write(title)
+            titles.write("\n")
+            offset += len(title) + 1
+
+        self.artist_rows = artist_rows
+        self.exact_rows = exact_rows
+        self.norm_title_blob = norm_titles.getvalue()
+        self.title_blob = titles.getvalue()
+
+    # --- 构建 ---
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(rows)
+
+    @classmethod
+    def load(cls, path):
+        """从快照文件构建。以 mmap 逐行读取，不会把整个文件解码成一个字符串。"""
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                header = mm.readline().decode("utf-8").rstrip("\n")
+                if header != SNAPSHOT_MAGIC:
+                    raise ValueError(f"无效的音乐库快照文件: {path}")
+                return cls(_parse_snapshot_lines(iter(mm.readline, b"")))
+
+    # --- 访问 ---
+
+    def __len__(self):
+        return len(self.rating_keys)
+
+    @staticmethod
+    def _slice(blob, offsets, row):
+        start = offsets[row]
+        end = offsets[row + 1] - 1 if row + 1 < len(offsets) else len(blob) - 1
+        return blob[start:end]
+
+    def norm_title(self, row):
+        return self._slice(self.norm_title_blob, self.norm_title_offsets, row)
+
+    def title(self, row):
+        return self._slice(self.title_blob, self.title_offsets, row)
+
+    def norm_artist(self, row):
+        return self.artist_norms[self.artist_ids[row]]
+
+    def artist(self, row):
+        return self.artist_names[self.artist_ids[row]]
+
+    def rows_for_artist(self, norm_artist):
+        return self.artist_rows.get(norm_artist, ())
+
+    def exact_row(self, title_key, artist_key):
+        """按精确键查找行号，未命中返回 None。"""
+        return self.exact_rows.get(exact_key(title_key, artist_key))
+
+    def title_candidates(self, norm_song_name, limit=MAX_TITLE_CANDIDATES):
+        """标准化歌名包含 norm_song_name 的行号，子串查找在 C 层的 str.find 中完成。"""
+        rows = []
+        if not norm_song_name:
+            return rows
+        blob, offsets = self.norm_title_blob, self.norm_title_offsets
+        pos = blob.find(norm_song_name)
+        while pos != -1 and len(rows) < limit:
+            row = bisect_right(offsets, pos) - 1
+            rows.append(row)
+            # 跳到下一行继续查找，同一行只计一次
+            if row + 1 >= len(offsets):
+                break
+            pos = blob.find(norm_song_name, offsets[row + 1])
+        return rows
+
+    def save(self, path):
+        """
+        把索引编译为二进制文件，供 MappedLibraryIndex 以 mmap 打开。
+        先写临时文件再原子替换，写入失败时删除临时文件。
+        """
+        artist_keys = sorted(self.artist_rows, key=lambda name: name.encode("utf-8"))
+        group_row_offsets = array("I", [0])
+        group_rows = array("I")
+        for name in artist_keys:
+            group_rows.extend(self.artist_rows[name])
+            group_row_offsets.append(len(group_rows))
+        exact_keys = sorted(self.exact_rows, key=lambda key: key.encode("utf-8"))
+        sections = [
+            self.rating_keys,
+            self.artist_ids,
+            *_encode_blob(self.norm_title_blob, self.norm_title_offsets),
+            *_encode_blob(self.title_blob, self.title_offsets),
+            *_encode_strings(self.artist_norms),
+            *_encode_strings(self.artist_names),
+            *_encode_strings(artist_keys),
+            group_row_offsets,
+            group_rows,
+            *_encode_strings(exact_keys),
+            array("I", (self.exact_rows[key] for key in exact_keys)),
+        ]
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                header_size = len(COMPILED_MAGIC) + 8 + 16 * len(sections)
+                table, offset = [], _align(header_size)
+                for section in sections:
+                    size = len(section) * section.itemsize if isinstance(section, array) else len(section)
+                    table.append((offset, size))
+                    offset = _align(offset + size)
+                f.write(COMPILED_MAGIC)
+                f.write(struct.pack("<Q", len(sections)))
+                for entry in table:
+                    f.write(struct.pack("<QQ", *entry))
+                for (start, _), section in zip(table, sections):
+                    f.write(b"\0" * (start - f.tell()))
+                    f.write(section.tobytes() if isinstance(section, array) else section)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def memory_usage(self):
+        """估算索引占用的字节数（不含解释器本身）。"""
+        total = sum(sys.getsizeof(a) for a in (
+            self.rating_keys, self.artist_ids, self.norm_title_offsets, self.title_offsets,
+        ))
+        total += sys.getsizeof(self.norm_title_blob) + sys.getsizeof(self.title_blob)
+        total += sys.getsizeof(self.artist_names) + sys.getsizeof(self.artist_norms)
+        total += sum(sys.getsizeof(s) for s in self.artist_names)
+        total += sum(sys.getsizeof(s) for s in self.artist_norms)
+        total += sys.getsizeof(self.artist_rows) + sum(sys.getsizeof(a) for a in self.artist_rows.values())
+        total += sys.getsizeof(self.exact_rows) + sum(sys.getsizeof(k) for k in self.exact_rows)
+        return total
+
+
+def _parse_snapshot_lines(lines):
+    for raw in lines:
+        line = raw.decode("utf-8").rstrip("\n")
+        if not line:
+            continue
+        rating_key, norm_title, norm_artist, title, artist = line.split("\t")
+        yield rating_key, norm_title, norm_artist, title, artist
+
+
+# --- 编译后的二进制索引 ---
+
+_SECTION_ALIGN = 8
+
+
+def _align(offset):
+    return (offset + _SECTION_ALIGN - 1) // _SECTION_ALIGN * _SECTION_ALIGN
+
+
+def _encode_strings(strings):
+    """字符串列表 -> (UTF-8 字节偏移 array('I')，长度 n + 1；拼接后的字节串)。"""
+    offsets = array("I", [0])
+    blob = io.BytesIO()
+    for text in strings:
+        blob.write(text.encode("utf-8"))
+        offsets.append(blob.tell())
+    return offsets, blob.getvalue()
+
+
+def _encode_blob(blob, offsets):
+    """以换行符分隔的歌名块 -> (UTF-8 字节偏移，长度 n + 1；UTF-8 字节串)，每行仍保留换行符。"""
+    lines = [blob[offsets[row]:offsets[row + 1] if row + 1 < len(offsets) else len(blob)]
+             for row in range(len(offsets))]
+    return _encode_strings(lines)
+
+
+class _SortedStrings:
+    """mmap 中按 UTF-8 字节排序的字符串表，二分查找返回下标。"""
+
+    __slots__ = ("_mm", "_base", "_offsets")
+
+    def __init__(self, mm, base, offsets):
+        self._mm = mm
+        self._base = base
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _item(self, i):
+        return self._mm[self._base + self._offsets[i]:self._base + self._offsets[i + 1]]
+
+    def find(self, key):
+        key = key.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._item(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self._item(lo) == key:
+            return lo
+        return None
+
+
+def is_compiled_index(path):
+    """path 是否为当前格式的编译索引文件。"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(COMPILED_MAGIC)) == COMPILED_MAGIC
+    except OSError:
+        return False
+
+
+class MappedLibraryIndex:
+    """
+    以只读 mmap 打开 LibraryIndex.save() 编译的文件，接口与 LibraryIndex 相同。
+    所有列都是文件页面上的 memoryview，不会复制到进程私有内存中；各进程共享同一份页缓存。
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        if mm[:len(COMPILED_MAGIC)] != COMPILED_MAGIC:
+            mm.close()
+            raise ValueError(f"无效的音乐库索引文件: {path}")
+        pos = len(COMPILED_MAGIC)
+        (count,) = struct.unpack_from("<Q", mm, pos)
+        table = [struct.unpack_from("<QQ", mm, pos + 8 + 16 * i) for i in range(count)]
+        view = self._view = memoryview(mm)
+
+        def column(i, fmt):
+            start, size = table[i]
+            return view[start:start + size].cast(fmt)
+
+        self.rating_keys = column(0, "q")
+        self.artist_ids = column(1, "I")
+        self._norm_title_offsets, self._norm_title_base = column(2, "I"), table[3][0]
+        self._title_offsets, self._title_base = column(4, "I"), table[5][0]
+        self._artist_norms = _SortedStrings(mm, table[7][0], column(6, "I"))
+        self._artist_names = _SortedStrings(mm, table[9][0], column(8, "I"))
+        self._artist_groups = _SortedStrings(mm, table[11][0], column(10, "I"))
+        self._group_row_offsets = column(12, "I")
+        self._group_rows = column(13, "I")
+        self._exact_keys = _SortedStrings(mm, table[15][0], column(14, "I"))
+        self._exact_rows = column(16, "I")
+        # 歌名子串查找只在标准化歌名所在的区间内进行
+        self._norm_title_end = table[3][0] + table[3][1]
+
+    def __len__(self):
+        return len(self.rating_keys)
+
+    def _line(self, base, offsets, row):
+        # 每行末尾的换行符不属于歌名
+        return self._mm[base + offsets[row]:base + offsets[row + 1] - 1].decode("utf-8")
+
+    def norm_title(self, row):
+        return self._line(self._norm_title_base, self._norm_title_offsets, row)
+
+    def title(self, row):
+        return self._line(self._title_base, self._title_offsets, row)
+
+    def norm_artist(self, row):
+        return self._artist_norms._item(self.artist_ids[row]).decode("utf-8")
+
+    def artist(self, row):
+        return self._artist_names._item(self.artist_ids[row]).decode("utf-8")
+
+    def rows_for_artist(self, norm_artist):
+        group = self._artist_groups.find(norm_artist)
+        if group is None:
+            return ()
+        return self._group_rows[self._group_row_offsets[group]:self._group_row_offsets[group + 1]]
+
+    def exact_row(self, title_key, artist_key):
+        i = self._exact_keys.find(exact_key(title_key, artist_key))
+        return None if i is None else self._exact_rows[i]
+
+    def title_candidates(self, norm_song_name, limit=MAX_TITLE_CANDIDATES):
+        """标准化歌名包含 norm_song_name 的行号，在 mmap 上做字节子串查找（UTF-8 子串与字符子串等价）。"""
+        rows = []
+        if not norm_song_name:
+            return rows
+        needle = norm_song_name.encode("utf-8")
+        mm, base, end, offsets = self._mm, self._norm_title_base, self._norm_title_end, self._norm_title_offsets
+        pos = mm.find(needle, base, end)
+        while pos != -1 and len(rows) < limit:
+            row = bisect_right(offsets, pos - base) - 1
+            rows.append(row)
+            if row + 1 >= len(self):
+                break
+            pos = mm.find(needle, base + offsets[row + 1], end)
+        return rows
+
+    def close(self):
+        for name in ("rating_keys", "artist_ids", "_norm_title_offsets", "_title_offsets",
+                     "_group_row_offsets", "_group_rows", "_exact_rows"):
+            getattr(self, name).release()
+        for table in (self._artist_norms, self._artist_names, self._artist_groups, self._exact_keys):
+            table._offsets.release()
+        self._view.release()
+        self._mm.close()
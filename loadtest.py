@@ -0,0 +1,567 @@
+# loadtest.py
+"""
+API 服务 (main:app) 的负载测试。
+
+启动本地的 Plex 与音乐平台替身（见 loadtest_standins.py），在临时工作目录中以子进程
+运行 uvicorn main:app，并把服务的音乐平台地址指向替身，然后按给定并发驱动：
+- import:      POST /api/v1/import，并用 since 游标轮询 /api/v1/import/status 直到任务结束；
+- plex_import: POST /api/v1/plex/import，并轮询 /api/v1/tasks/{task_id} 直到任务结束；
+- extract:     POST /api/v1/playlist/extract，按 limit 分页读完整个歌单；
+- status:      模拟网页端的状态轮询，按 poll 间隔轮询已创建的导入任务。
+
+结束时报告每类请求的吞吐、p50/p90/p99 延迟与错误率，任务的端到端耗时，
+以及服务进程内存 (RSS) 随时间的增长。结果可保存为 JSON，并作为基线对比后续运行：
+
+    python loadtest.py --duration 60 --imports 4 --extracts 8 --pollers 32 -o baseline.json
+    python loadtest.py --duration 60 --imports 4 --extracts 8 --pollers 32 --baseline baseline.json
+
+p99 延迟、吞吐或内存增长相对基线的退化超过 --tolerance，或错误率超过 --max-error-rate 时退出码为 1。
+"""
+import argparse
+import collections
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import lazy_import
+import loadtest_standins
+
+DEFAULT_DURATION = 60
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_TASK_TIMEOUT = 300
+DEFAULT_PAGE_SIZE = 200
+DEFAULT_TOLERANCE = 0.2
+MEMORY_SAMPLE_INTERVAL = 1.0
+SERVICE_START_TIMEOUT = 30
+TERMINAL_STATUSES = ("completed", "cancelled", "failed", "error")
+PLEX_TOKEN = "loadtest"
+# 基线对比时，错误率允许的绝对增加量与内存增长允许的绝对增加量 (MB)
+ERROR_RATE_SLACK = 0.01
+MEMORY_GROWTH_SLACK_MB = 5.0
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数，sorted_values 为已排序的列表。"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class Recorder:
+    """线程安全地记录每次操作的耗时与结果。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = collections.defaultdict(list)
+        self._errors = collections.defaultdict(collections.Counter)
+        self._unfinished = collections.Counter()
+
+    def record(self, operation, seconds, error=None):
+        with self._lock:
+            self._latencies[operation].append(seconds)
+            if error is not None:
+                self._errors[operation][error] += 1
+
+    def unfinished(self, operation):
+        """测试结束时仍未结束的任务，不计入延迟与错误率。"""
+        with self._lock:
+            self._unfinished[operation] += 1
+
+    def summary(self, elapsed):
+        with self._lock:
+            operations = {}
+            for operation in sorted(set(self._latencies) | set(self._unfinished)):
+                latencies = sorted(self._latencies[operation])
+                errors = sum(self._errors[operation].values())
+                count = len(latencies)
+                operations[operation] = {
+                    "count": count,
+                    "errors": errors,
+                    "error_rate": round(errors / count, 4) if count else 0.0,
+                    "throughput": round(count / elapsed, 2) if elapsed else 0.0,
+                    "mean_ms": _ms(sum(latencies) / count) if count else None,
+                    "p50_ms": _ms(percentile(latencies, 50)),
+                    "p90_ms": _ms(percentile(latencies, 90)),
+                    "p99_ms": _ms(percentile(latencies, 99)),
+                    "max_ms": _ms(latencies[-1]) if latencies else None,
+                    "error_kinds": dict(self._errors[operation]),
+                    "unfinished": self._unfinished[operation],
+                }
+            return operations
+
+
+def _rss_mb(pid):
+    """进程的常驻内存 (MB)；Linux 读 /proc，其他平台需安装可选依赖 psutil，否则返回 None。"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    psutil = lazy_import.optional("psutil")
+    if psutil is None:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except psutil.Error:
+        return None
+
+
+class MemorySampler:
+    """后台线程按固定间隔采样服务进程的 RSS。"""
+
+    def __init__(self, pid, interval=MEMORY_SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (相对开始的秒数, MB)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        started = time.monotonic()
+        while True:
+            rss = _rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append((round(time.monotonic() - started, 1), round(rss, 1)))
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return {"available": False}
+        times = [t for t, _ in self.samples]
+        values = [mb for _, mb in self.samples]
+        # 最小二乘斜率，比首尾差更不受单次 GC 抖动影响
+        slope = 0.0
+        if len(self.samples) > 1:
+            mean_t = sum(times) / len(times)
+            mean_v = sum(values) / len(values)
+            var_t = sum((t - mean_t) ** 2 for t in times)
+            if var_t:
+                slope = sum((t - mean_t) * (v - mean_v) for t, v in self.samples) / var_t
+        return {
+            "available": True,
+            "start_mb": values[0],
+            "peak_mb": max(values),
+            "end_mb": values[-1],
+            "growth_mb": round(values[-1] - values[0], 1),
+            "growth_mb_per_min": round(slope * 60, 2),
+            "samples": self.samples,
+        }
+
+
+def _free_port(host):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class ServiceProcess:
+    """在临时工作目录中运行 uvicorn main:app，日志、断点与 plex_config.json 都写在其中。"""
+
+    def __init__(self, platform_url, plex_url, host="127.0.0.1", port=0, workers=1, keep_workdir=False):
+        self.repo_dir = os.path.dirname(os.path.abspath(__file__))
+        self.host = host
+        self.port = port or _free_port(host)
+        self.platform_url = platform_url
+        self.plex_url = plex_url
+        self.workers = workers
+        self.keep_workdir = keep_workdir
+        self.workdir = None
+        self.process = None
+        self._log = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def log_path(self):
+        return os.path.join(self.workdir, "service.log")
+
+    def start(self):
+        import requests
+
+        self.workdir = tempfile.mkdtemp(prefix="plexlist-loadtest-")
+        web_dir = os.path.join(self.repo_dir, "web")
+        try:
+            os.symlink(web_dir, os.path.join(self.workdir, "web"), target_is_directory=True)
+        except OSError:
+            shutil.copytree(web_dir, os.path.join(self.workdir, "web"))
+        # /api/v1/plex/import 从工作目录的 plex_config.json 读取 Plex 地址
+        with open(os.path.join(self.workdir, "plex_config.json"), "w") as f:
+            json.dump({"plex_url": self.plex_url, "plex_token": PLEX_TOKEN}, f)
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [self.repo_dir, env.get("PYTHONPATH")]))
+        env["PLEXLIST_NETEASE_API_BASE"] = self.platform_url
+        env["PLEXLIST_QQ_API_BASE"] = self.platform_url
+        self._log = open(self.log_path, "wb")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", self.host, "--port", str(self.port),
+             "--log-level", "warning", "--workers", str(self.workers)],
+            cwd=self.workdir, env=env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + SERVICE_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"服务进程启动失败 (退出码 {self.process.returncode})，日志: {self.log_path}")
+            try:
+                if requests.get(self.url + "/", timeout=1).status_code == 200:
+                    return self
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"服务在 {SERVICE_START_TIMEOUT} 秒内没有就绪，日志: {self.log_path}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._log is not None:
+            self._log.close()
+        if self.workdir and not self.keep_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class LoadContext:
+    """各虚拟用户共享的配置、计时与结果。"""
+
+    def __init__(self, base_url, plex_url, library, args, deadline):
+        self.base_url = base_url
+        self.plex_url = plex_url
+        self.library = library
+        self.args = args
+        self.deadline = deadline
+        self.recorder = Recorder()
+        # 已创建的导入任务，供 status 轮询者使用
+        self.import_tasks = collections.deque(maxlen=256)
+        self._playlist_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_playlist_id(self):
+        with self._lock:
+            return next(self._playlist_ids)
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+
+def _call(ctx, http, operation, method, path, expected=(200,), **kwargs):
+    """发出请求并记录耗时；返回响应，失败时返回 None。"""
+    import requests
+
+    started = time.perf_counter()
+    try:
+        response = http.request(method, ctx.base_url + path, timeout=ctx.args.request_timeout, **kwargs)
+    except requests.exceptions.RequestException as e:
+        ctx.recorder.record(operation, time.perf_counter() - started, type(e).__name__)
+        return None
+    error = None if response.status_code in expected else f"HTTP {response.status_code}"
+    ctx.recorder.record(operation, time.perf_counter() - started, error)
+    return response if error is None else None
+
+
+def _wait_for_task(ctx, http, operation, status_path, use_cursor, check_result=None):
+    """
+    轮询任务直到结束，把端到端耗时记为 <operation>.task。
+    check_result(最后一次状态响应) 可返回错误描述，用于检查已完成任务的结果是否完整。
+    """
+    started = time.perf_counter()
+    cursor = None
+    while time.perf_counter() - started < ctx.args.task_timeout:
+        if ctx.expired():
+            ctx.recorder.unfinished(f"{operation}.task")
+            return
+        time.sleep(ctx.args.poll_interval)
+        params = {"since": cursor} if use_cursor and cursor else None
+        response = _call(ctx, http, f"{operation}.status", "GET", status_path, params=params)
+        if response is None:
+            continue
+        data = response.json()
+        cursor = data.get("cursor", cursor)
+        status = data.get("status")
+        if status in TERMINAL_STATUSES:
+            error = status if status != "completed" else (check_result(data) if check_result else None)
+            ctx.recorder.record(f"{operation}.task", time.perf_counter() - started, error)
+            return
+    ctx.recorder.record(f"{operation}.task", time.perf_counter() - started, "timeout")
+
+
+def run_import(ctx, http):
+    playlist_id = ctx.next_playlist_id()
+    if playlist_id % 2:
+        playlist_url = f"https://music.163.com/#/playlist?id={playlist_id}"
+    else:
+        playlist_url = f"https://y.qq.com/n/ryqq/playlist?id={playlist_id}"
+    response = _call(ctx, http, "import.start", "POST", "/api/v1/import", json={
+        "playlist_url": playlist_url,
+        "plex_url": ctx.plex_url,
+        "plex_token": PLEX_TOKEN,
+        "plex_playlist_name": f"loadtest-{playlist_id}",
+        "import_mode": "create_new",
+    })
+    if response is None:
+        return
+    task_id = response.json()["task_id"]
+    ctx.import_tasks.append(task_id)
+    _wait_for_task(ctx, http, "import", f"/api/v1/import/status/{task_id}", use_cursor=True)
+
+
+def run_plex_import(ctx, http):
+    playlist_id = ctx.next_playlist_id()
+    songs = ctx.library.playlist_songs(playlist_id, ctx.args.playlist_size, ctx.args.hit_rate)
+    response = _call(ctx, http, "plex_import.start", "POST", "/api/v1/plex/import", expected=(202,), json={
+        "import_options": {"mode": "create_new"},
+        "source_info": {"platform_name": "负载测试", "original_playlist_title": f"loadtest-{playlist_id}"},
+        "songs": [{"title": title, "artist": artist} for title, artist in songs],
+    })
+    if response is None:
+        return
+    _wait_for_task(ctx, http, "plex_import", f"/api/v1/tasks/{response.json()['task_id']}", use_cursor=False,
+                   check_result=_check_plex_import_result)
+
+
+def _check_plex_import_result(data):
+    """已完成的 /plex/import 任务必须带有成功的结果和最终的播放列表名。"""
+    result = data.get("result") or {}
+    if not result.get("success") or not result.get("final_playlist_name"):
+        return "missing result"
+    return None
+
+
+def run_extract(ctx, http):
+    playlist_id = ctx.next_playlist_id()
+    body = {"source": "netease" if playlist_id % 2 else "qq", "url_or_id": str(playlist_id),
+            "limit": ctx.args.page_size}
+    operation = "extract.first"
+    while not ctx.expired():
+        response = _call(ctx, http, operation, "POST", "/api/v1/playlist/extract", json=body)
+        if response is None:
+            return
+        cursor = response.json().get("next_cursor")
+        if not cursor:
+            return
+        body = {**body, "cursor": cursor}
+        operation = "extract.page"
+
+
+def run_status(ctx, http, cursors):
+    """轮询一个已有的导入任务；cursors 为该轮询者自己的 task_id -> cursor。"""
+    time.sleep(ctx.args.poll_interval)
+    if not ctx.import_tasks:
+        return
+    task_id = random.choice(ctx.import_tasks)
+    params = {"since": cursors[task_id]} if task_id in cursors else None
+    response = _call(ctx, http, "status.poll", "GET", f"/api/v1/import/status/{task_id}", params=params)
+    if response is not None:
+        cursors[task_id] = response.json().get("cursor")
+
+
+SCENARIOS = {
+    "import": run_import,
+    "plex_import": run_plex_import,
+    "extract": run_extract,
+    "status": run_status,
+}
+
+
+def _virtual_user(ctx, scenario):
+    import requests
+
+    with requests.Session() as http:
+        if scenario == "status":
+            cursors = {}
+            while not ctx.expired():
+                run_status(ctx, http, cursors)
+            return
+        while not ctx.expired():
+            SCENARIOS[scenario](ctx, http)
+
+
+def run_load(base_url, plex_url, library, args, mix):
+    """按 mix ({场景: 并发数}) 启动虚拟用户，持续 args.duration 秒，返回 (Recorder, 实际耗时)。"""
+    started = time.monotonic()
+    ctx = LoadContext(base_url, plex_url, library, args, started + args.duration)
+    threads = [
+        threading.Thread(target=_virtual_user, args=(ctx, scenario), name=f"{scenario}-{i}", daemon=True)
+        for scenario, users in mix.items() for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ctx.recorder, time.monotonic() - started
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """返回相对基线的退化描述列表。"""
+    regressions = []
+    for operation, base in baseline.get("operations", {}).items():
+        current = report["operations"].get(operation)
+        if current is None:
+            continue
+        if base.get("p99_ms") and current.get("p99_ms") and current["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{operation}: p99 {base['p99_ms']} ms -> {current['p99_ms']} ms")
+        if base.get("throughput") and current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{operation}: 吞吐 {base['throughput']}/s -> {current['throughput']}/s")
+        if current["error_rate"] > base.get("error_rate", 0.0) + ERROR_RATE_SLACK:
+            regressions.append(f"{operation}: 错误率 {base.get('error_rate', 0.0):.2%} -> {current['error_rate']:.2%}")
+    base_memory = baseline.get("memory", {})
+    memory = report["memory"]
+    if base_memory.get("available") and memory.get("available"):
+        allowed = max(0.0, base_memory["growth_mb"]) * (1 + tolerance) + MEMORY_GROWTH_SLACK_MB
+        if memory["growth_mb"] > allowed:
+            regressions.append(f"内存增长 {base_memory['growth_mb']} MB -> {memory['growth_mb']} MB")
+    return regressions
+
+
+def format_report(report):
+    lines = [f"持续 {report['elapsed']:.1f} s，并发: "
+             + ", ".join(f"{scenario}={users}" for scenario, users in report["config"]["mix"].items())]
+    lines.append(f"{'操作':<20}{'次数':>8}{'吞吐/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'错误率':>8}")
+    fmt = lambda value: "-" if value is None else f"{value:.1f}"
+    for operation, stats in report["operations"].items():
+        lines.append(f"{operation:<20}{stats['count']:>8}{stats['throughput']:>9.2f}{fmt(stats['p50_ms']):>9}"
+                     f"{fmt(stats['p90_ms']):>9}{fmt(stats['p99_ms']):>9}{fmt(stats['max_ms']):>9}"
+                     f"{stats['error_rate']:>8.1%}")
+        if stats["error_kinds"]:
+            lines.append(f"{'':<20}错误: " + ", ".join(f"{kind} x{n}" for kind, n in stats["error_kinds"].items()))
+        if stats["unfinished"]:
+            lines.append(f"{'':<20}结束时仍在运行: {stats['unfinished']}")
+    memory = report["memory"]
+    if memory.get("available"):
+        lines.append(f"服务内存 (RSS): 开始 {memory['start_mb']} MB, 峰值 {memory['peak_mb']} MB, "
+                     f"结束 {memory['end_mb']} MB, 增长 {memory['growth_mb']} MB ({memory['growth_mb_per_min']} MB/min)")
+    else:
+        lines.append("服务内存 (RSS): 不可用（非 Linux 平台需安装 psutil）")
+    upstream = report["upstream_requests"]
+    lines.append(f"替身收到的请求: Plex {upstream['plex']}, 音乐平台 {upstream['platform']}")
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="对 API 服务进行负载测试（使用本地 Plex 与音乐平台替身）。")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help=f"持续秒数（默认 {DEFAULT_DURATION}）")
+    parser.add_argument("--imports", type=int, default=2, help="并发执行 /import 的虚拟用户数")
+    parser.add_argument("--plex-imports", type=int, default=1, help="并发执行 /plex/import 的虚拟用户数")
+    parser.add_argument("--extracts", type=int, default=4, help="并发执行 /playlist/extract 的虚拟用户数")
+    parser.add_argument("--pollers", type=int, default=8, help="并发轮询任务状态的虚拟用户数")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"状态轮询间隔秒数（默认 {DEFAULT_POLL_INTERVAL}）")
+    parser.add_argument("--task-timeout", type=float, default=DEFAULT_TASK_TIMEOUT, help="单个任务的最长等待秒数")
+    parser.add_argument("--request-timeout", type=float, default=30, help="单个请求的超时秒数")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="extract 分页大小")
+    parser.add_argument("--playlist-size", type=int, default=200, help="替身歌单的歌曲数")
+    parser.add_argument("--hit-rate", type=float, default=0.8, help="歌单中能在音乐库中找到的歌曲比例")
+    parser.add_argument("--artists", type=int, default=200, help="替身音乐库的艺术家数 (每位 3 张专辑 x 10 首)")
+    parser.add_argument("--sections", type=int, default=1, help="替身音乐库的音乐分区数")
+    parser.add_argument("--plex-latency", type=float, default=0.005, help="Plex 替身每个请求的延迟（秒）")
+    parser.add_argument("--platform-latency", type=float, default=0.02, help="音乐平台替身每个请求的延迟（秒）")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="uvicorn worker 进程数；多于 1 个时任务经由共享的任务队列分发（内存只统计主进程）")
+    parser.add_argument("-o", "--output", help="把报告保存为 JSON 文件")
+    parser.add_argument("--baseline", help="与之对比的基线报告 (JSON)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"相对基线允许的退化比例（默认 {DEFAULT_TOLERANCE}）")
+    parser.add_argument("--max-error-rate", type=float, help="任一操作的错误率超过该值时失败")
+    parser.add_argument("--keep-workdir", action="store_true", help="保留服务的临时工作目录（日志、断点）")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    mix = {scenario: users for scenario, users in (("import", args.imports), ("plex_import", args.plex_imports),
+                                                   ("extract", args.extracts), ("status", args.pollers)) if users > 0}
+    if not mix:
+        parser.error("至少需要一个并发数大于 0 的场景。")
+    if args.pollers and not args.imports:
+        parser.error("--pollers 轮询 /import 创建的任务，需要 --imports 大于 0。")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    library = loadtest_standins.StandinLibrary(artists=args.artists, sections=args.sections)
+    plex = loadtest_standins.start_plex_standin(library, PLEX_TOKEN, args.plex_latency)
+    platform = loadtest_standins.start_platform_standin(library, args.playlist_size, args.hit_rate,
+                                                        args.platform_latency)
+    service = ServiceProcess(platform.url, plex.url, workers=args.workers, keep_workdir=args.keep_workdir)
+    try:
+        service.start()
+        print(f"服务: {service.url}  Plex 替身: {plex.url} ({len(library.tracks)} 首)  音乐平台替身: {platform.url}")
+        sampler = MemorySampler(service.process.pid).start()
+        try:
+            recorder, elapsed = run_load(service.url, plex.url, library, args, mix)
+        finally:
+            sampler.stop()
+        if service.process.poll() is not None:
+            print(f"服务进程在测试中退出 (退出码 {service.process.returncode})，日志: {service.log_path}")
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        service.stop()
+        plex.stop()
+        platform.stop()
+
+    report = {
+        "config": {
+            "mix": mix, "duration": args.duration, "poll_interval": args.poll_interval,
+            "playlist_size": args.playlist_size, "hit_rate": args.hit_rate, "library_tracks": len(library.tracks),
+            "library_sections": args.sections,
+            "plex_latency": args.plex_latency, "platform_latency": args.platform_latency,
+        },
+        "elapsed": round(elapsed, 1),
+        "operations": recorder.summary(elapsed),
+        "memory": sampler.summary(),
+        "upstream_requests": {"plex": plex.request_count, "platform": platform.request_count},
+    }
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    if args.max_error_rate is not None:
+        failures += [f"{operation}: 错误率 {stats['error_rate']:.2%}" for operation, stats
+                     in report["operations"].items() if stats["error_rate"] > args.max_error_rate]
+    if baseline is not None:
+        if baseline.get("config", {}).get("mix") != mix:
+            print(f"警告: 基线的并发配置 {baseline.get('config', {}).get('mix')} 与本次不同，对比结果仅供参考。")
+        failures += compare_with_baseline(report, baseline, args.tolerance)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+# loadtest_standins.py
+"""
+负载测试用的本地替身服务：Plex 服务器与网易云/QQ音乐 API。
+
+- Plex 替身实现 plexapi 在导入流程中用到的接口（服务器信息、音乐库分区、
+  /library/all 搜索、分区分页枚举（含 addedAt 过滤，供重新匹配使用）、艺术家曲目、播放列表的创建/增删），
+  返回与 Plex 相同结构的 XML，并按 X-Plex-Container-Start/Size 分页；
+- 音乐平台替身同时实现网易云的歌单/歌曲详情接口与 QQ音乐的歌单分页接口，
+  歌单内容由歌单 ID 决定（同一 ID 每次返回相同的歌曲），其中 hit_rate 比例的歌曲
+  来自替身音乐库（部分带有大小写、后缀等差异以触发模糊匹配），其余在库中不存在。
+
+两者都可以注入固定延迟，用来模拟远端服务的响应时间。服务运行在后台线程中，
+由 loadtest.py 启动；也可以单独运行，手动把 API 服务指向它们：
+
+    python loadtest_standins.py --plex-port 32401 --platform-port 32402
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STANDIN_MACHINE_ID = "plexlist-loadtest-standin"
+# QQ音乐替身每页最多返回的歌曲数（真实接口也会限制 song_num）
+QQ_MAX_PAGE_SIZE = 1000
+# 网易云歌曲 ID = 歌单ID * NETEASE_SONG_ID_BASE + 歌单内序号
+NETEASE_SONG_ID_BASE = 1_000_000
+# 初始音乐库中所有音轨的 addedAt（Unix 秒）
+STANDIN_ADDED_AT = 1_600_000_000
+
+_WORDS = ("晴天", "夜曲", "稻香", "告白", "海阔天空", "光年", "River", "Light", "Moon", "Summer",
+          "Rain", "Blue", "Dream", "Fire", "Story", "Road", "Star", "Heart", "Echo", "Garden")
+# 对库中歌曲名做的变形，模拟音乐平台与 Plex 元数据的常见差异
+_VARIANTS = (
+    lambda title: title,
+    lambda title: title.upper(),
+    lambda title: f"{title} (Live)",
+    lambda title: f"{title} - Remastered",
+)
+
+
+class StandinLibrary:
+    """
+    确定性生成的音乐库：艺术家 -> 专辑 -> 歌曲，ratingKey 连续编号。
+    艺术家轮流分配到 sections 个音乐分区（key 为 1..sections）。
+    运行中可以用 add_artist() / add_album() 模拟音乐库新增音轨。
+    """
+
+    def __init__(self, artists=200, albums_per_artist=3, tracks_per_album=10, sections=1, seed=0):
+        rng = random.Random(seed)
+        self.section_keys = list(range(1, sections + 1))
+        self.artists = []  # (ratingKey, 名称, [歌曲下标], 分区 key)
+        self.tracks = []   # (ratingKey, 歌名, 艺术家下标, 专辑名)
+        next_key = 1
+        for a in range(artists):
+            artist_key = next_key
+            next_key += 1
+            artist_name = f"{rng.choice(_WORDS)} {rng.choice(_WORDS)} Band {a}"
+            track_indexes = []
+            for b in range(albums_per_artist):
+                album_title = f"{rng.choice(_WORDS)} Album {a}-{b}"
+                next_key += 1  # 专辑本身也占一个 ratingKey
+                for _ in range(tracks_per_album):
+                    track_indexes.append(len(self.tracks))
+                    self.tracks.append((next_key, f"{rng.choice(_WORDS)} {rng.choice(_WORDS)} {len(self.tracks)}",
+                                        a, album_title))
+                    next_key += 1
+            self.artists.append((artist_key, artist_name, track_indexes, self.section_keys[a % sections]))
+        self.added_at = [STANDIN_ADDED_AT] * len(self.tracks)  # 与 tracks 对应
+        self.next_key = next_key
+        self.track_by_key = {track[0]: i for i, track in enumerate(self.tracks)}
+        self.artist_by_key = {artist[0]: i for i, artist in enumerate(self.artists)}
+        self._lower_titles = [track[1].lower() for track in self.tracks]
+        self._lower_artists = [artist[1].lower() for artist in self.artists]
+
+    def add_artist(self, name, section=None):
+        """新增一位艺术家（暂无歌曲），返回其下标。"""
+        self.artists.append((self.next_key, name, [], section or self.section_keys[0]))
+        self.artist_by_key[self.next_key] = len(self.artists) - 1
+        self._lower_artists.append(name.lower())
+        self.next_key += 1
+        return len(self.artists) - 1
+
+    def add_album(self, artist_index, titles, album_title=None, added_at=None):
+        """为艺术家新增一张专辑，返回新音轨的 ratingKey 列表。"""
+        added_at = int(added_at if added_at is not None else time.time())
+        album_title = album_title or f"New Album {artist_index}-{self.next_key}"
+        self.next_key += 1
+        keys = []
+        for title in titles:
+            index = len(self.tracks)
+            self.tracks.append((self.next_key, title, artist_index, album_title))
+            self.added_at.append(added_at)
+            self._lower_titles.append(title.lower())
+            self.track_by_key[self.next_key] = index
+            self.artists[artist_index][2].append(index)
+            keys.append(self.next_key)
+            self.next_key += 1
+        return keys
+
+    def search_tracks(self, title=None, artist=None, section=None, added_after=None):
+        """
+        按子串（不区分大小写）搜索歌曲，与 Plex 的 /library/all?title= 行为一致。
+        added_after: 只返回 addedAt 晚于该时间的歌曲（对应 addedAt>>=）。
+        """
+        artist_ids = None
+        if artist or section is not None:
+            artist = artist.lower() if artist else ""
+            artist_ids = {i for i, name in enumerate(self._lower_artists)
+                          if artist in name and (section is None or self.artists[i][3] == section)}
+        title = title.lower() if title else None
+        return [i for i, lower in enumerate(self._lower_titles)
+                if (title is None or title in lower) and (artist_ids is None or self.tracks[i][2] in artist_ids)
+                and (added_after is None or self.added_at[i] > added_after)]
+
+    def search_artists(self, title=None, section=None):
+        title = title.lower() if title else None
+        return [i for i, lower in enumerate(self._lower_artists)
+                if (title is None or title in lower) and (section is None or self.artists[i][3] == section)]
+
+    def playlist_songs(self, playlist_id, size, hit_rate):
+        """返回歌单 playlist_id 的 [(歌名, 艺术家)]，同一 ID 结果不变。"""
+        rng = random.Random(playlist_id)
+        songs = []
+        for i in range(size):
+            if self.tracks and rng.random() < hit_rate:
+                _, title, artist_index, _ = rng.choice(self.tracks)
+                songs.append((rng.choice(_VARIANTS)(title), self.artists[artist_index][1]))
+            else:
+                songs.append((f"Missing Song {playlist_id}-{i}", f"Unknown Artist {rng.randrange(1000)}"))
+        return songs
+
+
+class _StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # 客户端关闭长连接是正常情况，不打印堆栈
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # 负载测试时每秒数百个请求，不逐条打印
+
+    def _dispatch(self, method):
+        parts = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.stats_lock:
+            self.server.request_count += 1
+        try:
+            status, content_type, body = self.route(method, parts.path)
+        except Exception as e:  # 替身自身出错时返回 500，便于在报告中看到
+            status, content_type, body = 500, "text/plain; charset=utf-8", str(e).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def route(self, method, path):
+        raise NotImplementedError
+
+
+def _xml(container):
+    return 200, "text/xml; charset=utf-8", ET.tostring(container, encoding="utf-8")
+
+
+def _json(payload):
+    return 200, "application/json; charset=utf-8", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+class _PlexHandler(_StandinHandler):
+
+    def _paged(self, items, **attrs):
+        """按 X-Plex-Container-Start/Size（请求头或查询参数）分页，items 为 Element 生成函数列表。"""
+        start = int(self.headers.get("X-Plex-Container-Start") or self.query.get("X-Plex-Container-Start") or 0)
+        size = self.headers.get("X-Plex-Container-Size") or self.query.get("X-Plex-Container-Size")
+        page = items[start:start + int(size)] if size is not None else items[start:]
+        container = ET.Element("MediaContainer", size=str(len(page)), totalSize=str(len(items)),
+                               offset=str(start), **attrs)
+        for make in page:
+            container.append(make())
+        return _xml(container)
+
+    def _track(self, index, **extra):
+        library = self.server.library
+        rating_key, title, artist_index, album = library.tracks[index]
+        artist_key = library.artists[artist_index][0]
+        return ET.Element(
+            "Track", ratingKey=str(rating_key), key=f"/library/metadata/{rating_key}", type="track",
+            title=title, grandparentTitle=library.artists[artist_index][1],
+            grandparentKey=f"/library/metadata/{artist_key}", grandparentRatingKey=str(artist_key),
+            parentTitle=album, librarySectionID=str(library.artists[artist_index][3]),
+            addedAt=str(library.added_at[index]), **extra)
+
+    def _artist(self, index):
+        rating_key, name, _, section = self.server.library.artists[index]
+        return ET.Element("Directory", ratingKey=str(rating_key), key=f"/library/metadata/{rating_key}/children",
+                          type="artist", title=name, librarySectionID=str(section))
+
+    def _playlist(self, playlist_key):
+        title, items = self.server.playlists[playlist_key]
+        return ET.Element("Playlist", ratingKey=str(playlist_key), key=f"/playlists/{playlist_key}/items",
+                          type="playlist", title=title, playlistType="audio", smart="0", leafCount=str(len(items)))
+
+    def _tracks(self, indexes):
+        return self._paged([lambda i=i: self._track(i) for i in indexes])
+
+    def _uri_keys(self):
+        """从 uri=server://.../library/metadata/1,2,3 中取出 ratingKey 列表。"""
+        uri = self.query.get("uri", "")
+        return [int(k) for k in uri.rsplit("/", 1)[-1].split(",") if k.isdigit()]
+
+    def route(self, method, path):
+        server = self.server
+        if server.token and self.headers.get("X-Plex-Token", self.query.get("X-Plex-Token")) != server.token:
+            return 401, "text/plain", b"Unauthorized"
+        library = server.library
+        path = path.rstrip("/") or "/"
+        segments = path.strip("/").split("/")
+
+        if path == "/":
+            return _xml(ET.Element("MediaContainer", friendlyName="Plexlist Stand-in",
+                                   machineIdentifier=STANDIN_MACHINE_ID, version="1.40.0.0", myPlex="0"))
+        if path == "/clients":
+            return _xml(ET.Element("MediaContainer", size="0"))
+        if path == "/library":
+            return _xml(ET.Element("MediaContainer", title1="Plex Library", identifier="com.plexapp.plugins.library"))
+        if path == "/library/sections":
+            container = ET.Element("MediaContainer", size=str(len(library.section_keys)))
+            for key in library.section_keys:
+                ET.SubElement(container, "Directory", key=str(key), type="artist",
+                              title="Music" if key == 1 else f"Music {key}", agent="tv.plex.agents.music",
+                              scanner="Plex Music", language="en-US", uuid=f"standin-music-{key}")
+            return _xml(container)
+        section = None
+        if segments[:2] == ["library", "sections"] and len(segments) == 4 and segments[3] == "all":
+            section = int(segments[2]) if segments[2].isdigit() else None
+            if section not in library.section_keys:
+                return 404, "text/plain", b"Not Found"
+        if path == "/library/all" or section is not None:
+            if self.query.get("type") == "8":
+                return self._paged([lambda i=i: self._artist(i)
+                                    for i in library.search_artists(self.query.get("title"), section)])
+            added_after = self.query.get("addedAt>>")
+            indexes = library.search_tracks(self.query.get("title"), self.query.get("artist"), section,
+                                            int(added_after) if added_after is not None else None)
+            if self.query.get("sort", "").startswith("addedAt"):
+                indexes.sort(key=library.added_at.__getitem__)
+            return self._tracks(indexes)
+        if segments[:2] == ["library", "metadata"] and len(segments) >= 3:
+            keys = [int(k) for k in segments[2].split(",") if k.isdigit()]
+            if len(segments) == 4 and segments[3] == "allLeaves" and keys and keys[0] in library.artist_by_key:
+                return self._tracks(library.artists[library.artist_by_key[keys[0]]][2])
+            items = []
+            for key in keys:
+                if key in library.track_by_key:
+                    items.append(lambda key=key: self._track(library.track_by_key[key]))
+                elif key in library.artist_by_key:
+                    items.append(lambda key=key: self._artist(library.artist_by_key[key]))
+            if not items:
+                return 404, "text/plain", b"Not Found"
+            return self._paged(items)
+
+        if segments[0] == "playlists":
+            with server.playlists_lock:
+                return self._route_playlists(method, segments[1:])
+        return 404, "text/plain", b"Not Found"
+
+    def _route_playlists(self, method, segments):
+        server = self.server
+        library = server.library
+        if not segments:
+            if method == "POST":
+                playlist_key = server.next_playlist_key
+                server.next_playlist_key += 1
+                server.playlists[playlist_key] = (self.query.get("title", ""), [])
+                self._add_items(playlist_key)
+                container = ET.Element("MediaContainer", size="1")
+                container.append(self._playlist(playlist_key))
+                return _xml(container)
+            title = self.query.get("title", "").lower()
+            return self._paged([lambda k=k: self._playlist(k) for k, (name, _) in server.playlists.items()
+                                if title in name.lower()])
+
+        playlist_key = int(segments[0]) if segments[0].isdigit() else None
+        if playlist_key not in server.playlists:
+            return 404, "text/plain", b"Not Found"
+        if len(segments) == 1:
+            if method == "DELETE":
+                del server.playlists[playlist_key]
+                return 200, "text/plain", b""
+            return self._paged([lambda: self._playlist(playlist_key)])
+        items = server.playlists[playlist_key][1]
+        if method == "PUT":
+            self._add_items(playlist_key)
+            container = ET.Element("MediaContainer", size="1")
+            container.append(self._playlist(playlist_key))
+            return _xml(container)
+        if method == "DELETE" and len(segments) == 3:
+            item_id = int(segments[2])
+            items[:] = [item for item in items if item[0] != item_id]
+            return 200, "text/plain", b""
+        return self._paged([lambda item=item: self._track(library.track_by_key[item[1]], playlistItemID=str(item[0]))
+                            for item in items])
+
+    def _add_items(self, playlist_key):
+        server = self.server
+        items = server.playlists[playlist_key][1]
+        for key in self._uri_keys():
+            if key in server.library.track_by_key:
+                items.append((server.next_item_id, key))
+                server.next_item_id += 1
+
+
+class _PlatformHandler(_StandinHandler):
+
+    def _songs(self, playlist_id):
+        server = self.server
+        return server.library.playlist_songs(playlist_id, server.playlist_size, server.hit_rate)
+
+    def route(self, method, path):
+        if path == "/api/v6/playlist/detail":
+            playlist_id = int(self.query.get("id", 0))
+            track_ids = [{"id": playlist_id * NETEASE_SONG_ID_BASE + i} for i in range(self.server.playlist_size)]
+            return _json({"code": 200, "playlist": {"id": playlist_id, "name": f"替身歌单 {playlist_id}",
+                                                    "trackIds": track_ids}})
+        if path == "/api/v3/song/detail":
+            form = {k: v[-1] for k, v in parse_qs(self.body.decode("utf-8")).items()}
+            songs = []
+            cache = {}
+            for item in json.loads(form.get("c", "[]")):
+                playlist_id, index = divmod(int(item["id"]), NETEASE_SONG_ID_BASE)
+                if playlist_id not in cache:
+                    cache[playlist_id] = self._songs(playlist_id)
+                title, artists = cache[playlist_id][index]
+                songs.append({"id": item["id"], "name": title, "ar": [{"name": artists}]})
+            return _json({"code": 200, "songs": songs})
+        if path == "/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg":
+            playlist_id = int(self.query.get("disstid", 0))
+            begin = int(self.query.get("song_begin", 0))
+            num = min(int(self.query.get("song_num", QQ_MAX_PAGE_SIZE)), QQ_MAX_PAGE_SIZE)
+            songs = self._songs(playlist_id)
+            songlist = [{"songname": title, "singer": [{"name": artist}]} for title, artist in songs[begin:begin + num]]
+            return _json({"code": 0, "cdlist": [{"disstid": str(playlist_id), "dissname": f"替身歌单 {playlist_id}",
+                                                 "total_song_num": len(songs), "songlist": songlist}]})
+        return 404, "text/plain", b"Not Found"
+
+
+class Standin:
+    """在后台线程中运行的替身服务。"""
+
+    def __init__(self, handler_class, host="127.0.0.1", port=0, latency=0.0, **attributes):
+        self.httpd = _StandinServer((host, port), handler_class)
+        self.httpd.latency = latency
+        self.httpd.request_count = 0
+        self.httpd.stats_lock = threading.Lock()
+        for name, value in attributes.items():
+            setattr(self.httpd, name, value)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=handler_class.__name__, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        with self.httpd.stats_lock:
+            return self.httpd.request_count
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_plex_standin(library, token=None, latency=0.0, host="127.0.0.1", port=0):
+    return Standin(_PlexHandler, host, port, latency, library=library, token=token,
+                   playlists={}, playlists_lock=threading.Lock(), next_playlist_key=10_000_000,
+                   next_item_id=1).start()
+
+
+def start_platform_standin(library, playlist_size=500, hit_rate=0.8, latency=0.0, host="127.0.0.1", port=0):
+    return Standin(_PlatformHandler, host, port, latency, library=library,
+                   playlist_size=playlist_size, hit_rate=hit_rate).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="启动 Plex 与音乐平台的本地替身服务。")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--plex-port", type=int, default=32401)
+    parser.add_argument("--platform-port", type=int, default=32402)
+    parser.add_argument("--plex-token", default="loadtest", help="替身 Plex 要求的 X-Plex-Token")
+    parser.add_argument("--artists", type=int, default=200, help="替身音乐库的艺术家数 (每位 3 张专辑 x 10 首)")
+    parser.add_argument("--sections", type=int, default=1, help="替身音乐库的音乐分区数")
+    parser.add_argument("--playlist-size", type=int, default=500, help="每个替身歌单的歌曲数")
+    parser.add_argument("--hit-rate", type=float, default=0.8, help="歌单中能在音乐库中找到的歌曲比例")
+    parser.add_argument("--plex-latency", type=float, default=0.0, help="Plex 替身每个请求的延迟（秒）")
+    parser.add_argument("--platform-latency", type=float, default=0.0, help="音乐平台替身每个请求的延迟（秒）")
+    args = parser.parse_args(argv)
+
+    library = StandinLibrary(artists=args.artists, sections=args.sections)
+    plex = start_plex_standin(library, args.plex_token, args.plex_latency, args.host, args.plex_port)
+    platform = start_platform_standin(library, args.playlist_size, args.hit_rate, args.platform_latency,
+                                      args.host, args.platform_port)
+    print(f"Plex 替身: {plex.url} (token: {args.plex_token}, {len(library.tracks)} 首歌曲)")
+    print(f"音乐平台替身: {platform.url}")
+    print(f"启动 API 服务前设置: PLEXLIST_NETEASE_API_BASE={platform.url} PLEXLIST_QQ_API_BASE={platform.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        plex.stop()
+        platform.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,143 @@
 # logging_config.py
+import atexit
 import logging
 import logging.handlers
 import os
-from queue import Queue
+from queue import Queue, Full, Empty
 import sys
 import threading
+import time
+
+# 后台写日志的队列容量；写满后按 BoundedQueueHandler 的策略丢弃/采样
+LOG_QUEUE_MAXSIZE = 10000
+# 队列使用率超过该比例时，WARNING 以下的记录只保留 1/LOG_SAMPLE_RATE
+LOG_SAMPLE_WATERMARK = 0.8
+LOG_SAMPLE_RATE = 10
+# 丢弃汇总记录的最小间隔（秒）
+LOG_DROP_NOTICE_INTERVAL = 5.0
+# GUI 日志面板的队列容量；写满后丢弃最旧的记录
+GUI_LOG_QUEUE_MAXSIZE = 5000
+
+# 1. 日志队列，用于 GUI 和其他线程通信（仅在 GUI 运行时挂载 handler）
+log_queue = Queue(maxsize=GUI_LOG_QUEUE_MAXSIZE)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_queue_handler = None
+_gui_handler = None
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞的队列 Handler，调用线程永远不会等待磁盘 I/O 或队列空位。
+
+    丢弃/采样策略：
+    - 队列使用率低于水位线：全部入队。
+    - 超过水位线：WARNING 以下的记录每 LOG_SAMPLE_RATE 条保留 1 条，其余丢弃。
+    - 队列已满：WARNING 以下直接丢弃；WARNING 及以上挤掉队首最旧的一条后入队。
+    被丢弃的条数按 LOG_DROP_NOTICE_INTERVAL 的间隔汇总为一条 WARNING 记录写出。
+    """
+    def __init__(self, queue, watermark=LOG_SAMPLE_WATERMARK, sample_rate=LOG_SAMPLE_RATE):
+        super().__init__(queue)
+        self.high_watermark = int(queue.maxsize * watermark) if queue.maxsize > 0 else 0
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._sample_counter = 0
+        self._last_notice = 0.0
+        self._drop_lock = threading.Lock()
+
+    def _count_drop(self):
+        with self._drop_lock:
+            self.dropped += 1
+
+    def _take_dropped(self):
+        now = time.monotonic()
+        with self._drop_lock:
+            if not self.dropped or now - self._last_notice < LOG_DROP_NOTICE_INTERVAL:
+                return 0
+            dropped, self.dropped = self.dropped, 0
+            self._last_notice = now
+        return dropped
+
+    def drop_notice(self, dropped):
+        notice = logging.LogRecord(
+            "logging_config", logging.WARNING, __file__, 0,
+            "日志队列繁忙，已丢弃 %d 条日志记录", (dropped,), None
+        )
+        return self.prepare(notice)
+
+    def _put(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except Full:
+            if record.levelno < logging.WARNING:
+                return False
+        # 高级别记录：挤掉最旧的一条再试一次
+        try:
+            self.queue.get_nowait()
+            self._count_drop()
+        except Empty:
+            pass
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except Full:
+            return False
+
+    def enqueue(self, record):
+        if self.high_watermark and record.levelno < logging.WARNING and self.queue.qsize() >= self.high_watermark:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self._count_drop()
+                return
+
+        dropped = self._take_dropped()
+        if dropped:
+            if not self._put(self.drop_notice(dropped)):
+                with self._drop_lock:
+                    self.dropped += dropped
+
+        if not self._put(record):
+            self._count_drop()
+
+
+class _BackgroundListener(logging.handlers.QueueListener):
+    """有界队列下的 QueueListener：停止时阻塞等待空位放入哨兵，避免队列满时丢失停止信号"""
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
 
-# 1. 日志队列，用于 GUI 和其他线程通信
-log_queue = Queue()
 
 class QueueHandler(logging.Handler):
-    """将日志记录发送到队列的 Handler"""
+    """将日志记录发送到 GUI 队列的 Handler；队列满时丢弃最旧的记录"""
     def __init__(self, queue):
         super().__init__()
         self.queue = queue
 
     def emit(self, record):
-        self.queue.put(record) # 直接发送 LogRecord 对象，GUI端将负责格式化
+        # 由 formatter 填充 record.asctime，GUI 端据此格式化
+        self.format(record)
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                pass
+            try:
+                self.queue.put_nowait(record)
+            except Full:
+                pass
+
+def setup_logging(console_stream=None, console_level=logging.INFO):
+    """
+    配置根 logger：记录经有界队列交给后台 QueueListener 写入控制台和文件。
+
+    console_stream 默认为 sys.stdout；命令行工具把结果写到 stdout 时可改为 sys.stderr。
+    """
+    global _listener, _queue_handler
 
-def setup_logging():
-    """配置根 logger"""
     log_dir = 'logs'
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
@@ -27,20 +145,19 @@ def setup_logging():
     log_file = os.path.join(log_dir, 'app.log')
 
     # 2. 定义日志格式
-    log_format = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    log_format = logging.Formatter(LOG_FORMAT)
 
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG) # 设置根 logger 的级别为 DEBUG
 
     # 清除已有handler，避免重复添加
+    shutdown_logging()
     if root_logger.hasHandlers():
         root_logger.handlers.clear()
 
     # 3. 控制台 Handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO) # 控制台只显示 INFO 及以上级别
+    console_handler = logging.StreamHandler(console_stream or sys.stdout)
+    console_handler.setLevel(console_level) # 控制台默认只显示 INFO 及以上级别
     console_handler.setFormatter(log_format)
 
     # 4. 文件 Handler (每天轮换)
@@ -50,16 +167,39 @@ def setup_logging():
     file_handler.setLevel(logging.DEBUG) # 文件记录所有 DEBUG 及以上级别
     file_handler.setFormatter(log_format)
 
-    # 5. GUI 队列 Handler
-    queue_handler = QueueHandler(log_queue)
-    queue_handler.setLevel(logging.INFO) # GUI 只显示 INFO 及以上级别
-    # QueueHandler 不需要 formatter，因为我们将在GUI端格式化
-    # queue_handler.setFormatter(log_format)
+    # 5. 控制台和文件 Handler 在后台线程中运行，业务线程只负责入队
+    _listener = _BackgroundListener(
+        Queue(maxsize=LOG_QUEUE_MAXSIZE), console_handler, file_handler,
+        respect_handler_level=True
+    )
+    _queue_handler = BoundedQueueHandler(_listener.queue)
+    root_logger.addHandler(_queue_handler)
+    _listener.start()
+
+def attach_gui_handler():
+    """挂载 GUI 队列 Handler，仅在 GUI 运行时调用"""
+    global _gui_handler
+    if _gui_handler is None:
+        _gui_handler = QueueHandler(log_queue)
+        _gui_handler.setLevel(logging.INFO) # GUI 只显示 INFO 及以上级别
+        _gui_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root_logger = logging.getLogger()
+    if _gui_handler not in root_logger.handlers:
+        root_logger.addHandler(_gui_handler)
+    return _gui_handler
+
+def shutdown_logging():
+    """停止后台监听线程，写出队列中剩余的记录"""
+    global _listener
+    if _listener is not None:
+        # 补写尚未汇总的丢弃条数
+        if _queue_handler is not None and _queue_handler.dropped:
+            _listener.queue.put(_queue_handler.drop_notice(_queue_handler.dropped))
+            _queue_handler.dropped = 0
+        _listener.stop()
+        _listener = None
 
-    # 6. 为根 logger 添加 Handlers
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(queue_handler)
+atexit.register(shutdown_logging)
 
 def handle_exception(exc_type, exc_value, exc_traceback):
     """全局异常钩子函数"""
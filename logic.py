@@ -1,28 +1,70 @@
 import json
-import requests
 import threading
 import re
 import os
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import lazy_import
+import plex_cache
+import profiling
+import rate_limit
+import unmatched_store
+from match_planner import StrategyPlanner
+from normalization import canonical_key, key_from_normalized, normalize_string
 
 logger = logging.getLogger(__name__)
 
-try:
-    from thefuzz import fuzz
-except ImportError:
-    fuzz = None
+# plexapi、thefuzz、requests 导入较慢，在首次使用时才导入，见 lazy_import
+
+def _fuzz():
+    """返回 thefuzz.fuzz 模块，未安装时返回 None。"""
+    return lazy_import.optional("thefuzz.fuzz")
+
+class PlexapiMissing(Exception):
+    """plexapi 未安装时 NotFound / Unauthorized 的替身，不会被抛出，只保证 except 子句可用。"""
 
-try:
-    from plexapi.server import PlexServer
-    from plexapi.exceptions import NotFound, Unauthorized
-except ImportError:
-    PlexServer = None
-    NotFound = None
-    Unauthorized = None
+def _plexapi():
+    """
+    返回 (PlexServer, NotFound, Unauthorized)。plexapi 未安装时 PlexServer 为 None，
+    两个异常类为 PlexapiMissing，`except logic.NotFound` 之类的写法不会因此抛出 TypeError。
+    """
+    server = lazy_import.optional("plexapi.server")
+    exceptions = lazy_import.optional("plexapi.exceptions")
+    if server is None or exceptions is None:
+        return None, PlexapiMissing, PlexapiMissing
+    return server.PlexServer, exceptions.NotFound, exceptions.Unauthorized
+
+_LAZY_ATTRIBUTES = {
+    "fuzz": _fuzz,
+    "PlexServer": lambda: _plexapi()[0],
+    "NotFound": lambda: _plexapi()[1],
+    "Unauthorized": lambda: _plexapi()[2],
+}
+
+def __getattr__(name):
+    """兼容 logic.fuzz、logic.PlexServer 等属性，访问时才导入对应的库。"""
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 PLEX_CONFIG_FILE = "plex_config.json"
 
+# 匹配策略名称，出现在预览结果中
+MATCH_EXACT = "exact"
+MATCH_ARTIST_FUZZY = "artist_fuzzy"
+MATCH_GLOBAL_FUZZY = "global_fuzzy"
+# 批量预览匹配时并发查询 Plex 的线程数
+BULK_MATCH_WORKERS = 8
+# 模糊策略的接受阈值：艺术家内 partial_ratio、全局综合分超过该值视为匹配
+ARTIST_FUZZY_THRESHOLD = 85
+GLOBAL_FUZZY_THRESHOLD = 90
+# 模糊打分达到该值时不再比较其余候选，直接采用该候选并结束匹配。它明显高于两个接受阈值，
+# 之后的候选即使更高也几乎总是同一首歌的其他版本。可用环境变量 PLEXLIST_EARLY_STOP_SCORE 修改
+# （设为 100 时只在满分时提前结束）
+EARLY_STOP_SCORE = float(os.environ.get("PLEXLIST_EARLY_STOP_SCORE") or 95)
+
 def load_plex_config():
     if os.path.exists(PLEX_CONFIG_FILE):
         try:
@@ -33,18 +75,120 @@ def load_plex_config():
     return {}
 
 def save_plex_config(config):
+    """把 config 合并进已有配置后写回，未提供的键（如 log_viewer_max_lines）保持不变。"""
+    merged = {**load_plex_config(), **config}
     with open(PLEX_CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=4)
+        json.dump(merged, f, indent=4)
+
+CHECKPOINT_DIR = "checkpoints"
+# 每处理多少首歌写一次断点
+CHECKPOINT_INTERVAL = 100
+# 按 ratingKey 取回音轨时每个请求的数量
+RATING_KEY_FETCH_BATCH = 200
+# 并发请求网易云歌曲详情的线程数（实际速率受 rate_limit 控制）
+NETEASE_DETAIL_WORKERS = 4
+# 歌曲详情缺少部分歌曲时，只对缺少的 ID 重新请求的次数；仍缺少时报错，不导入不完整的歌单
+PLATFORM_MISSING_RETRIES = 2
+# QQ音乐歌单每页请求的歌曲数，以及并发请求的线程数（实际速率受 rate_limit 控制）
+QQ_PAGE_SIZE = 1000
+QQ_PAGE_WORKERS = 4
+# 音乐平台 API 地址，可通过环境变量指向本地替身服务（负载测试，见 loadtest.py）
+NETEASE_API_BASE = os.environ.get("PLEXLIST_NETEASE_API_BASE", "https://music.163.com").rstrip("/")
+QQ_API_BASE = os.environ.get("PLEXLIST_QQ_API_BASE", "https://c.y.qq.com").rstrip("/")
+
+def _checkpoint_path(task_id):
+    return os.path.join(CHECKPOINT_DIR, f"{task_id}.json")
+
+def load_checkpoint(task_id):
+    """读取任务断点，不存在或损坏时返回 None。"""
+    path = _checkpoint_path(task_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        logger.warning(f"断点文件损坏或无法读取: {path}")
+        return None
+
+def save_checkpoint(task_id, checkpoint):
+    """原子地写入任务断点（先写临时文件再替换）。"""
+    if not os.path.exists(CHECKPOINT_DIR):
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(task_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def delete_checkpoint(task_id):
+    try:
+        os.remove(_checkpoint_path(task_id))
+    except FileNotFoundError:
+        pass
+
+# 任务状态中会变化的标量字段；unmatched_songs 单独按偏移增量返回
+STATUS_FIELDS = ("status", "message", "progress", "total", "playlist_name", "resumable")
+
+def task_status_delta(state, since=None):
+    """
+    计算任务状态相对于游标 since 的增量。
+
+    游标格式为 "版本号:未匹配条数"，带流式匹配结果（results，如流式预览任务）时为
+    "版本号:未匹配条数:结果条数"，由上一次调用返回。since 为空或游标超前于当前状态
+    （如任务被续传、状态字典被替换）时返回完整状态，并置 full=True。
+    返回的字典只包含变化过的字段，以及 unmatched_offset 之后新增的 unmatched_songs；
+    带 results 时另含 results_offset 之后新增的 results。
+    """
+    # 先读版本与列表长度，再读字段：并发更新最多导致下次重复发送，不会漏掉
+    version = state.get("version", 0)
+    unmatched = state.get("unmatched_songs") or []
+    unmatched_count = len(unmatched)
+    results = state.get("results")
+    results_count = len(results) if results is not None else None
+    field_versions = state.get("field_versions")
+
+    since_version, since_unmatched, since_results = None, 0, 0
+    if since:
+        try:
+            parts = [int(part) for part in since.split(":")]
+        except ValueError:
+            raise ValueError(f"无效的状态游标: {since}")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"无效的状态游标: {since}")
+        since_version, since_unmatched = parts[:2]
+        since_results = parts[2] if len(parts) == 3 else 0
+        if (since_version > version or since_unmatched > unmatched_count or field_versions is None
+                or (results_count is not None and since_results > results_count)):
+            since_version, since_unmatched, since_results = None, 0, 0
+
+    full = since_version is None
+    cursor = f"{version}:{unmatched_count}"
+    if results_count is not None:
+        cursor += f":{results_count}"
+    delta = {"cursor": cursor, "full": full}
+    for field in STATUS_FIELDS:
+        if full or field_versions[field] > since_version:
+            delta[field] = state.get(field)
+    delta["unmatched_offset"] = since_unmatched
+    delta["unmatched_songs"] = list(unmatched[since_unmatched:unmatched_count])
+    delta["unmatched_total"] = unmatched_count
+    if results_count is not None:
+        delta["results_offset"] = since_results
+        delta["results"] = list(results[since_results:results_count])
+        delta["results_total"] = results_count
+    return delta
 
 def fetch_netease_playlist(playlist_id):
-    playlist_url = f"https://music.163.com/api/v6/playlist/detail?id={playlist_id}"
+    import requests
+    playlist_url = f"{NETEASE_API_BASE}/api/v6/playlist/detail?id={playlist_id}"
     headers_playlist = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
         "Referer": "https://music.163.com/",
         "Cookie": "appver=2.0.2; os=pc;"
     }
     try:
-        res_playlist = requests.get(playlist_url, headers=headers_playlist, timeout=10)
+        res_playlist = rate_limit.request("GET", playlist_url, headers=headers_playlist, timeout=10)
         res_playlist.raise_for_status()
         playlist_data = res_playlist.json()
     except requests.exceptions.RequestException as e:
@@ -81,67 +225,175 @@ def fetch_netease_playlist(playlist_id):
             return songs_limited, playlist_title # 返回歌曲和标题
         return [], playlist_title # 返回空歌曲列表和标题
 
-    song_details_url = "https://music.163.com/api/v3/song/detail"
+    song_details_url = f"{NETEASE_API_BASE}/api/v3/song/detail"
     headers_songs = headers_playlist.copy()
-    all_songs_output = []
     batch_size = 500
 
-    for i in range(0, len(track_ids), batch_size):
-        current_batch_ids = track_ids[i:i + batch_size]
-        c_param_value = json.dumps([{"id": tid} for tid in current_batch_ids])
+    def request_details(ids, start):
+        """请求一批歌曲详情，返回 {歌曲ID: (歌名, 艺术家)}。"""
+        c_param_value = json.dumps([{"id": tid} for tid in ids])
         payload = {'c': c_param_value}
         try:
-            res_songs = requests.post(song_details_url, headers=headers_songs, data=payload, timeout=15)
+            # 被限流时网易云常返回空的 songs，交给限流器退避后重试
+            res_songs = rate_limit.request("POST", song_details_url, is_throttled=_netease_songs_missing,
+                                           headers=headers_songs, data=payload, timeout=15)
             res_songs.raise_for_status()
             songs_batch_data = res_songs.json()
         except requests.exceptions.RequestException as e:
-            logger.warning(f"请求歌曲详情失败 (batch starting at {i}): {e}")
-            continue
+            raise ValueError(f"请求歌曲详情失败 (第 {start + 1} 首起): {e}")
         except json.JSONDecodeError:
-            logger.warning(f"解析歌曲详情响应失败 (batch starting at {i})。")
-            continue
-
-        if 'songs' in songs_batch_data:
-            for track_detail in songs_batch_data['songs']:
-                name = track_detail.get('name', '未知歌名')
-                artists = ", ".join([artist.get('name', '未知歌手') for artist in track_detail.get('ar', [])])
-                all_songs_output.append((name, artists))
-        else:
-            logger.warning(f"Batch for song details (starting index {i}) did not return 'songs' key.")
+            raise ValueError(f"解析歌曲详情响应失败 (第 {start + 1} 首起)。")
+
+        details = {}
+        for track_detail in songs_batch_data.get('songs') or []:
+            name = track_detail.get('name', '未知歌名')
+            artists = ", ".join([artist.get('name', '未知歌手') for artist in track_detail.get('ar', [])])
+            details[str(track_detail.get('id'))] = (name, artists)
+        return details
+
+    def fetch_batch(start):
+        current_batch_ids = track_ids[start:start + batch_size]
+        details = request_details(current_batch_ids, start)
+        for _ in range(PLATFORM_MISSING_RETRIES):
+            missing = [tid for tid in current_batch_ids if tid not in details]
+            if not missing:
+                break
+            logger.warning(f"歌曲详情 (第 {start + 1} 首起) 缺少 {len(missing)}/{len(current_batch_ids)} 首，重新请求缺少的部分。")
+            details.update(request_details(missing, start))
+        missing = [tid for tid in current_batch_ids if tid not in details]
+        if missing:
+            raise ValueError(f"歌曲详情 (第 {start + 1} 首起) 重试后仍缺少 {len(missing)}/{len(current_batch_ids)} 首，"
+                             f"歌单不完整，请稍后重试。")
+        # 按歌单中的顺序返回
+        return [details[tid] for tid in current_batch_ids]
+
+    # 各批次并发请求，实际并发度与速率由 rate_limit 按主机控制
+    all_songs_output = []
+    with ThreadPoolExecutor(max_workers=NETEASE_DETAIL_WORKERS) as pool:
+        for batch_songs in pool.map(fetch_batch, range(0, len(track_ids), batch_size)):
+            all_songs_output.extend(batch_songs)
     return all_songs_output, playlist_title # 返回歌曲和标题
 
-def fetch_qq_playlist(playlist_id):
-    url = f"https://c.y.qq.com/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
+def _netease_songs_missing(response):
+    try:
+        return not response.json().get('songs')
+    except ValueError:
+        return True
+
+_qq_session = None
+_qq_session_lock = threading.Lock()
+
+def _get_qq_session():
+    """QQ音乐分页请求共用的连接池会话。"""
+    global _qq_session
+    with _qq_session_lock:
+        if _qq_session is None:
+            import requests
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=QQ_PAGE_WORKERS)
+            session.mount("https://", adapter)
+            session.headers.update({
+                'referer': 'https://y.qq.com/',
+                'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+            _qq_session = session
+        return _qq_session
+
+def _qq_total(cd):
+    """歌单的歌曲总数，响应中没有时返回 None。"""
+    for field in ('total_song_num', 'songnum'):
+        value = cd.get(field)
+        if value not in (None, ""):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                pass
+    return None
+
+def _qq_songlist_missing(response):
+    try:
+        cdlist = response.json().get('cdlist')
+        if not cdlist:
+            return True
+        # 空歌单（总数为 0）是正常的响应，不是被限流
+        return not cdlist[0].get('songlist') and _qq_total(cdlist[0]) != 0
+    except (ValueError, AttributeError):
+        return True
+
+def _fetch_qq_page(playlist_id, song_begin, song_num):
+    """请求 QQ音乐歌单的一页，返回 cdlist[0]；失败时抛出 ValueError。"""
+    import requests
+    url = f"{QQ_API_BASE}/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
     params = {
         'type': '1', 'json': '1', 'utf8': '1', 'onlysong': '0',
-        'disstid': playlist_id, 'format': 'json', 'platform': 'yqq.json'
-    }
-    headers = {
-        'referer': 'https://y.qq.com/',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        'disstid': playlist_id, 'format': 'json', 'platform': 'yqq.json',
+        'song_begin': str(song_begin), 'song_num': str(song_num),
     }
     try:
-        res = requests.get(url, headers=headers, params=params, timeout=10)
+        # 被限流时 songlist 可能为空，交给限流器退避后重试
+        res = rate_limit.request("GET", url, is_throttled=_qq_songlist_missing, session=_get_qq_session(),
+                                 params=params, timeout=10)
         res.raise_for_status()
         data = res.json()
     except requests.exceptions.RequestException as e:
-        raise ValueError(f"请求QQ音乐歌单失败: {e}")
+        raise ValueError(f"请求QQ音乐歌单失败 (第 {song_begin + 1} 首起): {e}")
     except json.JSONDecodeError:
         raise ValueError("解析QQ音乐歌单响应失败，可能不是有效的JSON。")
 
-    playlist_title = "未知歌单"
-    songs = []
-    if 'cdlist' not in data or not data['cdlist'] or 'songlist' not in data['cdlist'][0]:
+    if 'cdlist' not in data or not data['cdlist']:
         raise ValueError("QQ音乐歌单格式不正确或歌单为空")
-
-    if 'dissname' in data['cdlist'][0]:
-        playlist_title = data['cdlist'][0]['dissname']
-
-    for song_item in data['cdlist'][0]['songlist']:
+    cd = data['cdlist'][0]
+    if 'songlist' not in cd:
+        if _qq_total(cd) != 0:
+            raise ValueError("QQ音乐歌单格式不正确或歌单为空")
+        cd['songlist'] = []
+    return cd
+
+def _qq_songs(songlist):
+    songs = []
+    for song_item in songlist:
         name = song_item.get('songname', '未知歌名')
         artists_list = [s.get('name', '未知歌手') for s in song_item.get('singer', [])]
         artist = ", ".join(artists_list) if artists_list else "未知歌手"
         songs.append((name, artist))
+    return songs
+
+def fetch_qq_playlist(playlist_id):
+    """
+    分页获取QQ音乐歌单 (song_begin/song_num)。首页返回 total_song_num 后，
+    其余各页在连接池会话上并发请求，速率由 rate_limit 控制，结果按页序拼接。
+    """
+    first = _fetch_qq_page(playlist_id, 0, QQ_PAGE_SIZE)
+    playlist_title = first.get('dissname') or "未知歌单"
+    songs = _qq_songs(first['songlist'])
+    total = _qq_total(first)
+    if total is None:
+        total = len(songs)
+
+    # 服务端可能把每页数量限制得比请求的小，以首页实际条数作为页大小
+    page_size = len(songs)
+    if page_size and total > page_size:
+        def fetch_page(start):
+            expected = min(page_size, total - start)
+            page_songs = _qq_songs(_fetch_qq_page(playlist_id, start, expected)['songlist'])
+            for _ in range(PLATFORM_MISSING_RETRIES):
+                if len(page_songs) >= expected:
+                    break
+                # 只重新请求这一页缺少的区间
+                logger.warning(f"QQ音乐歌单 {playlist_id} 第 {start + 1} 首起的一页只返回 {len(page_songs)}/{expected} 首，"
+                               f"重新请求缺少的部分。")
+                missing_begin = start + len(page_songs)
+                page_songs.extend(_qq_songs(
+                    _fetch_qq_page(playlist_id, missing_begin, expected - len(page_songs))['songlist']))
+            return page_songs[:expected]
+
+        with ThreadPoolExecutor(max_workers=QQ_PAGE_WORKERS) as pool:
+            for page_songs in pool.map(fetch_page, range(page_size, total, page_size)):
+                songs.extend(page_songs)
+
+    if len(songs) < total:
+        raise ValueError(f"QQ音乐歌单 {playlist_id} 应有 {total} 首，重试后只获取到 {len(songs)} 首，"
+                         f"歌单不完整，请稍后重试。")
     return songs, playlist_title
 
 def extract_playlist_id(url_or_id):
@@ -153,128 +405,343 @@ def extract_playlist_id(url_or_id):
     else:
         return None
 
-def normalize_string(text):
-    """标准化字符串，用于模糊比较。"""
-    if not text:
-        return ""
-    # 转换为小写
-    text = text.lower()
-    # 移除常见的多余词语和符号
-    text = re.sub(r"[\(\[].*?[\)\]]", "", text) # 移除括号和括号内的内容
-    text = re.sub(r"deluxe|explicit|remastered|feat\.|ft\.", "", text)
-    # 移除所有非字母和数字的字符
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.strip()
-
-def find_plex_track(plex, song_name, artist_name):
+def select_music_sections(plex, sections=None):
+    """
+    返回音乐库 (type 为 artist) 分区列表。sections 为分区 key 或名称（不区分大小写）的列表，
+    为空时返回全部音乐分区；其中有找不到的分区时抛出 ValueError。
+    """
+    music_sections = [s for s in plex.library.sections() if s.type == 'artist']
+    if not sections:
+        return music_sections
+    selected = []
+    for wanted in sections:
+        wanted = str(wanted).strip()
+        section = next((s for s in music_sections
+                        if str(s.key) == wanted or s.title.strip().lower() == wanted.lower()), None)
+        if section is None:
+            available = ", ".join(f"{s.key}:{s.title}" for s in music_sections) or "无"
+            raise ValueError(f"找不到音乐库分区 '{wanted}'。可选分区: {available}")
+        if section not in selected:
+            selected.append(section)
+    return selected
+
+def find_plex_track(plex, song_name, artist_name, source=None, section_ids=None):
+    """在Plex中查找音轨，返回匹配到的 Track 或 None。策略见 match_plex_track。"""
+    return match_plex_track(plex, song_name, artist_name, source=source, section_ids=section_ids)[0]
+
+def _match_exact(plex, song_name, artist_name, norm_song_name, norm_artist_name, artist_tracks_cache, section_ids):
+    """策略：精确搜索 (单次请求)。"""
+    with profiling.span("plex.search.exact"):
+        results = plex_cache.search(plex, song_name, libtype='track', section_ids=section_ids, artist=artist_name)
+    if results:
+        return results[0], 100
+    return None, 0
+
+def _match_artist_fuzzy(plex, song_name, artist_name, norm_song_name, norm_artist_name, artist_tracks_cache,
+                        section_ids):
+    """策略：先找到艺术家，再在其所有歌曲中模糊匹配歌名。"""
+    fuzz = _fuzz()
+    # 缓存值为 (歌曲列表, {精确键: 歌曲})，精确键只在取得歌曲列表时计算一次
+    cached = artist_tracks_cache.get(norm_artist_name) if artist_tracks_cache is not None else None
+    if cached is None:
+        artist_tracks = []
+        with profiling.span("plex.search.artist"):
+            artists = plex_cache.search(plex, norm_artist_name, libtype='artist', section_ids=section_ids)
+        for artist in artists:
+            with profiling.span("plex.artist.tracks"):
+                artist_tracks.extend(artist.tracks())
+        tracks_by_key = {}
+        for track in artist_tracks:
+            # 同名歌曲保留第一首，与逐首比较时的结果一致
+            tracks_by_key.setdefault(canonical_key(track.title), track)
+        cached = (artist_tracks, tracks_by_key)
+        if artist_tracks_cache is not None:
+            artist_tracks_cache[norm_artist_name] = cached
+    artist_tracks, tracks_by_key = cached
+    if not artist_tracks:
+        return None, 0
+
+    # 先按精确键做一次哈希查找，命中即返回，不必逐首模糊打分
+    song_key = key_from_normalized(norm_song_name)
+    if song_key and song_key in tracks_by_key:
+        return tracks_by_key[song_key], 100
+
+    best_match = None
+    highest_score = 0
+    for track in artist_tracks:
+        score = fuzz.partial_ratio(norm_song_name, normalize_string(track.title))
+        if score > highest_score:
+            highest_score = score
+            best_match = track
+            if score >= EARLY_STOP_SCORE:
+                break
+
+    if highest_score > ARTIST_FUZZY_THRESHOLD:
+        logger.info(f"模糊匹配成功 (艺术家内): '{song_name}' -> '{best_match.title}' (相似度: {highest_score})")
+        return best_match, highest_score
+    return None, highest_score
+
+def _match_global_fuzzy(plex, song_name, artist_name, norm_song_name, norm_artist_name, artist_tracks_cache,
+                        section_ids):
+    """策略：在全局搜索歌名，再按 0.7*歌名 + 0.3*艺术家 打分 (较慢)。"""
+    fuzz = _fuzz()
+    with profiling.span("plex.search.global"):
+        results = plex_cache.search(plex, song_name, libtype='track', section_ids=section_ids)
+    best_match = None
+    highest_score = 0
+    for track in results:
+        title_score = fuzz.partial_ratio(norm_song_name, normalize_string(track.title))
+        # 艺术家分最高为 100，上界不超过当前最高分时不必再请求该音轨的艺术家
+        if title_score * 0.7 + 30 <= highest_score:
+            continue
+        if not norm_artist_name:
+            artist_score = 100
+        else:
+            with profiling.span("plex.track.artist"):
+                track_artist = track.artist()
+            plex_norm_artist = normalize_string(track_artist.title if track_artist else "")
+            artist_score = fuzz.ratio(norm_artist_name, plex_norm_artist)
+
+        combined_score = (title_score * 0.7) + (artist_score * 0.3)
+        if combined_score > highest_score:
+            highest_score = combined_score
+            best_match = track
+            if combined_score >= EARLY_STOP_SCORE:
+                break
+
+    if highest_score > GLOBAL_FUZZY_THRESHOLD:
+        logger.info(f"模糊匹配成功 (全局): '{song_name}' -> '{best_match.title}' (综合分: {highest_score:.0f})")
+        return best_match, highest_score
+    return None, highest_score
+
+_STRATEGY_FUNCS = {
+    MATCH_EXACT: _match_exact,
+    MATCH_ARTIST_FUZZY: _match_artist_fuzzy,
+    MATCH_GLOBAL_FUZZY: _match_global_fuzzy,
+}
+
+# 按 (服务器, 来源) 统计各策略的命中率与耗时，决定执行顺序；先验耗时（秒）大致对应各策略的请求数
+strategy_planner = StrategyPlanner({
+    MATCH_EXACT: 0.05,
+    MATCH_ARTIST_FUZZY: 0.15,
+    MATCH_GLOBAL_FUZZY: 0.5,
+})
+
+def match_plex_track(plex, song_name, artist_name, artist_tracks_cache=None, source=None, section_ids=None):
     """
     在Plex中查找音轨，采用多策略匹配：
-    1. 精确匹配：尝试直接用歌曲名和艺术家名搜索。
-    2. 艺术家内模糊匹配：先找到艺术家，再在其所有歌曲中模糊匹配歌名。
-    3. 全局模糊匹配：如果找不到艺术家，则在全局搜索歌名，再对结果进行模糊匹配。
+    - 精确匹配：尝试直接用歌曲名和艺术家名搜索。
+    - 艺术家内模糊匹配：先找到艺术家，再在其所有歌曲中模糊匹配歌名。
+    - 全局模糊匹配：在全局搜索歌名，再对结果进行模糊匹配。
+
+    执行顺序由 strategy_planner 按该服务器、该来源 (source) 上各策略的历史命中率与耗时决定，
+    命中率极低的策略会被跳过；任一策略命中即返回。
+
+    artist_tracks_cache: 可选的 dict，批量匹配时在多首歌之间共享艺术家的歌曲列表，
+    同一艺术家只查询一次 Plex。
+    section_ids: 可选的音乐库分区 key 集合，只在这些分区中匹配（见 select_music_sections）。
+
+    返回 (track, score, strategy)；未匹配时 track 和 strategy 为 None。
     """
-    if fuzz is None:
+    if _fuzz() is None:
         logger.warning("'thefuzz' 库未安装，无法进行模糊匹配。请执行 'pip install thefuzz python-Levenshtein'")
-        return None
+        return None, 0, None
 
     # 标准化输入
     norm_song_name = normalize_string(song_name)
     norm_artist_name = normalize_string(artist_name)
+    server = plex_cache.server_key(plex)
+    best_score = 0
 
     try:
-        # --- 策略1：精确搜索 (最快) ---
-        if artist_name:
-            results = plex.library.search(song_name, libtype='track', artist=artist_name)
-            if results:
-                return results[0]
-
-        # --- 策略2：在艺术家内进行模糊匹配 (推荐) ---
-        if norm_artist_name:
-            artists = plex.library.search(norm_artist_name, libtype='artist')
-            if artists:
-                best_match = None
-                highest_score = 0
-                for artist in artists:
-                    for track in artist.tracks():
-                        plex_norm_title = normalize_string(track.title)
-                        score = fuzz.partial_ratio(norm_song_name, plex_norm_title)
-                      
-                        if score > highest_score:
-                            highest_score = score
-                            best_match = track
-
-                if highest_score > 85:
-                    logger.info(f"模糊匹配成功 (艺术家内): '{song_name}' -> '{best_match.title}' (相似度: {highest_score})")
-                    return best_match
-
-        # --- 策略3：全局模糊搜索 (备用，较慢) ---
-        results = plex.library.search(song_name, libtype='track')
-        if results:
-            best_match = None
-            highest_score = 0
-            for track in results:
-                plex_norm_title = normalize_string(track.title)
-                plex_norm_artist = normalize_string(track.artist().title if track.artist() else "")
-              
-                title_score = fuzz.partial_ratio(norm_song_name, plex_norm_title)
-                artist_score = 100 if not norm_artist_name else fuzz.ratio(norm_artist_name, plex_norm_artist)
-              
-                combined_score = (title_score * 0.7) + (artist_score * 0.3)
-
-                if combined_score > highest_score:
-                    highest_score = combined_score
-                    best_match = track
-          
-            if highest_score > 90:
-                logger.info(f"模糊匹配成功 (全局): '{song_name}' -> '{best_match.title}' (综合分: {highest_score:.0f})")
-                return best_match
+        for strategy in strategy_planner.plan(server, source):
+            # 没有艺术家信息时，依赖艺术家的策略不适用，也不计入统计
+            if strategy == MATCH_EXACT and not artist_name:
+                continue
+            if strategy == MATCH_ARTIST_FUZZY and not norm_artist_name:
+                continue
+            started = time.perf_counter()
+            track, score = _STRATEGY_FUNCS[strategy](
+                plex, song_name, artist_name, norm_song_name, norm_artist_name, artist_tracks_cache, section_ids
+            )
+            strategy_planner.record(server, source, strategy, track is not None, time.perf_counter() - started)
+            if track is not None:
+                return track, score, strategy
+            best_score = max(best_score, score)
 
     except Exception as e:
         logger.error(f"在Plex中搜索音轨时出错 '{song_name} - {artist_name}'", exc_info=True)
   
-    return None
+    return None, best_score, None
+
+def match_songs(plex, songs, max_workers=BULK_MATCH_WORKERS, engine=None, source=None, section_ids=None):
+    """
+    批量匹配歌曲（预览用），不修改任何播放列表。
+
+    多线程并发查询 Plex，并在整批歌曲间共享艺术家的歌曲列表。
+    传入 engine（match_engine.ParallelMatcher）时改为在本地音乐库快照上多进程匹配，不再查询 Plex。
+    source 为来源平台名，用于按来源统计各匹配策略的命中率。
+    section_ids 为可选的音乐库分区 key 集合，只在这些分区中匹配（engine 按构建时选择的分区匹配）。
+    返回与 songs 等长、顺序一致的结果字典列表。
+    """
+    if engine is not None:
+        return engine.match(songs)
+
+    artist_tracks_cache = {}
+
+    def match_one(song):
+        song_name, artist_name = song
+        track, score, strategy = match_plex_track(plex, song_name, artist_name, artist_tracks_cache, source=source,
+                                                  section_ids=section_ids)
+        return {
+            "title": song_name,
+            "artist": artist_name,
+            "rating_key": track.ratingKey if track is not None else None,
+            "score": round(score, 1),
+            "strategy": strategy,
+            "matched_title": track.title if track is not None else None,
+            "matched_artist": getattr(track, "grandparentTitle", None) if track is not None else None,
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(match_one, songs))
+
+def connect_plex(plex_url, plex_token, timeout=20):
+    """连接并验证 Plex 服务器，失败时抛出带说明的 ValueError。"""
+    import requests
+    PlexServer, _, Unauthorized = _plexapi()
+    if PlexServer is None:
+        raise ValueError("PlexAPI库未安装。请先执行 'pip install plexapi'。")
+    try:
+        plex = PlexServer(plex_url, plex_token, timeout=timeout)
+        plex.clients()
+    except Unauthorized:
+        raise ValueError("Plex授权失败：Token无效或服务器URL不正确。")
+    except requests.exceptions.ConnectionError:
+        raise ValueError(f"无法连接到Plex服务器：{plex_url}")
+    except Exception as e:
+        raise ValueError(f"连接Plex时发生错误: {e}")
+    return plex
+
+def record_unmatched(plex, plex_playlist, unmatched_songs, source_platform_name=None, section_ids=None):
+    """
+    把导入完成后仍未匹配的歌曲与目标播放列表一起写入 unmatched_store，供音乐库更新后增量重新匹配
+    （见 rematch.py）。写入失败只记录日志，不影响导入结果。
+    """
+    try:
+        unmatched_store.default_store().replace_playlist(
+            plex_cache.server_key(plex), plex_playlist.ratingKey, plex_playlist.title, unmatched_songs,
+            source=source_platform_name, section_keys=section_ids,
+        )
+    except Exception:
+        logger.warning(f"记录播放列表 '{plex_playlist.title}' 的未匹配歌曲失败", exc_info=True)
 
 def _import_to_plex_worker(plex_url, plex_token, plex_playlist_name_input, songs_to_import,
                            import_mode, source_platform_name, original_playlist_title_hint,
-                           task_id, task_status_dict):
-    """Worker function to run in a separate thread and report progress."""
+                           task_id, task_status_dict, cancel_event=None, resume_from=None,
+                           prematched_keys=None, sections=None):
+    """
+    Worker function to run in a separate thread and report progress.
+
+    cancel_event: threading.Event，置位后在两首歌之间停止并写入断点。
+    resume_from: load_checkpoint() 返回的断点，从其游标处继续匹配，已匹配的 ratingKey 不再重新查询。
+    prematched_keys: 与 songs_to_import 等长的 ratingKey 列表（未匹配为 None），
+        通常来自 match_songs 的预览结果；提供时直接提交，不再查询 Plex 匹配。
+    sections: 音乐库分区 key 或名称的列表，只在这些分区中匹配，新建播放列表的参照音轨也取自其中；
+        为空时使用全部音乐分区。
+    """
     
     total_count = len(songs_to_import)
+    unmatched_songs_list = []
+    matched_keys = []  # 断点中恢复的 ratingKey
+    start_index = 0
+    target_plex_playlist_name = plex_playlist_name_input
 
-    def update_status(status, message, processed=None, total=None, unmatched=None):
+    if resume_from:
+        # 续传时写入首次运行时确定的播放列表，而不是再创建一个新的
+        import_mode = "update_existing"
+        target_plex_playlist_name = plex_playlist_name_input = resume_from["playlist_name"]
+        start_index = resume_from["cursor"]
+        matched_keys = list(resume_from["matched_keys"])
+        unmatched_songs_list = [tuple(song) for song in resume_from["unmatched"]]
+        sections = resume_from.get("sections")
+        # 按预览提交的任务续传时仍直接使用预览结果，不再查询 Plex
+        if prematched_keys is None:
+            prematched_keys = resume_from.get("prematched_keys")
+
+    # 任务状态字典只创建一次，之后原地更新；unmatched_songs 直接引用只追加的 unmatched_songs_list，
+    # 每次更新不再复制列表。version 与 field_versions 供 task_status_delta 计算增量。
+    task_state = {
+        "status": None, "message": None, "progress": None, "total": None,
+        "playlist_name": None, "resumable": False,
+        "unmatched_songs": unmatched_songs_list,
+        "version": 0,
+        "field_versions": dict.fromkeys(STATUS_FIELDS, 0),
+    }
+    task_status_dict[task_id] = task_state
+
+    def update_status(status, message, processed=None, total=None, resumable=False):
         """Helper to update the shared task status dictionary."""
-        task_status_dict[task_id] = {
-            "status": status,
-            "message": message,
-            "progress": processed if processed is not None else task_status_dict[task_id].get("progress"),
-            "total": total if total is not None else task_status_dict[task_id].get("total"),
-            "unmatched_songs": unmatched if unmatched is not None else task_status_dict[task_id].get("unmatched_songs", [])
-        }
+        fields = {"status": status, "message": message, "playlist_name": target_plex_playlist_name,
+                  "resumable": resumable}
+        if processed is not None:
+            fields["progress"] = processed
+        if total is not None:
+            fields["total"] = total
+        version = task_state["version"] + 1
+        for field, value in fields.items():
+            if task_state[field] != value:
+                task_state[field] = value
+                task_state["field_versions"][field] = version
+        task_state["version"] = version
         logger.info(f"Task {task_id}: {status} - {message}")
 
-    update_status("processing", "任务开始...", processed=0, total=total_count)
+    update_status("processing", "任务开始..." if not resume_from else f"从第 {start_index + 1} 首继续...",
+                  processed=start_index, total=total_count)
 
-    unmatched_songs_list = []
-    target_plex_playlist_name = plex_playlist_name_input
+    plex_tracks_to_add = []
+    matching_started = False
 
+    def write_checkpoint(cursor):
+        """保存匹配进度，写入失败只记录日志，不影响任务本身。"""
+        try:
+            save_checkpoint(task_id, {
+                "task_id": task_id,
+                "playlist_name": target_plex_playlist_name,
+                "source_platform_name": source_platform_name,
+                "original_playlist_title_hint": original_playlist_title_hint,
+                "songs": [list(song) for song in songs_to_import],
+                "cursor": cursor,
+                "matched_keys": matched_keys + [track.ratingKey for track in plex_tracks_to_add],
+                "unmatched": [list(song) for song in unmatched_songs_list],
+                "sections": sections,
+                "prematched_keys": prematched_keys,
+                "updated_at": time.time(),
+            })
+            return True
+        except OSError as e:
+            logger.error(f"写入断点失败 (Task {task_id}): {e}")
+            return False
+
+    PlexServer, NotFound, _ = _plexapi()
     if PlexServer is None:
         update_status("error", "PlexAPI库未安装。请先执行 'pip install plexapi'。")
         return
 
     try:
         update_status("processing", "正在连接到Plex服务器...")
-        plex = PlexServer(plex_url, plex_token, timeout=20)
         try:
-            plex.clients()
-        except Unauthorized:
-            update_status("error", "Plex授权失败：Token无效或服务器URL不正确。")
+            plex = connect_plex(plex_url, plex_token)
+        except ValueError as e:
+            update_status("error", str(e))
             return
-        except requests.exceptions.ConnectionError:
-            update_status("error", f"无法连接到Plex服务器：{plex_url}")
-            return
-        except Exception as e:
-            update_status("error", f"连接Plex时发生错误: {e}")
+        try:
+            music_sections = select_music_sections(plex, sections)
+        except ValueError as e:
+            update_status("error", str(e))
             return
+        # 未指定分区时不过滤搜索结果
+        section_ids = {s.key for s in music_sections} if sections else None
 
         plex_playlist = None
         
@@ -284,7 +751,6 @@ def _import_to_plex_worker(plex_url, plex_token, plex_playlist_name_input, songs
             target_plex_playlist_name = f"来自{source_platform_name} - {base_name} ({timestamp})"
             update_status("processing", f"准备创建新的Plex播放列表：'{target_plex_playlist_name}'")
             try:
-                music_sections = [s for s in plex.library.sections() if s.type == 'artist']
                 if not music_sections:
                     update_status("error", "Plex库中找不到音乐内容，无法创建播放列表。")
                     return
@@ -308,7 +774,6 @@ def _import_to_plex_worker(plex_url, plex_token, plex_playlist_name_input, songs
             except NotFound:
                 update_status("processing", f"播放列表 '{target_plex_playlist_name}' 不存在，将创建它。")
                 try:
-                    music_sections = [s for s in plex.library.sections() if s.type == 'artist']
                     if not music_sections:
                         update_status("error", "Plex库中找不到音乐内容，无法创建播放列表。")
                         return
@@ -328,37 +793,76 @@ def _import_to_plex_worker(plex_url, plex_token, plex_playlist_name_input, songs
             update_status("error", "无效的Plex导入模式。")
             return
 
-        if not plex_playlist:
+        if plex_playlist is None:
             update_status("error", f"未能为 '{target_plex_playlist_name}' 获取或创建Plex播放列表对象。")
             return
-
-        found_count = 0
-        plex_tracks_to_add = []
-
-        for i, (song_name, artist_name) in enumerate(songs_to_import):
+        # 播放列表已被创建或清空，之前缓存的搜索结果作废
+        plex_cache.invalidate(plex)
+        # 立即写入断点，记下实际写入的播放列表：任务在第一个定期断点之前中断时，
+        # 重新认领的执行者也会续传到这个播放列表，而不是再新建一个
+        write_checkpoint(start_index)
+
+        found_count = len(matched_keys)
+        matching_started = True
+        cursor = start_index
+
+        for i in range(start_index, total_count):
+            song_name, artist_name = songs_to_import[i]
+            if cancel_event is not None and cancel_event.is_set():
+                resumable = write_checkpoint(i)
+                update_status("cancelled", f"任务已取消，已处理 {i}/{total_count} 首。", processed=i,
+                              resumable=resumable)
+                return
+            if i > start_index and (i - start_index) % CHECKPOINT_INTERVAL == 0:
+                write_checkpoint(i)
+            cursor = i
+            if prematched_keys is not None:
+                update_status("processing", f"正在提交: {song_name}", processed=i + 1)
+                if prematched_keys[i] is not None:
+                    matched_keys.append(prematched_keys[i])
+                    found_count += 1
+                else:
+                    unmatched_songs_list.append((song_name, artist_name))
+                continue
             update_status("processing", f"正在处理: {song_name}", processed=i + 1)
-            plex_track = find_plex_track(plex, song_name, artist_name)
+            with profiling.span("song", title=song_name, artist=artist_name):
+                plex_track = find_plex_track(plex, song_name, artist_name, source=source_platform_name,
+                                             section_ids=section_ids)
             if plex_track:
                 plex_tracks_to_add.append(plex_track)
                 found_count += 1
             else:
                 unmatched_songs_list.append((song_name, artist_name))
                 logger.info(f"Plex中未找到: {song_name} - {artist_name}")
-        
-        if plex_tracks_to_add:
-            update_status("processing", f"正在将 {len(plex_tracks_to_add)} 首歌曲添加到Plex播放列表...", processed=len(songs_to_import))
+        cursor = total_count
+
+        if matched_keys or plex_tracks_to_add:
+            update_status("processing", f"正在将 {found_count} 首歌曲添加到Plex播放列表...", processed=total_count)
             try:
-                plex_playlist.addItems(plex_tracks_to_add)
+                items = []
+                # 断点或预览中的 ratingKey 分批取回音轨对象，排在本次匹配的音轨之前以保持歌单顺序
+                for j in range(0, len(matched_keys), RATING_KEY_FETCH_BATCH):
+                    with profiling.span("plex.fetchItems"):
+                        items.extend(plex.fetchItems(matched_keys[j:j + RATING_KEY_FETCH_BATCH]))
+                items.extend(plex_tracks_to_add)
+                with profiling.span("plex.playlist.addItems", count=len(items)):
+                    plex_playlist.addItems(items)
+                plex_cache.invalidate(plex)
             except Exception as e:
-                update_status("error", f"添加到Plex播放列表 '{target_plex_playlist_name}' 时出错: {e}", unmatched=unmatched_songs_list)
+                resumable = write_checkpoint(total_count)
+                update_status("error", f"添加到Plex播放列表 '{target_plex_playlist_name}' 时出错: {e}",
+                              resumable=resumable)
                 return
         
+        record_unmatched(plex, plex_playlist, unmatched_songs_list, source_platform_name, section_ids)
         final_message = (
             f"Plex导入到 '{target_plex_playlist_name}' 完成！ "
             f"成功匹配: {found_count}首, 未找到: {len(unmatched_songs_list)}首"
         )
-        update_status("completed", final_message, processed=total_count, unmatched=unmatched_songs_list)
+        delete_checkpoint(task_id)
+        update_status("completed", final_message, processed=total_count)
 
     except Exception as e:
         logger.error(f"Plex导入过程中发生未知错误 (Task {task_id})", exc_info=True)
-        update_status("error", f"Plex导入过程中发生未知错误: {e}", unmatched=unmatched_songs_list)
\ No newline at end of file
+        resumable = matching_started and write_checkpoint(cursor)
+        update_status("error", f"Plex导入过程中发生未知错误: {e}", resumable=resumable)
\ No newline at end of file
@@ -1,27 +1,52 @@
-from fastapi import FastAPI, APIRouter
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from api import config, playlist, plex, importer
+import contextlib
+
+from fastapi import FastAPI, APIRouter, Request
+from api import config, playlist, plex, importer, unmatched
+from app_state import job_runner
+from compression import CompressionMiddleware
+import http_cache
+import logging_config
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # 日志在服务启动时才配置（创建 logs/、启动后台写日志线程），只导入 main 没有副作用
+    logging_config.setup_logging()
+    # 每个 worker 进程各自从共享队列认领导入任务；关闭时运行中的任务写入断点后停止
+    job_runner.start()
+    try:
+        yield
+    finally:
+        job_runner.stop()
+        # 任务停止后再停止日志线程，写出剩余的记录
+        logging_config.shutdown_logging()
 
 
 app = FastAPI(
     title="Plexlist API",
     description="API for managing and importing playlists to Plex.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# 超过阈值的文本/JSON 响应按 Accept-Encoding 压缩 (brotli / gzip)
+app.add_middleware(CompressionMiddleware)
+
 # API Routers
 api_router = APIRouter()
 api_router.include_router(config.router)
 api_router.include_router(playlist.router)
 api_router.include_router(plex.router)
 api_router.include_router(importer.router)
+api_router.include_router(unmatched.router)
 
 app.include_router(api_router, prefix="/api/v1")
 
 # Static files for frontend
-app.mount("/static", StaticFiles(directory="web/static"), name="static")
+# 带 ?v=<内容哈希> 的静态资源长期缓存，其余用 ETag 重新验证
+app.mount("/static", http_cache.CachedStaticFiles(directory="web/static"), name="static")
 
 @app.get("/")
-async def read_index():
-    return FileResponse('web/index.html')
\ No newline at end of file
+async def read_index(request: Request):
+    content = http_cache.versioned_index('web/index.html', 'web/static')
+    return http_cache.conditional_response(request, content, "text/html; charset=utf-8")
\ No newline at end of file
@@ -0,0 +1,451 @@
+# match_engine.py
+"""
+多进程模糊匹配引擎。
+
+网络请求之外，`fuzz.partial_ratio` 打分是纯 CPU 计算，受 GIL 限制只能用满一个核。
+本模块把 Plex 音乐库导出为一份标准化后的快照文件，再编译为二进制索引
+（library_index.LibraryIndex.save），进程池中的每个进程在初始化时以只读 mmap 打开同一份索引
+（MappedLibraryIndex），共享操作系统页缓存中的页面，索引只占一份内存；
+之后只需把歌单切块分发给各进程，库数据不会随任务重复 pickle。
+
+快照的导出与编译在后台线程中进行，同一路径同时只有一次导出，并发的请求等待同一次导出的结果。
+
+匹配规则与 logic.match_plex_track 一致：
+1. 精确：标准化歌名与艺术家都相同（先按去空白的精确键做哈希查找）。
+2. 艺术家内模糊：在该艺术家的歌曲中取 partial_ratio 最高者，> 85 视为匹配。
+3. 全局模糊：在歌名包含源歌名的候选中按 0.7*歌名 + 0.3*艺术家 打分，> 90 视为匹配。
+模糊打分达到 logic.EARLY_STOP_SCORE 时不再比较其余候选。
+
+导出快照时，各音乐库分区按 containerStart/containerSize 固定大小分页，所有分区的分页
+在线程池中并发请求，按提交顺序写入快照，行序与各页到达的先后无关。stream_match 在导出的同时对每一页做精确键匹配，
+精确命中的歌曲不必等整个库下载完；其余歌曲在导出完成后交给进程池做模糊匹配。
+可以只选择部分音乐库分区，每种分区选择对应一份快照。
+"""
+import contextlib
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import logic
+from library_index import LibraryIndex, MappedLibraryIndex, SNAPSHOT_MAGIC, is_compiled_index
+from normalization import exact_key, key_from_normalized
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "cache"
+# 快照超过该时长（秒）视为过期，下次使用时重新导出
+SNAPSHOT_MAX_AGE = 3600
+# 每个任务块包含的歌曲数
+MATCH_CHUNK_SIZE = 256
+# 导出音乐库时每页的音轨数，以及并发请求分页的线程数（所有分区共用）
+LIBRARY_PAGE_SIZE = 1000
+LIBRARY_LOAD_WORKERS = 4
+# 同时导出快照的线程数（不同服务器 / 分区选择的快照之间）
+SNAPSHOT_BUILD_WORKERS = 2
+# 每个服务进程的匹配进程数。`uvicorn --workers N` 下每个 worker 各有一个进程池，
+# 默认不超过 MAX_MATCH_PROCESSES，可用环境变量 PLEXLIST_MATCH_PROCESSES 修改
+MAX_MATCH_PROCESSES = 4
+MATCH_PROCESSES = int(os.environ.get("PLEXLIST_MATCH_PROCESSES") or min(os.cpu_count() or 1, MAX_MATCH_PROCESSES))
+# 服务进程是多线程的，fork 会把其他线程持有的锁一起复制到子进程；改用 forkserver（不支持时 spawn）
+MATCH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# 源艺术家字段常为 "A, B" / "A/B" / "A & B"，拆开后分别查找
+_ARTIST_SPLIT_PATTERN = re.compile(r"\s*(?:,|/|&|、|;)\s*")
+
+
+def split_artists(artist_name):
+    """把源艺术家字段拆为多个标准化后的艺术家名（保持顺序、去重）。"""
+    names = []
+    for part in [artist_name] + _ARTIST_SPLIT_PATTERN.split(artist_name or ""):
+        norm = logic.normalize_string(part)
+        if norm and norm not in names:
+            names.append(norm)
+    return names
+
+
+# ------------- 快照文件 -------------
+
+def snapshot_path(plex, section_keys=None):
+    """快照文件路径；只选择部分分区时，文件名中包含排序后的分区 key。"""
+    suffix = f"_s{'-'.join(str(k) for k in sorted(section_keys))}" if section_keys else ""
+    return os.path.join(SNAPSHOT_DIR, f"library_{plex.machineIdentifier}{suffix}.idx")
+
+
+def compiled_index_path(path):
+    """快照对应的编译索引文件路径。"""
+    return os.path.splitext(path)[0] + ".bin"
+
+
+def _clean_field(value):
+    return (value or "").replace("\t", " ").replace("\n", " ")
+
+
+def write_library_snapshot(tracks, path, on_row=None):
+    """
+    把音轨写入快照文件。tracks 为 (ratingKey, title, artist) 的可迭代对象。
+    on_row: 可选的回调，每写入一行以 (ratingKey, 标准化歌名, 标准化艺术家, 歌名, 艺术家) 调用一次。
+
+    文件为 UTF-8 文本：首行魔数，之后每行 `ratingKey\\t标准化歌名\\t标准化艺术家\\t歌名\\t艺术家`。
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # 多个进程可能同时导出同一份快照，各自写临时文件，最后原子替换
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(SNAPSHOT_MAGIC + "\n")
+            for rating_key, title, artist in tracks:
+                norm_title = _clean_field(logic.normalize_string(title))
+                norm_artist = _clean_field(logic.normalize_string(artist))
+                title, artist = _clean_field(title), _clean_field(artist)
+                f.write(f"{int(rating_key)}\t{norm_title}\t{norm_artist}\t{title}\t{artist}\n")
+                count += 1
+                if on_row is not None:
+                    on_row(int(rating_key), norm_title, norm_artist, title, artist)
+        os.replace(tmp_path, path)
+    finally:
+        # 分页请求失败等异常时不留下临时文件
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def _fetch_library_page(section, start, size):
+    """请求分区中 [start, start + size) 的音轨。"""
+    tracks = section.search(libtype='track', container_start=start, container_size=size, maxresults=size)
+    return [(track.ratingKey, track.title, track.grandparentTitle) for track in tracks]
+
+
+def iter_library_pages(plex, sections=None, page_size=LIBRARY_PAGE_SIZE, workers=LIBRARY_LOAD_WORKERS):
+    """
+    并发分页读取所选音乐库分区（默认全部）的音轨，按提交顺序逐页产出 [(ratingKey, title, artist)]。
+
+    先并发取得各分区的音轨总数，再把所有分区的分页一起提交到线程池；各分区的第一页排在最前，
+    大分区不会挡住小分区。后面的分页在等待前面的分页时已在后台请求；按提交顺序产出使快照的行序
+    固定，重复的精确键总是对应同一行（LibraryIndex 取第一行）。
+    """
+    music_sections = logic.select_music_sections(plex, sections)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        totals = list(pool.map(lambda s: s.totalViewSize(libtype='track', includeCollections=False) or 0,
+                               music_sections))
+        pages = sorted(((start, section) for section, total in zip(music_sections, totals)
+                        for start in range(0, total, page_size)), key=lambda page: page[0])
+        futures = [pool.submit(_fetch_library_page, section, start, page_size) for start, section in pages]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            # 调用方提前停止或出错时，不再请求剩余的分页
+            for future in futures:
+                future.cancel()
+
+
+def iter_library_tracks(plex, sections=None):
+    """遍历所选音乐库分区（默认全部）的音轨，产出 (ratingKey, title, artist)。"""
+    for page in iter_library_pages(plex, sections):
+        yield from page
+
+
+def _selected_section_keys(plex, sections):
+    """把分区选择规范为排序后的分区 key 元组；未选择时为 None（全部分区）。"""
+    if not sections:
+        return None
+    return tuple(sorted(s.key for s in logic.select_music_sections(plex, sections)))
+
+
+def _snapshot_is_fresh(path, max_age):
+    index_path = compiled_index_path(path)
+    return (os.path.exists(index_path) and time.time() - os.path.getmtime(index_path) < max_age
+            and is_compiled_index(index_path))
+
+
+_snapshot_executor = ThreadPoolExecutor(max_workers=SNAPSHOT_BUILD_WORKERS, thread_name_prefix="library-snapshot")
+_snapshot_builds = {}  # 快照路径 -> 正在进行的导出 Future
+_snapshot_lock = threading.Lock()
+
+
+def _build_snapshot(plex, section_keys, path, on_row):
+    started = time.perf_counter()
+    count = write_library_snapshot(iter_library_tracks(plex, section_keys), path, on_row)
+    # 编译期间主进程临时持有一份索引，写完即释放；匹配进程只 mmap 编译后的文件
+    LibraryIndex.load(path).save(compiled_index_path(path))
+    logger.info(f"已导出音乐库快照 {path}: {count} 首音轨，用时 {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def ensure_library_snapshot(plex, max_age=SNAPSHOT_MAX_AGE, sections=None, on_row=None):
+    """
+    返回该 Plex 服务器（所选分区）的快照路径，不存在或过期时重新导出并编译索引。
+
+    导出在后台线程中进行，调用方等待其完成；同一路径正在导出时直接等待那一次导出，
+    不会重复下载整个音乐库。on_row 只在由本次调用发起导出时对每一行调用（在导出线程中），
+    见 write_library_snapshot。
+    """
+    section_keys = _selected_section_keys(plex, sections)
+    path = snapshot_path(plex, section_keys)
+    with _snapshot_lock:
+        future = _snapshot_builds.get(path)
+        if future is None:
+            if _snapshot_is_fresh(path, max_age):
+                return path
+            future = _snapshot_builds[path] = _snapshot_executor.submit(
+                _build_snapshot, plex, section_keys, path, on_row)
+
+            def forget(done, path=path):
+                with _snapshot_lock:
+                    if _snapshot_builds.get(path) is done:
+                        del _snapshot_builds[path]
+
+            future.add_done_callback(forget)
+    return future.result()
+
+
+# ------------- 工作进程 -------------
+
+def match_in_index(index, norm_song_name, artist_names, fuzz):
+    """在 LibraryIndex 上匹配一首歌，返回 (行号, 分数, 策略)；未匹配时行号与策略为 None。"""
+    norm_artist_name = artist_names[0] if artist_names else ""
+
+    # --- 策略1：精确键查找，O(1) ---
+    title_key = key_from_normalized(norm_song_name)
+    if title_key:
+        for artist in artist_names:
+            row = index.exact_row(title_key, key_from_normalized(artist))
+            if row is not None:
+                return row, 100, logic.MATCH_EXACT
+
+    if fuzz is None:
+        return None, 0, None
+
+    # --- 策略2：艺术家内模糊匹配 ---
+    best_row, best_score = None, 0
+    for artist in artist_names:
+        for row in index.rows_for_artist(artist):
+            score = fuzz.partial_ratio(norm_song_name, index.norm_title(row))
+            if score > best_score:
+                best_row, best_score = row, score
+                if score >= logic.EARLY_STOP_SCORE:
+                    break
+        if best_score >= logic.EARLY_STOP_SCORE:
+            break
+    if best_score > logic.ARTIST_FUZZY_THRESHOLD:
+        return best_row, best_score, logic.MATCH_ARTIST_FUZZY
+
+    # --- 策略3：全局模糊匹配 ---
+    global_row, global_score = None, 0
+    for row in index.title_candidates(norm_song_name):
+        title_score = fuzz.partial_ratio(norm_song_name, index.norm_title(row))
+        artist_score = 100 if not norm_artist_name else fuzz.ratio(norm_artist_name, index.norm_artist(row))
+        combined = title_score * 0.7 + artist_score * 0.3
+        if combined > global_score:
+            global_row, global_score = row, combined
+            if combined >= logic.EARLY_STOP_SCORE:
+                break
+    if global_score > logic.GLOBAL_FUZZY_THRESHOLD:
+        return global_row, global_score, logic.MATCH_GLOBAL_FUZZY
+    return None, max(best_score, global_score), None
+
+
+_worker_index = None
+_worker_fuzz = None
+
+
+def _init_worker(path):
+    global _worker_index, _worker_fuzz
+    # 只读 mmap，各进程共享同一份页缓存
+    _worker_index = MappedLibraryIndex(path)
+    _worker_fuzz = logic.fuzz
+
+
+def _match_chunk(chunk):
+    """chunk: [(位置, 标准化歌名, [标准化艺术家...])] -> [(位置, 结果字典)]"""
+    results = []
+    for pos, norm_song_name, artist_names in chunk:
+        row, score, strategy = match_in_index(_worker_index, norm_song_name, artist_names, _worker_fuzz)
+        if row is None:
+            results.append((pos, {"rating_key": None, "score": round(score, 1), "strategy": None,
+                                  "matched_title": None, "matched_artist": None}))
+        else:
+            results.append((pos, {"rating_key": _worker_index.rating_keys[row], "score": round(score, 1),
+                                  "strategy": strategy, "matched_title": _worker_index.title(row),
+                                  "matched_artist": _worker_index.artist(row)}))
+    return results
+
+
+# ------------- 主进程接口 -------------
+
+class ParallelMatcher:
+    """
+    基于快照的多进程匹配器。
+
+        matcher = ParallelMatcher(ensure_library_snapshot(plex))
+        results = matcher.match(songs)
+
+    由 get_matcher 共享时按使用者计数：快照更新后旧的匹配器先退役，最后一个使用者
+    结束后才关闭进程池，正在匹配的请求不受影响。
+    """
+
+    def __init__(self, snapshot_path, processes=None):
+        self.snapshot_path = snapshot_path
+        self.index_path = compiled_index_path(snapshot_path)
+        self.snapshot_mtime = os.path.getmtime(self.index_path)
+        self.processes = processes or MATCH_PROCESSES
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context(MATCH_START_METHOD),
+            initializer=_init_worker, initargs=(self.index_path,),
+        )
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+
+    def match(self, songs, chunk_size=MATCH_CHUNK_SIZE, on_result=None):
+        """
+        匹配 (歌名, 艺术家) 列表，返回与 songs 等长、顺序一致的结果字典列表，
+        字段与 logic.match_songs 的结果相同。on_result(位置, 结果) 在每个切块完成时对其中每首歌调用。
+        """
+        if logic.fuzz is None:
+            logger.warning("'thefuzz' 库未安装，无法进行模糊匹配。请执行 'pip install thefuzz python-Levenshtein'")
+        prepared = [
+            (pos, logic.normalize_string(song_name), split_artists(artist_name))
+            for pos, (song_name, artist_name) in enumerate(songs)
+        ]
+        # 切块数至少为进程数的数倍，使各进程负载均衡
+        chunk_size = max(1, min(chunk_size, len(prepared) // (self.processes * 4) or 1))
+        chunks = [prepared[i:i + chunk_size] for i in range(0, len(prepared), chunk_size)]
+
+        results = [None] * len(songs)
+        for chunk_results in self._pool.map(_match_chunk, chunks):
+            for pos, result in chunk_results:
+                song_name, artist_name = songs[pos]
+                results[pos] = {"title": song_name, "artist": artist_name, **result}
+                if on_result is not None:
+                    on_result(pos, results[pos])
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def _acquire(self):
+        with self._users_lock:
+            self._users += 1
+
+    def _release(self):
+        with self._users_lock:
+            self._users -= 1
+            idle = self._retired and self._users == 0
+        if idle:
+            self.close()
+
+    def _retire(self):
+        """不再分配给新的使用者；没有使用者时立即关闭，否则由最后一个使用者关闭。"""
+        with self._users_lock:
+            self._retired = True
+            idle = self._users == 0
+        if idle:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def get_matcher(plex, processes=None, sections=None):
+    """
+    使用该 Plex 服务器（所选分区）共享的 ParallelMatcher:
+
+        with get_matcher(plex) as matcher:
+            results = matcher.match(songs)
+
+    快照更新后新建进程池，旧的在其所有使用者退出 with 块后关闭。
+    """
+    path = ensure_library_snapshot(plex, sections=sections)
+    mtime = os.path.getmtime(compiled_index_path(path))
+    with _matchers_lock:
+        matcher = _matchers.get(path)
+        if matcher is None or matcher.snapshot_mtime != mtime:
+            if matcher is not None:
+                matcher._retire()
+            matcher = ParallelMatcher(path, processes)
+            _matchers[path] = matcher
+        matcher._acquire()
+    try:
+        yield matcher
+    finally:
+        matcher._release()
+
+
+def stream_match(plex, songs, sections=None, processes=None, on_result=None):
+    """
+    边导出音乐库边匹配，返回与 songs 等长、顺序一致的结果字典列表（字段同 ParallelMatcher.match）。
+
+    快照需要重新导出时，每写入一行就做一次精确键查找，精确命中的歌曲立即确定结果，
+    不必等整个库下载完；导出完成后，其余歌曲再交给进程池做模糊匹配。快照仍有效时
+    直接在进程池中匹配全部歌曲。on_result(位置, 结果) 在每首歌的结果确定时调用。
+
+    与 match_in_index 的结果一致：同一精确键取快照中的第一行（pending 中的键命中一次即移除），
+    多位艺术家都命中时取排在前面的艺术家。按后面的艺术家命中的歌曲要等导出结束才能确定。
+    """
+    results = [None] * len(songs)
+    pending = {}  # 精确键 -> [(歌曲位置, 艺术家序号)]
+    for pos, (song_name, artist_name) in enumerate(songs):
+        title_key = key_from_normalized(logic.normalize_string(song_name))
+        if title_key:
+            for rank, artist in enumerate(split_artists(artist_name)):
+                pending.setdefault(exact_key(title_key, key_from_normalized(artist)), []).append((pos, rank))
+    held = {}  # 歌曲位置 -> (艺术家序号, 结果)：按非首位艺术家命中，导出结束后再确定
+    started = time.perf_counter()
+    first_match_at = None
+    streamed = 0
+
+    def settle(pos, result):
+        nonlocal first_match_at, streamed
+        results[pos] = result
+        streamed += 1
+        if first_match_at is None:
+            first_match_at = time.perf_counter() - started
+        if on_result is not None:
+            on_result(pos, result)
+
+    def on_row(rating_key, norm_title, norm_artist, title, artist):
+        entries = pending.pop(exact_key(key_from_normalized(norm_title), key_from_normalized(norm_artist)), None)
+        for pos, rank in entries or ():
+            if results[pos] is not None or (pos in held and held[pos][0] <= rank):
+                continue  # 已按排在前面的艺术家命中
+            song_name, artist_name = songs[pos]
+            result = {"title": song_name, "artist": artist_name, "rating_key": rating_key, "score": 100,
+                      "strategy": logic.MATCH_EXACT, "matched_title": title, "matched_artist": artist}
+            if rank == 0:
+                held.pop(pos, None)
+                settle(pos, result)
+            else:
+                held[pos] = (rank, result)
+
+    ensure_library_snapshot(plex, sections=sections, on_row=on_row)
+    for pos, (_, result) in held.items():
+        if results[pos] is None:
+            settle(pos, result)
+    if streamed:
+        logger.info(f"导出音乐库时精确命中 {streamed}/{len(songs)} 首，首个匹配用时 {first_match_at:.2f}s")
+
+    remaining = [pos for pos, result in enumerate(results) if result is None]
+    if remaining:
+        def on_remaining(i, result):
+            results[remaining[i]] = result
+            if on_result is not None:
+                on_result(remaining[i], result)
+
+        with get_matcher(plex, processes, sections) as matcher:
+            matcher.match([songs[pos] for pos in remaining], on_result=on_remaining)
+    return results
@@ -0,0 +1,100 @@
+# match_planner.py
+"""
+匹配策略的自适应排序。
+
+find_plex_track 有三种策略（精确搜索、艺术家内模糊、全局模糊），按固定顺序执行时，
+即使某种策略在当前音乐库上几乎从不命中，每首歌也要为它付出 Plex 请求。
+这里按 (服务器, 来源平台) 统计每种策略的尝试次数、命中次数和累计耗时，
+按「每次命中的期望耗时」= 平均耗时 / 命中率 从小到大排序（顺序搜索的最优顺序）。
+
+样本足够且命中率极低的策略会被跳过，但每跳过 EXPLORE_INTERVAL 次仍执行一次，
+使统计能随音乐库的变化而恢复。
+"""
+import threading
+
+# 先验：每种策略按 PRIOR_ATTEMPTS 次尝试、PRIOR_HITS 次命中、默认耗时起步，
+# 避免前几首歌的偶然结果决定顺序
+PRIOR_ATTEMPTS = 2
+PRIOR_HITS = 1
+# 尝试次数达到该值后才允许跳过策略
+MIN_ATTEMPTS_TO_SKIP = 50
+# 命中率低于该值的策略会被跳过
+SKIP_HIT_RATE = 0.02
+# 被跳过的策略每隔多少次仍执行一次
+EXPLORE_INTERVAL = 20
+
+
+class StrategyPlanner:
+    """
+    线程安全的策略统计与排序。
+
+        order = planner.plan(server, source)
+        ...
+        planner.record(server, source, strategy, hit, elapsed)
+    """
+
+    def __init__(self, default_costs):
+        """default_costs: {策略名: 先验的单次耗时（秒）}，dict 的顺序即无统计时的默认顺序。"""
+        self.strategies = tuple(default_costs)
+        self._default_costs = dict(default_costs)
+        # (server, source) -> {策略名: [尝试次数, 命中次数, 累计耗时, 连续跳过次数]}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, server, source):
+        entry = self._stats.get((server, source))
+        if entry is None:
+            entry = self._stats[(server, source)] = {s: [0, 0, 0.0, 0] for s in self.strategies}
+        return entry
+
+    def _expected_cost(self, strategy, stats):
+        attempts, hits, total_seconds, _ = stats
+        avg_seconds = (total_seconds + PRIOR_ATTEMPTS * self._default_costs[strategy]) / (attempts + PRIOR_ATTEMPTS)
+        hit_rate = (hits + PRIOR_HITS) / (attempts + PRIOR_ATTEMPTS)
+        return avg_seconds / hit_rate
+
+    def plan(self, server, source):
+        """返回本次应依次执行的策略列表（已排序，已去掉被跳过的策略）。"""
+        with self._lock:
+            entry = self._entry(server, source)
+            ranked = sorted(self.strategies, key=lambda s: self._expected_cost(s, entry[s]))
+            order = []
+            for strategy in ranked:
+                stats = entry[strategy]
+                attempts, hits = stats[0], stats[1]
+                if attempts >= MIN_ATTEMPTS_TO_SKIP and hits / attempts < SKIP_HIT_RATE:
+                    stats[3] += 1
+                    if stats[3] % EXPLORE_INTERVAL:
+                        continue
+                order.append(strategy)
+            # 至少保留期望成本最低的策略
+            return order or ranked[:1]
+
+    def record(self, server, source, strategy, hit, elapsed):
+        with self._lock:
+            stats = self._entry(server, source)[strategy]
+            stats[0] += 1
+            stats[1] += 1 if hit else 0
+            stats[2] += elapsed
+
+    def snapshot(self):
+        """返回统计数据的副本，便于在接口中展示。"""
+        with self._lock:
+            result = []
+            for (server, source), entry in self._stats.items():
+                strategies = {}
+                for strategy, (attempts, hits, total_seconds, skipped) in entry.items():
+                    strategies[strategy] = {
+                        "attempts": attempts,
+                        "hits": hits,
+                        "hit_rate": round(hits / attempts, 4) if attempts else None,
+                        "avg_ms": round(total_seconds / attempts * 1000, 1) if attempts else None,
+                        "skipped": skipped,
+                        "expected_cost_per_hit_ms": round(self._expected_cost(strategy, entry[strategy]) * 1000, 1),
+                    }
+                result.append({"server": server, "source": source, "strategies": strategies})
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
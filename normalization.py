@@ -0,0 +1,98 @@
+# normalization.py
+"""
+歌名/艺术家名的标准化。
+
+normalize_string 在每首源歌曲和每个 Plex 候选上都会被调用，因此：
+- 所有正则预先编译；
+- 结果按输入字符串做 LRU 缓存（同一艺术家、同一歌名会反复出现）。
+
+canonical_key 在标准化结果的基础上去掉所有空白，得到可直接用于哈希查找的精确键，
+在模糊打分之前先做一次 O(1) 的精确命中判断。
+
+折叠规则：
+- NFKC：全角字母数字、全角括号/标点折叠为半角；
+- 大小写折叠；
+- 常用繁体字折叠为简体（内置常用字表，覆盖歌名中的高频字）；
+- 去除括号内容、deluxe/explicit/remastered/feat. 等附加词及所有标点。
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+NORMALIZE_CACHE_SIZE = 1 << 16
+
+_BRACKET_PATTERN = re.compile(r"[\(\[【].*?[\)\]】]")
+_NOISE_PATTERN = re.compile(r"deluxe|explicit|remastered|feat\.|ft\.")
+_NON_WORD_PATTERN = re.compile(r"[^\w\s]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 常用繁体 -> 简体，每两个字符为一组
+_T2S_PAIRS = (
+    "愛爱 們们 個个 來来 說说 時时 會会 聽听 夢梦 戀恋 憶忆 憂忧 風风 雲云 飛飞 與与 東东 車车 "
+    "紅红 綠绿 藍蓝 頭头 過过 還还 這这 裡里 裏里 為为 無无 國国 開开 關关 門门 問问 間间 見见 "
+    "覺觉 親亲 歲岁 歸归 傷伤 淚泪 聲声 隻只 遠远 邊边 讓让 話话 語语 認认 識识 記记 許许 誰谁 "
+    "請请 談谈 謝谢 變变 難难 離离 雙双 燈灯 歡欢 樂乐 懷怀 憐怜 戰战 場场 長长 陽阳 陰阴 雞鸡 "
+    "鳥鸟 龍龙 馬马 魚鱼 後后 發发 髮发 麼么 麗丽 寶宝 貝贝 實实 對对 當当 學学 樣样 點点 氣气 "
+    "節节 葉叶 華华 萬万 歷历 曆历 詞词 調调 譜谱 專专 輯辑 單单 現现 總总 從从 訴诉 號号 務务 "
+    "團团 園园 圓圆 圖图 溫温 熱热 涼凉 燒烧 鐘钟 鍾钟 錢钱 鐵铁 銀银 錯错 鏡镜 閃闪 電电 隨随 "
+    "陣阵 際际 隊队 險险 鄉乡 緣缘 線线 練练 細细 經经 終终 結结 給给 絕绝 維维 網网 縱纵 繞绕 "
+    "繼继 續续 纏缠 約约 純纯 紙纸 級级 組组 織织 穩稳 積积 種种 稱称 萊莱 蘭兰 薩萨 藝艺 蘇苏 "
+    "藥药 蟲虫 衛卫 衝冲 補补 裝装 觀观 規规 視视 覽览 計计 討讨 訓训 設设 評评 試试 詩诗 誠诚 "
+    "誤误 課课 諾诺 講讲 證证 讀读 讚赞 豐丰 貓猫 負负 貨货 買买 賣卖 費费 資资 賓宾 賞赏 質质 "
+    "趕赶 跡迹 躍跃 軌轨 軍军 軟软 較较 載载 輕轻 輝辉 輪轮 轉转 辦办 農农 迴回 遊游 運运 達达 "
+    "違违 適适 選选 遺遗 遲迟 鄰邻 醫医 釋释 針针 鈴铃 銘铭 鋼钢 錄录 鎖锁 鏈链 閉闭 閒闲 閱阅 "
+    "闊阔 隱隐 雖虽 雜杂 靈灵 靜静 韻韵 響响 頁页 順顺 須须 領领 頻频 題题 顏颜 願愿 類类 顧顾 "
+    "顯显 飄飘 飯饭 飲饮 餘余 館馆 驗验 驚惊 體体 鬧闹 鬥斗 鳳凤 鳴鸣 麥麦 黃黄 齊齐 齒齿 壞坏 "
+    "夠够 奪夺 奮奋 婦妇 媽妈 嬰婴 孫孙 寧宁 將将 尋寻 導导 層层 島岛 帶带 幫帮 廣广 廳厅 彈弹 "
+    "彎弯 徑径 徹彻 憤愤 態态 慣惯 慶庆 應应 懶懒 戲戏 擁拥 擇择 擊击 擔担 據据 擺摆 攜携 敗败 "
+    "數数 斷断 於于 晝昼 曉晓 暫暂 書书 條条 極极 標标 樹树 橋桥 機机 檢检 歐欧 歎叹 殘残 殺杀 "
+    "沒没 淺浅 淨净 測测 滿满 漢汉 漸渐 潔洁 濃浓 濕湿 灣湾 災灾 煙烟 爺爷 牆墙 獨独 獲获 環环 "
+    "產产 畫画 異异 瘋疯 療疗 癡痴 盡尽 監监 盤盘 眾众 睜睁 礎础 禮礼 禱祷 窮穷 競竞 筆笔 築筑 "
+    "簡简 籃篮 糧粮 紀纪 紋纹 緊紧 罷罢 義义 習习 聖圣 聞闻 聯联 職职 膽胆 臉脸 臨临 興兴 舊旧 "
+    "莊庄 蓋盖 處处 蠻蛮 術术 複复 觸触 誕诞 該该 詳详 謎谜 護护 貴贵 賴赖 贏赢 趨趋 蹤踪 輸输 "
+    "辭辞 郵邮 鄭郑 鋒锋 錦锦 鍵键 霧雾 韓韩 頂顶 項项 預预 頓顿 顆颗 颱台 臺台 飽饱 餓饿 騎骑 "
+    "騙骗 驕骄 髒脏 鬆松 魯鲁 鮮鲜 鯨鲸 鴿鸽 鵝鹅 鶴鹤 鷹鹰 鹽盐 麵面 黨党 龜龟 週周 準准 製制 "
+    "醜丑 範范 憑凭 塵尘 壓压 壯壮 傳传 價价 優优 儘尽 兒儿 內内 兩两 則则 剛刚 劃划 劍剑 動动 "
+    "勝胜 勞劳 區区 協协 卻却 參参 吳吴 嗎吗 嘆叹 噴喷 嚴严 堅坚 報报 夾夹 奧奥 寫写 寬宽 屬属 "
+    "嶺岭 幣币 幾几 庫库 廢废 張张 強强 彌弥 恆恒 悅悦 惡恶 慮虑 憲宪 懸悬 揚扬 換换 損损 搖摇 "
+    "撥拨 擾扰 攝摄 敵敌 晉晋 暈晕 暉晖 曬晒 棄弃 楓枫 榮荣 槍枪 樓楼 毀毁 決决 沖冲 況况 淪沦 "
+    "溝沟 滄沧 滅灭 漁渔 潛潜 澀涩 濤涛 瀟潇 灑洒 燦灿 爐炉 牽牵 狀状 猶犹 獅狮 瑪玛 甦苏 畢毕 "
+    "瘡疮 盜盗 睏困 碼码 確确 禪禅 穎颖 竊窃 筍笋 糾纠 紛纷 絲丝 綁绑 綿绵 緩缓 編编 緯纬 縫缝 "
+    "繪绘 羅罗 翹翘 聰聪 肅肃 脫脱 腦脑 膚肤 舉举 艷艳 蒼苍 蓮莲 薦荐 蘋苹 螢萤 蠟蜡 襲袭 訂订 "
+    "訊讯 託托 訪访 詠咏 詢询 誇夸 誘诱 諒谅 謊谎 謠谣 譯译 豬猪 貢贡 貼贴 賊贼 賽赛 贈赠 趙赵 "
+    "踐践 蹟迹 軒轩 輓挽 輩辈 輾辗 辯辩 遙遥 鄧邓 釀酿 鈔钞 鉛铅 銳锐 鋪铺 鍋锅 鎮镇 鏽锈 鑽钻 "
+    "闖闯 陳陈 陸陆 靂雳 頌颂 頗颇 頹颓 顛颠 颯飒 飆飙 飼饲 餅饼 駐驻 驅驱 驟骤 鬱郁 鴉鸦 鵬鹏 "
+    "黴霉 齡龄"
+)
+_T2S_TABLE = str.maketrans({pair[0]: pair[1] for pair in _T2S_PAIRS.split()})
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_string(text):
+    """标准化字符串，用于模糊比较。"""
+    if not text:
+        return ""
+    # 全角/半角折叠并转换为小写，繁体折叠为简体
+    text = unicodedata.normalize("NFKC", text).lower().translate(_T2S_TABLE)
+    # 移除常见的多余词语和符号
+    text = _BRACKET_PATTERN.sub("", text) # 移除括号和括号内的内容
+    text = _NOISE_PATTERN.sub("", text)
+    # 移除所有非字母和数字的字符
+    text = _NON_WORD_PATTERN.sub("", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def key_from_normalized(normalized):
+    """由 normalize_string 的结果得到精确匹配键（去掉所有空白）。"""
+    return normalized.replace(" ", "")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def canonical_key(text):
+    """用于哈希查找的精确键：标准化后去掉所有空白。"""
+    return key_from_normalized(normalize_string(text))
+
+
+def exact_key(title_key, artist_key):
+    """歌名键与艺术家键组合为一个字符串键。"""
+    return f"{title_key}\x1f{artist_key}"
@@ -0,0 +1,136 @@
+# plex_cache.py
+"""
+Plex 搜索结果的短时缓存。
+
+导入过程中同一艺术家的每首歌都会以相同参数调用一次 plex.library.search，
+重复的歌名、并发的多个导入任务也会发出完全相同的查询。这里按
+(服务器, 连接, 查询词, libtype, 其余过滤条件) 缓存响应：
+
+- 缓存的是绑定在 PlexServer 会话上的对象，其中带有该会话的令牌，所以键中包含连接地址与令牌，
+  不同用户、不同连接之间不共享结果；
+
+- 条目在 SEARCH_CACHE_TTL 秒后过期，总数超过 SEARCH_CACHE_MAX_ENTRIES 时淘汰最久未用的；
+- 单飞（single-flight）：同一个键的查询正在进行时，其他线程等待其结果，而不是各自再发一次请求；
+- 播放列表被修改后调用 invalidate(plex) 清空该服务器的缓存。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+SEARCH_CACHE_TTL = 60
+SEARCH_CACHE_MAX_ENTRIES = 4096
+
+
+def server_key(plex):
+    """用于区分 Plex 服务器的键。"""
+    return getattr(plex, "machineIdentifier", None) or getattr(plex, "_baseurl", None) or "default"
+
+
+def _session_key(plex):
+    """区分同一服务器上不同连接与令牌的键。"""
+    return getattr(plex, "_baseurl", None), getattr(plex, "_token", None)
+
+
+class _InFlight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    """线程安全的 TTL + LRU 缓存，带单飞去重。"""
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (过期时间, 结果)
+        self._in_flight = {}  # key -> _InFlight
+        self._generation = {}  # 服务器 -> 失效代数，失效前发出的查询结果不写回缓存
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_fetch(self, key, fetch):
+        """key[0] 须为服务器键。命中则返回缓存，否则调用 fetch() 并缓存其结果；fetch 的异常不缓存。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            call = self._in_flight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._in_flight[key] = _InFlight()
+                self.misses += 1
+                leader = True
+            generation = self._generation.get(key[0], 0)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if call.error is None and self._generation.get(key[0], 0) == generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, call.result)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def invalidate(self, server=None):
+        """清空某个服务器（默认全部）的缓存条目；正在进行的查询结果也不再写回。"""
+        with self._lock:
+            if server is None:
+                self._entries.clear()
+                servers = {key[0] for key in self._in_flight}
+            else:
+                for key in [k for k in self._entries if k[0] == server]:
+                    del self._entries[key]
+                servers = {server}
+            for s in servers:
+                self._generation[s] = self._generation.get(s, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced}
+
+
+search_cache = SearchCache()
+
+
+def search(plex, query, libtype=None, section_ids=None, **filters):
+    """
+    带缓存的 plex.library.search；返回列表的副本，调用方可以随意修改。
+
+    section_ids: 只保留这些音乐库分区 (librarySectionID) 中的结果。缓存的是整个库的结果，
+    不同的分区选择共用同一份缓存。
+    """
+    key = (server_key(plex), _session_key(plex), query, libtype, tuple(sorted(filters.items())))
+    results = search_cache.get_or_fetch(key, lambda: plex.library.search(query, libtype=libtype, **filters))
+    if section_ids is not None:
+        return [item for item in results if getattr(item, "librarySectionID", None) in section_ids]
+    return list(results)
+
+
+def invalidate(plex=None):
+    """播放列表被修改后调用，清空该 Plex 服务器的搜索缓存。"""
+    search_cache.invalidate(server_key(plex) if plex is not None else None)
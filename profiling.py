@@ -0,0 +1,169 @@
+# profiling.py
+"""
+按需的导入任务剖析工具。
+
+开启后，在任务线程上同时收集两类数据：
+1. 采样调用栈：后台线程定期抓取任务线程的栈帧，聚合为 folded 格式
+   （flamegraph.pl / speedscope 均可直接读取）。
+2. Span 追踪：每首歌、每次 Plex 请求各记录一个 span，可导出为 folded
+   自耗时或 Chrome Trace Event JSON（chrome://tracing、Perfetto 可打开）。
+
+未开启时 `span()` 只做一次线程局部变量查找并返回共享的空上下文，不产生额外开销。
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_local = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+
+DEFAULT_SAMPLE_INTERVAL = 0.005  # 秒
+
+
+def span(name, **args):
+    """在当前线程的活动剖析器上记录一个 span；未开启剖析时为空操作。"""
+    profiler = getattr(_local, "profiler", None)
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name, args)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start", "child_time")
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.start = 0.0
+        self.child_time = 0.0
+
+    def __enter__(self):
+        self.profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        end = time.perf_counter()
+        self.profiler._close_span(self, end)
+        return False
+
+
+class TaskProfiler:
+    """
+    单个任务的剖析器。在任务线程内以上下文管理器方式使用：
+
+        with TaskProfiler() as profiler:
+            run_task()
+        profiler.folded_samples()
+    """
+
+    def __init__(self, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self.samples = Counter()
+        self.span_self_time = Counter()
+        self.events = []
+        self._stack = []
+        self._thread_id = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._origin = 0.0
+        self.started_at = None
+        self.duration = 0.0
+
+    # --- 生命周期 ---
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+        return False
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._origin = time.perf_counter()
+        self.started_at = time.time()
+        _local.profiler = self
+        self._sampler = threading.Thread(target=self._sample_loop, name="task-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self._origin
+        if getattr(_local, "profiler", None) is self:
+            _local.profiler = None
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    # --- 采样 ---
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.reverse()
+            self.samples[";".join(labels)] += 1
+
+    # --- Span ---
+
+    def span(self, name, args=None):
+        return _Span(self, name, args or {})
+
+    def _close_span(self, current, end):
+        stack = self._stack
+        path = ";".join(s.name for s in stack)
+        stack.pop()
+        duration = end - current.start
+        if stack:
+            stack[-1].child_time += duration
+        # 自耗时以微秒为权重写入 folded 计数
+        self.span_self_time[path] += max(int((duration - current.child_time) * 1e6), 0)
+        self.events.append({
+            "name": current.name,
+            "ph": "X",
+            "ts": int((current.start - self._origin) * 1e6),
+            "dur": int(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": self._thread_id,
+            "args": current.args,
+        })
+
+    # --- 导出 ---
+
+    def folded_samples(self):
+        """采样栈，folded 格式，每行 `frame;frame;frame count`。"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+    def folded_spans(self):
+        """Span 自耗时（微秒），folded 格式。"""
+        return "".join(f"{path} {us}\n" for path, us in self.span_self_time.items() if us > 0)
+
+    def chrome_trace(self):
+        """Chrome Trace Event 格式的 span 追踪。"""
+        return json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+
+    def summary(self):
+        return {
+            "started_at": self.started_at,
+            "duration": round(self.duration, 3),
+            "sample_interval": self.sample_interval,
+            "sample_count": sum(self.samples.values()),
+            "span_count": len(self.events),
+        }
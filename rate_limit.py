@@ -0,0 +1,152 @@
+# rate_limit.py
+"""
+按主机的请求限流（令牌桶 + AIMD 并发控制），进程内所有线程共享。
+
+网易云/QQ音乐在短时间内收到大量请求时会返回 429、5xx，或者干脆返回空的 songs 列表。
+每个主机对应一个 HostLimiter：
+- 令牌桶限制每秒请求数 (rate)，并发槽限制同时进行的请求数 (concurrency)；
+- 加性增：每次成功 rate += RATE_INCREASE，concurrency += 1/concurrency（约每轮 +1）；
+- 乘性减：被限流时 rate 与 concurrency 乘以 BACKOFF_FACTOR，并暂停该主机的所有请求
+  （优先使用 Retry-After，否则指数退避）。同一个 DECREASE_COOLDOWN 内只减一次，
+  避免同一波并发请求的多次失败把速率压到最低。
+这样吞吐会稳定在服务端能承受的最高速率附近。
+"""
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+INITIAL_RATE = 5.0
+MIN_RATE = 0.5
+MAX_RATE = 50.0
+RATE_INCREASE = 0.2
+INITIAL_CONCURRENCY = 2.0
+MAX_CONCURRENCY = 16.0
+BACKOFF_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0
+# 被限流后的暂停时间：BACKOFF_BASE * 2^(连续失败次数-1)，不超过 MAX_BACKOFF
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 60.0
+# 被限流或网络错误时的最大重试次数
+MAX_RETRIES = 4
+
+
+class HostLimiter:
+    """单个主机的令牌桶与 AIMD 并发控制。"""
+
+    def __init__(self, host, rate=INITIAL_RATE, concurrency=INITIAL_CONCURRENCY):
+        self.host = host
+        self.rate = rate
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._failures = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        # 桶容量为 max(1, rate)，即最多允许 1 秒的突发
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """阻塞直到拿到并发槽和令牌。"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    wait = None  # 等待 release 唤醒
+                elif self._tokens < 1.0:
+                    wait = (1.0 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1.0
+                    self.in_flight += 1
+                    return
+                self._cond.wait(wait)
+
+    def release(self, throttled=False, retry_after=None, adjust=True):
+        """归还并发槽，并按结果调整速率；adjust=False 时只归还，不计入成功或失败。"""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if adjust and not throttled:
+                self._failures = 0
+                self.rate = min(MAX_RATE, self.rate + RATE_INCREASE)
+                self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1.0 / self.concurrency)
+            elif adjust:
+                self._failures += 1
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self._last_decrease = now
+                    self.rate = max(MIN_RATE, self.rate * BACKOFF_FACTOR)
+                    self.concurrency = max(1.0, self.concurrency * BACKOFF_FACTOR)
+                pause = retry_after if retry_after is not None else min(
+                    MAX_BACKOFF, BACKOFF_BASE * 2 ** (self._failures - 1))
+                self._paused_until = max(self._paused_until, now + pause)
+                self._tokens = 0.0
+                logger.warning(f"{self.host} 限流: 暂停 {pause:.1f}s，速率降至 {self.rate:.1f}/s，"
+                               f"并发降至 {int(self.concurrency)}")
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"host": self.host, "rate": round(self.rate, 2), "concurrency": int(self.concurrency),
+                    "in_flight": self.in_flight, "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1)}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host):
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = HostLimiter(host)
+        return limiter
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return min(MAX_BACKOFF, max(0.0, float(value)))
+    except ValueError:
+        return None
+
+
+def request(method, url, is_throttled=None, max_retries=MAX_RETRIES, session=None, **kwargs):
+    """
+    经所属主机的限流器发出请求。429 与 5xx 视为被限流；is_throttled(response) 可补充
+    业务层面的判断（如返回了空列表）。被限流或网络错误时重试，最后一次的响应原样返回，
+    最后一次的网络异常原样抛出。
+    """
+    import requests
+
+    limiter = get_limiter(urlsplit(url).netloc)
+    http = session or requests
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            response = http.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            limiter.release(throttled=True)
+            if attempt == max_retries:
+                raise
+            continue
+        except BaseException:
+            limiter.release(adjust=False)
+            raise
+        throttled = response.status_code == 429 or response.status_code >= 500
+        if not throttled and is_throttled is not None and response.ok:
+            throttled = is_throttled(response)
+        limiter.release(throttled=throttled, retry_after=_retry_after(response) if throttled else None)
+        if not throttled or attempt == max_retries:
+            return response
@@ -0,0 +1,193 @@
+# rematch.py
+"""
+音乐库新增音轨后，对之前未匹配的歌曲做增量重新匹配。
+
+不重新导入整个歌单，只做三件事：
+1. 按分区请求扫描水位之后新增的音轨（`addedAt>>=`，按 addedAt 排序分页），通常只有几百首；
+2. 用这些音轨构建一个小的 LibraryIndex，按与导入相同的规则（精确 / 艺术家内模糊 / 全局模糊，
+   见 match_engine.match_in_index）匹配 unmatched_store 中的待匹配歌曲，导入时选择了分区的
+   歌曲只与这些分区的新音轨匹配；
+3. 命中的音轨按播放列表分组追加，记录标记为已匹配。所有播放列表都更新成功后才推进水位，
+   失败的下次重试。
+
+重新匹配期间持有服务器的扫描锁，每取完一页音轨、每更新一个播放列表续期一次；锁失效
+（如长时间卡在一次请求上、被其他任务接管）时中止。追加时跳过播放列表中已有的音轨，
+即使两个任务先后处理了同一批记录也不会重复添加。
+
+开销与新增音轨数、待匹配歌曲数成正比，与音乐库和歌单的总大小无关。
+"""
+import logging
+import time
+import uuid
+
+import logic
+import plex_cache
+import unmatched_store
+from library_index import LibraryIndex
+from match_engine import LIBRARY_PAGE_SIZE, match_in_index, split_artists
+
+logger = logging.getLogger(__name__)
+
+PLEX_TRACK_TYPE = 10
+
+
+def fetch_added_tracks(plex, since=None, page_size=LIBRARY_PAGE_SIZE, on_page=None):
+    """
+    返回所有音乐分区中 addedAt 不早于 since（Unix 秒，None 表示全部）的音轨:
+    [(ratingKey, 歌名, 艺术家, 分区 key, addedAt)]。
+    on_page(): 可选，每取完一页调用一次（用于为扫描锁续期）。
+    """
+    params = {"type": PLEX_TRACK_TYPE, "sort": "addedAt"}
+    if since is not None:
+        # 含等号：与水位同一秒入库、上次未扫到的音轨不会遗漏，重复扫到的音轨匹配结果不变
+        params["addedAt>>"] = int(since) - 1
+    tracks = []
+    for section in logic.select_music_sections(plex):
+        start = 0
+        while True:
+            items = section.fetchItems(f"/library/sections/{section.key}/all", container_start=start,
+                                       container_size=page_size, maxresults=page_size, params=params)
+            for track in items:
+                added_at = int(track.addedAt.timestamp()) if track.addedAt else 0
+                tracks.append((track.ratingKey, track.title, track.grandparentTitle, section.key, added_at))
+            if on_page is not None:
+                on_page()
+            if len(items) < page_size:
+                break
+            start += page_size
+    return tracks
+
+
+def _build_index(tracks, section_keys):
+    rows = []
+    for rating_key, title, artist, section_key, _ in tracks:
+        if section_keys is None or section_key in section_keys:
+            rows.append((rating_key, logic.normalize_string(title or ""), logic.normalize_string(artist or ""),
+                         title or "", artist or ""))
+    return LibraryIndex.from_rows(rows)
+
+
+def match_entries(entries, tracks):
+    """在新增音轨中匹配待匹配记录，返回 [(记录, ratingKey, 分数, 策略)]。"""
+    if logic.fuzz is None:
+        logger.warning("'thefuzz' 库未安装，只进行精确匹配。请执行 'pip install thefuzz python-Levenshtein'")
+    by_sections = {}
+    for entry in entries:
+        sections = frozenset(entry["section_keys"]) if entry["section_keys"] else None
+        by_sections.setdefault(sections, []).append(entry)
+
+    hits = []
+    for section_keys, group in by_sections.items():
+        index = _build_index(tracks, section_keys)
+        if not len(index):
+            continue
+        for entry in group:
+            row, score, strategy = match_in_index(index, logic.normalize_string(entry["title"]),
+                                                  split_artists(entry["artist"]), logic.fuzz)
+            if row is not None:
+                hits.append((entry, index.rating_keys[row], score, strategy))
+    return hits
+
+
+def _append_to_playlist(plex, playlist_key, rating_keys):
+    """把播放列表中还没有的音轨追加进去，返回实际追加的数量；播放列表已被删除时返回 None。"""
+    try:
+        playlist = plex.fetchItem(f"/playlists/{playlist_key}")
+    except logic.NotFound:
+        return None
+    # 上一个任务可能已追加过但没来得及标记（如锁过期后被接管），已有的音轨不再重复添加
+    existing = {item.ratingKey for item in playlist.items()}
+    rating_keys = [key for key in rating_keys if key not in existing]
+    items = []
+    for i in range(0, len(rating_keys), logic.RATING_KEY_FETCH_BATCH):
+        items.extend(plex.fetchItems(rating_keys[i:i + logic.RATING_KEY_FETCH_BATCH]))
+    if items:
+        playlist.addItems(items)
+    return len(items)
+
+
+def rematch_unmatched(plex, store=None, full=False, on_progress=None, cancel_event=None):
+    """
+    用新增音轨重新匹配该服务器上的待匹配歌曲，命中的追加到对应播放列表。
+
+    full: 忽略扫描水位，与整个音乐库重新匹配（如修正了大量元数据之后）。
+    on_progress(message): 可选的进度回调。
+    返回 {"pending", "scanned", "matched", "playlists": [{"playlist_key", "playlist_title", "added"}],
+          "removed_playlists", "failed_playlists", "elapsed"}。
+    同一服务器正在由其他任务重新匹配时抛出 ValueError。
+    """
+    store = store or unmatched_store.default_store()
+    server = plex_cache.server_key(plex)
+    started = time.perf_counter()
+    report = {"pending": 0, "scanned": 0, "matched": 0, "playlists": [], "removed_playlists": [],
+              "failed_playlists": [], "elapsed": 0.0}
+
+    def progress(message):
+        logger.info(message)
+        if on_progress is not None:
+            on_progress(message)
+
+    owner = uuid.uuid4().hex
+    if not store.acquire_scan(server, owner):
+        raise ValueError("该Plex服务器正在进行重新匹配，请稍后再试。")
+
+    def renew():
+        if not store.renew_scan(server, owner):
+            raise ValueError("重新匹配的服务器锁已过期，可能已由其他任务接管，本次重新匹配中止。")
+
+    try:
+        # 持锁后再读取待匹配记录，不会拿到其他任务刚刚匹配过的歌曲
+        _rematch_locked(plex, store, server, full, report, progress, cancel_event, renew)
+    finally:
+        store.release_scan(server, owner)
+    report["elapsed"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def _rematch_locked(plex, store, server, full, report, progress, cancel_event, renew):
+    entries = store.pending(server)
+    report["pending"] = len(entries)
+    if not entries:
+        progress("没有待重新匹配的歌曲。")
+        return
+
+    since = None if full else store.scan_watermark(server)
+    progress(f"正在获取{'整个音乐库' if since is None else '新增'}的音轨...")
+    tracks = fetch_added_tracks(plex, since, on_page=renew)
+    report["scanned"] = len(tracks)
+    progress(f"在 {len(tracks)} 首{'' if since is None else '新增'}音轨中匹配 {len(entries)} 首未匹配歌曲...")
+    hits = match_entries(entries, tracks) if tracks else []
+
+    by_playlist = {}
+    for entry, rating_key, _, _ in hits:
+        by_playlist.setdefault(entry["playlist_key"], []).append((entry, rating_key))
+    for playlist_key, playlist_hits in by_playlist.items():
+        if cancel_event is not None and cancel_event.is_set():
+            # 取消后剩余的播放列表按失败处理，水位不推进，下次重试
+            report["failed_playlists"].append(playlist_key)
+            continue
+        renew()
+        title = playlist_hits[0][0]["playlist_title"]
+        # 同一播放列表中多首歌命中同一音轨时只追加一次
+        rating_keys = list(dict.fromkeys(rating_key for _, rating_key in playlist_hits))
+        try:
+            added = _append_to_playlist(plex, playlist_key, rating_keys)
+            if added is None:
+                store.remove_playlist(server, playlist_key)
+                report["removed_playlists"].append(playlist_key)
+                progress(f"播放列表 '{title}' 已不存在，丢弃其 {len(playlist_hits)} 条记录。")
+                continue
+        except Exception as e:
+            logger.error(f"追加到播放列表 '{title}' 失败", exc_info=True)
+            report["failed_playlists"].append(playlist_key)
+            progress(f"追加到播放列表 '{title}' 失败: {e}")
+            continue
+        store.mark_matched([(entry["id"], rating_key) for entry, rating_key in playlist_hits])
+        report["matched"] += len(playlist_hits)
+        report["playlists"].append({"playlist_key": playlist_key, "playlist_title": title, "added": added})
+        progress(f"已向播放列表 '{title}' 追加 {added} 首。")
+    if by_playlist:
+        plex_cache.invalidate(plex)
+
+    if tracks and not report["failed_playlists"]:
+        store.set_scan_watermark(server, max(track[4] for track in tracks))
@@ -0,0 +1,98 @@
+# startup_budget.py
+"""
+冷启动预算检查。
+
+在全新的解释器中以 `python -X importtime -c "import <模块>"` 导入各入口模块，
+报告累计导入耗时最高的模块，并检查：
+- 入口模块的累计导入耗时不超过预算（取多次运行的最小值，减少抖动）；
+- 入口模块导入时没有顺带导入应延迟加载的重型依赖（plexapi、thefuzz 等）。
+
+    python startup_budget.py              # 检查所有入口
+    python startup_budget.py cli --top 20 # 只检查 cli，并列出前 20 个模块
+
+任一检查失败时退出码为 1，可直接放进 CI 或容器构建步骤。
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# 入口模块 -> (累计导入耗时预算（毫秒）, 不允许在导入时加载的顶层包)
+STARTUP_BUDGETS = {
+    "logic": (150, ("plexapi", "thefuzz", "requests", "tkinter")),
+    "cli": (250, ("plexapi", "thefuzz", "requests", "tkinter")),
+    "main": (1500, ("plexapi", "thefuzz", "tkinter")),
+    "gui": (400, ("plexapi", "thefuzz", "requests")),
+}
+DEFAULT_RUNS = 3
+DEFAULT_TOP = 10
+
+
+def measure_imports(module, cwd=None):
+    """返回 {模块名: (自身耗时us, 累计耗时us)}，按 -X importtime 的输出解析。"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"导入 {module} 失败: {errors[-1] if errors else result.returncode}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # 表头
+        timings[fields[2].strip()] = (self_us, cumulative_us)
+    return timings
+
+
+def check(module, budget_ms, forbidden, runs=DEFAULT_RUNS, top=DEFAULT_TOP, cwd=None):
+    """测量并打印报告，返回是否通过。"""
+    best = None
+    for _ in range(runs):
+        timings = measure_imports(module, cwd)
+        if best is None or timings[module][1] < best[module][1]:
+            best = timings
+    total_ms = best[module][1] / 1000
+    loaded_forbidden = sorted({name.split(".")[0] for name in best} & set(forbidden))
+
+    ok = total_ms <= budget_ms and not loaded_forbidden
+    print(f"{'OK  ' if ok else 'FAIL'} {module}: {total_ms:.1f} ms (预算 {budget_ms} ms)，共导入 {len(best)} 个模块")
+    heaviest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in heaviest[:top]:
+        print(f"       {cumulative_us / 1000:8.1f} ms 累计  {self_us / 1000:7.1f} ms 自身  {name}")
+    if loaded_forbidden:
+        print(f"       导入时加载了应延迟导入的依赖: {', '.join(loaded_forbidden)}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查各入口模块的冷启动导入耗时。")
+    parser.add_argument("modules", nargs="*", default=list(STARTUP_BUDGETS), help="要检查的入口模块（默认全部）")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help=f"每个模块测量次数，取最小值（默认 {DEFAULT_RUNS}）")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help=f"列出累计耗时最高的模块数（默认 {DEFAULT_TOP}）")
+    parser.add_argument("--scale", type=float, default=1.0, help="预算倍数，用于较慢的机器")
+    args = parser.parse_args(argv)
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    failed = []
+    for module in args.modules:
+        if module not in STARTUP_BUDGETS:
+            parser.error(f"未知的入口模块: {module}. 可选: {', '.join(STARTUP_BUDGETS)}")
+        budget_ms, forbidden = STARTUP_BUDGETS[module]
+        try:
+            passed = check(module, budget_ms * args.scale, forbidden, args.runs, args.top, cwd)
+        except RuntimeError as e:
+            print(f"FAIL {e}")
+            passed = False
+        if not passed:
+            failed.append(module)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
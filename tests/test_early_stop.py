@@ -0,0 +1,104 @@
+"""
+模糊匹配的提前结束：打分达到 logic.EARLY_STOP_SCORE（低于满分）后，不再比较其余候选，
+也不再执行之后的策略。
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import logic
+import match_engine
+from library_index import LibraryIndex
+
+
+class RecordingFuzz:
+    """按歌名查表打分，并记录比较过哪些歌名。"""
+
+    def __init__(self, scores):
+        self.scores = scores
+        self.compared = []
+
+    def partial_ratio(self, query, title):
+        self.compared.append(title)
+        return self.scores.get(title, 0)
+
+    def ratio(self, a, b):
+        return 100
+
+
+class FakeTrack:
+    def __init__(self, title):
+        self.title = title
+
+
+class FakeArtist:
+    def __init__(self, tracks):
+        self._tracks = tracks
+
+    def tracks(self):
+        return self._tracks
+
+
+# 艺术家的歌曲按此顺序返回：strong 已超过提前结束阈值但不是满分，其后的 perfect 不应再比较
+SCORES = {"weak": 60, "strong": 96, "perfect": 100}
+
+
+class MatchPlexTrackEarlyStopTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fuzz = RecordingFuzz(SCORES)
+        self.searches = []
+
+        def search(plex, query, libtype=None, section_ids=None, **filters):
+            self.searches.append(libtype)
+            if libtype == "artist":
+                return [FakeArtist([FakeTrack(title) for title in SCORES])]
+            return []
+
+        patches = [
+            mock.patch.object(logic, "_fuzz", return_value=self.fuzz),
+            mock.patch.object(logic.plex_cache, "search", side_effect=search),
+            mock.patch.object(logic.plex_cache, "server_key", return_value="server"),
+            mock.patch.object(logic.strategy_planner, "plan",
+                              return_value=[logic.MATCH_ARTIST_FUZZY, logic.MATCH_GLOBAL_FUZZY]),
+            mock.patch.object(logic.strategy_planner, "record"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_strong_hit_skips_remaining_candidates_and_strategies(self):
+        self.assertLess(logic.EARLY_STOP_SCORE, 100)
+        track, score, strategy = logic.match_plex_track(None, "song", "artist")
+        self.assertEqual((track.title, score, strategy), ("strong", 96, logic.MATCH_ARTIST_FUZZY))
+        self.assertEqual(self.fuzz.compared, ["weak", "strong"])
+        # 全局模糊策略（按歌名搜索音轨）没有执行
+        self.assertEqual(self.searches, ["artist"])
+
+    def test_threshold_at_full_score_compares_every_candidate(self):
+        with mock.patch.object(logic, "EARLY_STOP_SCORE", 100):
+            track, score, _ = logic.match_plex_track(None, "song", "artist")
+        self.assertEqual((track.title, score), ("perfect", 100))
+        self.assertEqual(self.fuzz.compared, ["weak", "strong", "perfect"])
+
+
+class MatchInIndexEarlyStopTest(unittest.TestCase):
+
+    def test_strong_hit_skips_remaining_rows(self):
+        index = LibraryIndex.from_rows([
+            (rating_key, title, "artist", title, "Artist")
+            for rating_key, title in enumerate(SCORES, start=1)
+        ])
+        fuzz = RecordingFuzz(SCORES)
+        row, score, strategy = match_engine.match_in_index(index, "song", ["artist"], fuzz)
+        self.assertEqual((index.rating_keys[row], score, strategy), (2, 96, logic.MATCH_ARTIST_FUZZY))
+        self.assertEqual(fuzz.compared, ["weak", "strong"])
+
+
+if __name__ == "__main__":
+    unittest.main()
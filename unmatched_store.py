@@ -0,0 +1,219 @@
+# unmatched_store.py
+"""
+未匹配歌曲的持久化存储。
+
+导入完成后，未匹配的歌曲连同目标 Plex 播放列表（服务器、ratingKey、名称）、来源平台和
+所选音乐库分区一起记录下来。音乐库新增音轨后，rematch 只拿这些歌曲去匹配新增的音轨，
+命中的追加到对应的播放列表并标记为已匹配，不必重新导入整个歌单。
+
+同一播放列表再次导入（update_existing 会清空后重新添加）时，其记录整体替换为本次的未匹配歌曲。
+每台服务器另有一个扫描水位（已扫描到的最大 addedAt），下次只请求其后新增的音轨。
+
+存储为 SQLite 文件，默认 unmatched.db，可用环境变量 PLEXLIST_UNMATCHED_DB 修改。
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = "unmatched.db"
+SQLITE_BUSY_TIMEOUT = 10  # 秒
+# 重新匹配时对服务器加锁的时长（秒），持锁期间每取完一页音轨、每更新一个播放列表续期一次，
+# 持锁进程崩溃后锁自动失效
+SCAN_LOCK_SECONDS = 600
+# 服务器上没有待匹配歌曲时，新记录的水位取当前时间减去该余量，容忍本机与 Plex 服务器的时钟偏差
+WATERMARK_CLOCK_MARGIN = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS unmatched_songs (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    playlist_key INTEGER NOT NULL,
+    playlist_title TEXT NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    source TEXT,
+    section_keys TEXT,
+    created_at REAL NOT NULL,
+    matched_key INTEGER,
+    matched_at REAL
+);
+CREATE INDEX IF NOT EXISTS unmatched_by_playlist ON unmatched_songs (server, playlist_key);
+CREATE INDEX IF NOT EXISTS unmatched_pending ON unmatched_songs (server, matched_key);
+CREATE TABLE IF NOT EXISTS library_scans (
+    server TEXT PRIMARY KEY,
+    added_at INTEGER NOT NULL,
+    scanned_at REAL,
+    locked_by TEXT,
+    locked_until REAL
+);
+"""
+
+
+class UnmatchedStore:
+    """未匹配歌曲的 SQLite 存储，可在多个线程、多个进程间共享同一文件。"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 首次使用时才创建文件与表
+            with self._schema_lock:
+                if not self._schema_ready:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def replace_playlist(self, server, playlist_key, playlist_title, songs, source=None, section_keys=None):
+        """
+        用本次导入的未匹配歌曲替换该播放列表的记录。
+        songs: [(歌名, 艺术家)]；section_keys: 导入时所选的音乐库分区 key，None 表示全部分区。
+        """
+        now = time.time()
+        sections = json.dumps(sorted(section_keys)) if section_keys else None
+        with self._write() as conn:
+            conn.execute("DELETE FROM unmatched_songs WHERE server = ? AND playlist_key = ?", (server, playlist_key))
+            if songs and conn.execute("SELECT 1 FROM unmatched_songs WHERE server = ? AND matched_key IS NULL "
+                                      "LIMIT 1", (server,)).fetchone() is None:
+                # 该服务器上没有其他待匹配歌曲：之前新增的音轨都已经在本次导入中搜索过，水位从现在开始
+                conn.execute(
+                    "INSERT INTO library_scans (server, added_at) VALUES (?, ?) "
+                    "ON CONFLICT (server) DO UPDATE SET added_at = MAX(added_at, excluded.added_at)",
+                    (server, int(now - WATERMARK_CLOCK_MARGIN)),
+                )
+            conn.executemany(
+                "INSERT INTO unmatched_songs (server, playlist_key, playlist_title, title, artist, source, "
+                "section_keys, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(server, int(playlist_key), playlist_title, title, artist, source, sections, now)
+                 for title, artist in songs],
+            )
+
+    def remove_playlist(self, server, playlist_key):
+        """播放列表已被删除时丢弃其记录。"""
+        with self._write() as conn:
+            conn.execute("DELETE FROM unmatched_songs WHERE server = ? AND playlist_key = ?", (server, playlist_key))
+
+    def pending(self, server):
+        """该服务器上尚未匹配的记录: [{"id", "playlist_key", "playlist_title", "title", "artist", "section_keys"}]。"""
+        rows = self._conn().execute(
+            "SELECT id, playlist_key, playlist_title, title, artist, section_keys FROM unmatched_songs "
+            "WHERE server = ? AND matched_key IS NULL ORDER BY id",
+            (server,),
+        ).fetchall()
+        return [{"id": row[0], "playlist_key": row[1], "playlist_title": row[2], "title": row[3], "artist": row[4],
+                 "section_keys": json.loads(row[5]) if row[5] else None} for row in rows]
+
+    def mark_matched(self, matches):
+        """matches: [(记录 id, 命中的 ratingKey)]。"""
+        now = time.time()
+        with self._write() as conn:
+            conn.executemany("UPDATE unmatched_songs SET matched_key = ?, matched_at = ? WHERE id = ?",
+                             [(int(rating_key), now, entry_id) for entry_id, rating_key in matches])
+
+    def entries(self, server, playlist_key=None, include_matched=False):
+        """列出记录，字段同 pending，另含 source、created_at、matched_key、matched_at。"""
+        query = ("SELECT id, playlist_key, playlist_title, title, artist, section_keys, source, created_at, "
+                 "matched_key, matched_at FROM unmatched_songs WHERE server = ?")
+        params = [server]
+        if playlist_key is not None:
+            query += " AND playlist_key = ?"
+            params.append(int(playlist_key))
+        if not include_matched:
+            query += " AND matched_key IS NULL"
+        rows = self._conn().execute(query + " ORDER BY id", params).fetchall()
+        return [{"id": row[0], "playlist_key": row[1], "playlist_title": row[2], "title": row[3], "artist": row[4],
+                 "section_keys": json.loads(row[5]) if row[5] else None, "source": row[6], "created_at": row[7],
+                 "matched_key": row[8], "matched_at": row[9]} for row in rows]
+
+    def summary(self, server):
+        """按播放列表汇总: [{"playlist_key", "playlist_title", "pending", "matched"}]。"""
+        rows = self._conn().execute(
+            "SELECT playlist_key, MAX(playlist_title), SUM(matched_key IS NULL), SUM(matched_key IS NOT NULL) "
+            "FROM unmatched_songs WHERE server = ? GROUP BY playlist_key ORDER BY playlist_key",
+            (server,),
+        ).fetchall()
+        return [{"playlist_key": row[0], "playlist_title": row[1], "pending": row[2], "matched": row[3]}
+                for row in rows]
+
+    def scan_watermark(self, server):
+        """已扫描到的最大 addedAt（Plex 服务器时间，Unix 秒）；从未记录时为 None。"""
+        row = self._conn().execute("SELECT added_at FROM library_scans WHERE server = ?", (server,)).fetchone()
+        return row[0] if row else None
+
+    def acquire_scan(self, server, owner, lease=SCAN_LOCK_SECONDS):
+        """
+        为重新匹配加锁，避免多个 worker 同时向同一服务器的播放列表追加相同的音轨。
+        返回是否取得锁；同一 owner 可重复取得。
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute("SELECT locked_by, locked_until FROM library_scans WHERE server = ?",
+                               (server,)).fetchone()
+            if row is not None and row[0] not in (None, owner) and (row[1] or 0) > now:
+                return False
+            # 水位缺失（从未记录过未匹配歌曲）时记为 0，即扫描整个音乐库
+            conn.execute(
+                "INSERT INTO library_scans (server, added_at, locked_by, locked_until) VALUES (?, 0, ?, ?) "
+                "ON CONFLICT (server) DO UPDATE SET locked_by = excluded.locked_by, "
+                "locked_until = excluded.locked_until",
+                (server, owner, now + lease),
+            )
+        return True
+
+    def renew_scan(self, server, owner, lease=SCAN_LOCK_SECONDS):
+        """延长 owner 持有的锁，返回锁是否仍归 owner 所有（已过期并被其他任务取得时为 False）。"""
+        with self._write() as conn:
+            cursor = conn.execute("UPDATE library_scans SET locked_until = ? WHERE server = ? AND locked_by = ?",
+                                  (time.time() + lease, server, owner))
+        return cursor.rowcount == 1
+
+    def release_scan(self, server, owner):
+        with self._write() as conn:
+            conn.execute("UPDATE library_scans SET locked_by = NULL, locked_until = NULL "
+                         "WHERE server = ? AND locked_by = ?", (server, owner))
+
+    def set_scan_watermark(self, server, added_at):
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO library_scans (server, added_at, scanned_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (server) DO UPDATE SET added_at = excluded.added_at, scanned_at = excluded.scanned_at",
+                (server, int(added_at), time.time()),
+            )
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    """进程共享的默认存储，路径取自 PLEXLIST_UNMATCHED_DB。"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = UnmatchedStore(os.environ.get("PLEXLIST_UNMATCHED_DB", DEFAULT_PATH))
+        return _default_store
@@ -4,17 +4,34 @@ document.addEventListener('DOMContentLoaded', () => {
     const extractForm = document.getElementById('extract-form');
     const importToPlexButton = document.getElementById('import-to-plex');
     const songList = document.getElementById('song-list');
+    const songListViewport = document.getElementById('song-list-viewport');
+    const songListSpacer = document.getElementById('song-list-spacer');
+    const songCount = document.getElementById('song-count');
     const resultsContainer = document.getElementById('results-container');
     const statusContainer = document.getElementById('status-container');
     const loader = document.getElementById('loader');
     const progressBar = document.getElementById('import-progress-bar');
     const statusMessage = document.getElementById('import-status-message');
     const progressText = document.getElementById('import-progress-text');
+    const cancelImportButton = document.getElementById('cancel-import');
 
     // 全局变量
     let currentSongs = [];
     let taskId = null;
     let pollingInterval = null;
+    // 增量轮询：statusCursor 为上次响应的 cursor，taskState 为合并后的完整状态
+    let statusCursor = null;
+    let taskState = {};
+
+    // 虚拟列表：行高需与 style.css 中 li 的高度一致，只渲染视口内的行及上下各 OVERSCAN 行
+    const SONG_ROW_HEIGHT = 44;
+    const SONG_LIST_OVERSCAN = 10;
+    // 分页提取时每页的歌曲数
+    const EXTRACT_PAGE_SIZE = 1000;
+    // 提取结果缓存：请求体 -> { etag, result }，重复请求时带 If-None-Match，304 时直接复用
+    const extractCache = new Map();
+    let renderedRange = { first: -1, last: -1 };
+    let renderScheduled = false;
 
     /**
      * 从API错误响应中解析详细的错误信息
@@ -94,31 +111,44 @@ document.addEventListener('DOMContentLoaded', () => {
         resultsContainer.style.display = 'none';
         statusContainer.style.display = 'none';
         statusMessage.textContent = '';
-        songList.innerHTML = '';
         currentSongs = [];
+        displaySongs(currentSongs, 0);
+        songListViewport.scrollTop = 0;
         if (pollingInterval) clearInterval(pollingInterval);
 
         const formData = new FormData(extractForm);
         const data = {
             source: formData.get('platform'),
             url_or_id: formData.get('playlist_url'),
+            limit: EXTRACT_PAGE_SIZE,
         };
 
         try {
-            const response = await fetch('/api/v1/playlist/extract', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(data),
-            });
+            // 按游标逐页拉取，每到一页就刷新列表，首屏不必等待整个歌单
+            let cursor = null;
+            do {
+                const body = JSON.stringify({ ...data, cursor });
+                const cached = extractCache.get(body);
+                const headers = { 'Content-Type': 'application/json' };
+                if (cached) headers['If-None-Match'] = cached.etag;
+                const response = await fetch('/api/v1/playlist/extract', { method: 'POST', headers, body });
 
-            if (response.ok) {
-                const result = await response.json();
-                currentSongs = result.songs;
-                displaySongs(result.songs);
-            } else {
-                const errorData = await response.json();
-                alert(`提取失败: ${getErrorMessage(errorData)}`);
-            }
+                let result;
+                if (response.status === 304 && cached) {
+                    result = cached.result;
+                } else if (!response.ok) {
+                    const errorData = await response.json();
+                    alert(`提取失败: ${getErrorMessage(errorData)}`);
+                    break;
+                } else {
+                    result = await response.json();
+                    const etag = response.headers.get('ETag');
+                    if (etag) extractCache.set(body, { etag, result });
+                }
+                currentSongs.push(...result.songs);
+                displaySongs(currentSongs, result.total);
+                cursor = result.next_cursor;
+            } while (cursor);
         } catch (error) {
             console.error('提取歌单时出错:', error);
             alert('提取歌单时发生网络错误。');
@@ -128,22 +158,58 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     // --- 3. 结果显示模块 ---
-    function displaySongs(songs) {
-        songList.innerHTML = '';
+    function displaySongs(songs, total) {
+        renderedRange = { first: -1, last: -1 };
         if (songs && songs.length > 0) {
-            songs.forEach(song => {
-                const li = document.createElement('li');
-                li.textContent = `${song.title} - ${song.artist}`;
-                songList.appendChild(li);
-            });
             resultsContainer.style.display = 'block';
             importToPlexButton.style.display = 'block';
+            songCount.textContent = songs.length < total
+                ? `已加载 ${songs.length} / ${total} 首歌曲`
+                : `共 ${songs.length} 首歌曲`;
+            renderVisibleSongs();
         } else {
+            songList.innerHTML = '';
+            songListSpacer.style.height = '0px';
             resultsContainer.style.display = 'none';
             importToPlexButton.style.display = 'none';
         }
     }
 
+    /**
+     * 只渲染视口附近的行，DOM 节点数与歌单长度无关
+     */
+    function renderVisibleSongs() {
+        renderScheduled = false;
+        const total = currentSongs.length;
+        songListSpacer.style.height = `${total * SONG_ROW_HEIGHT}px`;
+
+        const scrollTop = songListViewport.scrollTop;
+        const first = Math.max(0, Math.floor(scrollTop / SONG_ROW_HEIGHT) - SONG_LIST_OVERSCAN);
+        const last = Math.min(total, Math.ceil((scrollTop + songListViewport.clientHeight) / SONG_ROW_HEIGHT) + SONG_LIST_OVERSCAN);
+        if (first === renderedRange.first && last === renderedRange.last) {
+            return;
+        }
+        renderedRange = { first, last };
+
+        const fragment = document.createDocumentFragment();
+        for (let i = first; i < last; i++) {
+            const song = currentSongs[i];
+            const li = document.createElement('li');
+            li.textContent = `${song.title} - ${song.artist}`;
+            fragment.appendChild(li);
+        }
+        songList.innerHTML = '';
+        songList.appendChild(fragment);
+        songList.style.transform = `translateY(${first * SONG_ROW_HEIGHT}px)`;
+    }
+
+    songListViewport.addEventListener('scroll', () => {
+        if (!renderScheduled) {
+            renderScheduled = true;
+            requestAnimationFrame(renderVisibleSongs);
+        }
+    });
+
     // --- 4. 导入与状态模块 ---
     importToPlexButton.addEventListener('click', async () => {
         // 从表单中收集所需的值
@@ -186,6 +252,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 const result = await response.json();
                 taskId = result.task_id;
                 statusMessage.textContent = '任务已启动，正在等待首次状态更新...';
+                cancelImportButton.style.display = 'inline-block';
+                cancelImportButton.disabled = false;
                 startPolling(taskId);
             } else {
                 const errorData = await response.json();
@@ -198,14 +266,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    cancelImportButton.addEventListener('click', async () => {
+        if (!taskId) return;
+        cancelImportButton.disabled = true;
+        try {
+            const response = await fetch(`/api/v1/import/${taskId}/cancel`, { method: 'POST' });
+            if (response.ok) {
+                statusMessage.textContent = '正在取消，当前歌曲处理完后停止...';
+            } else {
+                const errorData = await response.json();
+                statusMessage.textContent = `取消失败: ${getErrorMessage(errorData)}`;
+            }
+        } catch (error) {
+            console.error('取消导入时出错:', error);
+            cancelImportButton.disabled = false;
+        }
+    });
+
     function startPolling(id) {
         if (pollingInterval) clearInterval(pollingInterval);
+        statusCursor = null;
+        taskState = { unmatched_songs: [] };
         pollingInterval = setInterval(() => checkTaskStatus(id), 2000);
     }
 
     async function checkTaskStatus(id) {
         try {
-            const response = await fetch(`/api/v1/import/status/${id}`);
+            const query = statusCursor ? `?since=${encodeURIComponent(statusCursor)}` : '';
+            const response = await fetch(`/api/v1/import/status/${id}${query}`);
             if (!response.ok) {
                 console.error(`状态检查失败: HTTP ${response.status}`, await response.text());
                 statusMessage.textContent = `检查状态失败 (HTTP ${response.status})。`;
@@ -215,12 +303,19 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             try {
-                const statusData = await response.json();
-                if (!statusData || !statusData.status) {
+                const delta = await response.json();
+                if (!delta || !delta.cursor) {
                     throw new Error('无效的状态响应格式');
                 }
+                // 只合并变化过的字段，未匹配歌曲按偏移追加
+                const { unmatched_songs: newUnmatched, ...changed } = delta;
+                const unmatched = delta.full ? [] : taskState.unmatched_songs.slice(0, delta.unmatched_offset);
+                unmatched.push(...newUnmatched);
+                taskState = delta.full ? { ...changed } : { ...taskState, ...changed };
+                taskState.unmatched_songs = unmatched;
+                statusCursor = delta.cursor;
 
-                const { status, processed, total, message } = statusData;
+                const { status, progress: processed, total, message } = taskState;
 
                 // 更新状态消息
                 statusMessage.textContent = message || '状态更新中...';
@@ -235,13 +330,16 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
 
                 // 检查任务是否完成或失败
-                if (status === 'completed' || status === 'failed') {
+                if (['completed', 'failed', 'error', 'cancelled'].includes(status)) {
                     clearInterval(pollingInterval);
+                    cancelImportButton.style.display = 'none';
                     if (status === 'completed') {
                         progressBar.value = 100;
                         progressText.textContent = `100% (${total}/${total})`;
                         statusMessage.textContent = "导入成功完成！";
-                    } else { // failed
+                    } else if (status === 'cancelled') {
+                        statusMessage.textContent = message || '导入已取消。';
+                    } else { // failed / error
                         statusMessage.textContent = `导入失败: ${message || '未知原因'}`;
                         progressBar.style.backgroundColor = '#ff0000';
                     }